@@ -1,19 +1,20 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import google.generativeai as genai
-import io
-import json
-import geopandas as gpd
-from keplergl import KeplerGl
 import base64  # For downloading data as base64 encoded link
+import functools  # Deferred download exports
 from datetime import timedelta  # Import timedelta for date calculations
-import re  # Import regular expressions for column matching
 
 # Import Plotly for interactive plots
 import plotly.express as px
-import plotly.graph_objects as go
+import plotly.io as pio
+
+# geopandas and keplergl (City Traffic Dashboard map) and google.generativeai
+# (Gemini explanations) are imported where those features run, so they do not
+# delay the first paint. See benchmarks/bench_startup.py.
+
+from flowsight import caching, datasets, engine, export, filters, geostore, router, schema, segments
+from flowsight.assistant import select_cities
+from flowsight.correlation import CORRELATION_METHODS, heatmap_columns
 
 # --- Encode LOGO.jpg to base64 ---
 # Ensure 'LOGO.png' is in the same directory as your app.py
@@ -600,12 +601,9 @@ else:
 # Apply CSS based on the selected theme
 if st.session_state.theme == 'Dark':
     st.markdown(DARK_MODE_CSS, unsafe_allow_html=True)
-    plotly_template = "plotly_dark" # Use dark template for Plotly
-    plotly_font_color = "white"
 else:
     st.markdown(LIGHT_MODE_CSS, unsafe_allow_html=True)
-    plotly_template = "plotly_white" # Use light template for Plotly
-    plotly_font_color = "black"
+plotly_template, plotly_font_color = engine.THEMES[st.session_state.theme] # Plotly template and font color of the theme
 
 
 # --- Custom App Title with Logo ---
@@ -622,22 +620,26 @@ st.markdown(
 # =============================================================================
 #                              LOAD DATA FUNCTIONS
 # =============================================================================
-# Cache data loading to improve performance on re-runs
-@st.cache_data
+# Cache data loading to improve performance on re-runs.
+# Both loaders read through the columnar cache in flowsight.storage: the CSV is
+# parsed once per file version and memory-mapped from an Arrow file afterwards.
+# The city data is a shared resource rather than a per-call copy, so reruns and
+# sessions do not unpickle their own copy; nothing below modifies df_original.
+@st.cache_resource
 def load_data(file_path="city_data.csv"):
     """
-    Loads city traffic data from a CSV file.
-    Performs critical column checks and data type conversions.
+    Loads city traffic data from the columnar cache (built from the CSV on first use).
+    Performs critical column and schema checks; type conversions happen in flowsight.datasets.
     """
     try:
-        df = pd.read_csv(file_path)
+        df = datasets.read_city_data(file_path)
+        schema.check_schema(df)
         critical_cols = ['CITY', 'date', 'congestion_index', 'AQI_mean',
                          'MANAGEMENT_TYPE', 'SPEED', 'prcp', 'wspd', 'tavg',
                          'POPULATION DENSITY', 'TOTAL PUBLIC TRANSPORT TRIP', 'tmin', 'tmax']
 
         if 'Holiday_Flag' in df.columns:
             critical_cols.append('Holiday_Flag')
-            df['Holiday_Flag'] = df['Holiday_Flag'].astype(bool)
         else:
             st.warning("The 'Holiday_Flag' column was not found in 'city_data.csv'. Holiday analysis features will be unavailable.")
 
@@ -646,13 +648,6 @@ def load_data(file_path="city_data.csv"):
             st.error(f"Missing critical columns: {', '.join(missing_critical_cols)}. Please ensure your CSV contains these columns.")
             return None
 
-        df['date'] = pd.to_datetime(df['date'], errors='coerce')
-        df.dropna(subset=['date'], inplace=True) # Drop rows where date conversion failed
-
-        if 'CITY' in df.columns:
-            df['CITY'] = df['CITY'].str.upper()
-            df['CITY'] = df['CITY'].replace('LOS ANGELOS', 'LOS ANGELES') # Data cleaning for consistency
-
         return df
     except FileNotFoundError:
         st.error(f"Error: The file '{file_path}' was not found. Please ensure 'city_data.csv' is in the correct directory.")
@@ -665,21 +660,11 @@ def load_data(file_path="city_data.csv"):
 @st.cache_data
 def load_policy_data(file_path="combined_traffic_policies_with_city.csv"):
     """
-    Loads traffic policy data from a CSV file.
-    Performs data type conversions and column renaming for consistency.
+    Loads traffic policy data from the columnar cache (built from the CSV on first use).
+    Date parsing and the 'city' -> 'CITY' rename happen in flowsight.datasets.
     """
     try:
-        df_policies = pd.read_csv(file_path)
-        df_policies['Date'] = pd.to_datetime(df_policies['Date'], errors='coerce')
-        df_policies.dropna(subset=['Date', 'city'], inplace=True) # Drop rows with missing date or city
-
-        # Rename 'city' column to 'CITY' for consistency with main data
-        if 'city' in df_policies.columns:
-            df_policies.rename(columns={'city': 'CITY'}, inplace=True)
-        if 'CITY' in df_policies.columns:
-            df_policies['CITY'] = df_policies['CITY'].str.upper()
-
-        return df_policies
+        return datasets.read_policy_data(file_path)
     except FileNotFoundError:
         st.error(f"Error: The file '{file_path}' was not found. Please ensure 'combined_traffic_policies_with_city.csv' is in the correct directory.")
         return None
@@ -687,6 +672,19 @@ def load_policy_data(file_path="combined_traffic_policies_with_city.csv"):
         st.error(f"Policy data loading error: {e}. Check column names like 'Date' and 'city'.")
         return None
 
+# The analysis engine (indexes, statistics cube, query router and filter cache)
+# is shared across sessions and rebuilt only when the dataset version changes.
+# The leading underscore tells Streamlit not to hash the DataFrame argument.
+@st.cache_resource
+def load_engine(dataset_version, _df):
+    """
+    Builds the headless analysis engine over the loaded data: the sorted-column
+    and bitmap indexes, the cube of per-cell sums, the dataset profile, the
+    keyword automaton that routes "Ask me anything" queries and the LRU cache
+    of filter results.
+    """
+    return engine.Engine(_df)
+
 # Load the datasets
 df_original = load_data()
 df_policies = load_policy_data()
@@ -694,7 +692,32 @@ df_policies = load_policy_data()
 # Stop the app if main data fails to load
 if df_original is None:
     st.stop()
-df = df_original.copy() # Create a mutable copy for filtering
+analysis_engine = load_engine(df_original.attrs.get('dataset_version'), df_original)
+dataset_index = analysis_engine.index
+moment_cube = analysis_engine.cube
+dataset_profile = analysis_engine.profile # slider bounds, distinct values and date coverage
+
+# Assistant answers (response text and figure JSON), keyed on the dataset
+# version, the normalized query, the filter fingerprint, the theme and the
+# heatmap options, and shared by all sessions. Reruns caused by unrelated
+# widgets and repeated questions are answered from here.
+QUERY_CACHE_MAX_ENTRIES = 256
+QUERY_CACHE_MAX_BYTES = 128 * 1024 * 1024
+QUERY_CACHE_MAX_AGE_SECONDS = 60 * 60
+
+@st.cache_resource
+def get_query_cache():
+    """
+    Returns the process-wide LRU cache of assistant answers.
+    """
+    return caching.LRUCache(
+        max_entries=QUERY_CACHE_MAX_ENTRIES, max_bytes=QUERY_CACHE_MAX_BYTES, max_age=QUERY_CACHE_MAX_AGE_SECONDS
+    )
+
+# Filter values are collected from the widgets below and applied once by
+# flowsight.filters after the last filter widget, instead of narrowing a
+# copy of the data after every widget.
+range_filters = {}
 
 
 # =============================================================================
@@ -708,7 +731,7 @@ st.sidebar.subheader("Data Filters")
 with st.sidebar.container(border=True):
     st.markdown("##### Environmental Filters")
     # ----------------- Filter 1: Temperature Threshold -----------------
-    min_tavg, max_tavg = float(df_original['tavg'].min()), float(df_original['tavg'].max())
+    min_tavg, max_tavg = dataset_profile.range('tavg')
     temp_threshold = st.slider( # Using st.slider directly here
         "Average Temperature (°C)",
         min_value=min_tavg,
@@ -716,10 +739,10 @@ with st.sidebar.container(border=True):
         value=(min_tavg, max_tavg),
         step=0.1
     )
-    df = df[(df['tavg'] >= temp_threshold[0]) & (df['tavg'] <= temp_threshold[1])]
+    range_filters['tavg'] = temp_threshold
 
     # ----------------- Filter 2: Precipitation Threshold -----------------
-    min_prcp, max_prcp = float(df_original['prcp'].min()), float(df_original['prcp'].max())
+    min_prcp, max_prcp = dataset_profile.range('prcp')
     prcp_threshold = st.slider( # Using st.slider directly here
         "Precipitation (mm)",
         min_value=min_prcp,
@@ -727,11 +750,11 @@ with st.sidebar.container(border=True):
         value=(min_prcp, max_prcp),
         step=0.1
     )
-    df = df[(df['prcp'] >= prcp_threshold[0]) & (df['prcp'] <= prcp_threshold[1])]
+    range_filters['prcp'] = prcp_threshold
 
     # ----------------- NEW Filter 4: Mean AQI Threshold -----------------
     if 'AQI_mean' in df_original.columns:
-        min_aqi, max_aqi = float(df_original['AQI_mean'].min()), float(df_original['AQI_mean'].max())
+        min_aqi, max_aqi = dataset_profile.range('AQI_mean')
         aqi_threshold = st.slider( # Using st.slider directly here
             "Mean AQI",
             min_value=min_aqi,
@@ -739,7 +762,7 @@ with st.sidebar.container(border=True):
             value=(min_aqi, max_aqi),
             step=1.0
         )
-        df = df[(df['AQI_mean'] >= aqi_threshold[0]) & (df['AQI_mean'] <= aqi_threshold[1])]
+        range_filters['AQI_mean'] = aqi_threshold
     else:
         st.warning("AQI_mean column not found for filtering.")
 
@@ -749,17 +772,16 @@ st.sidebar.markdown('<hr style="border-top:0.8px solid #444444;" />', unsafe_all
 with st.sidebar.container(border=True):
     st.markdown("##### Traffic & Transport Filters")
     # ----------------- Filter 3: Management Type -----------------
-    all_management_types = df_original['MANAGEMENT_TYPE'].unique().tolist()
+    all_management_types = dataset_profile.values('MANAGEMENT_TYPE')
     selected_management_types = st.multiselect( # Using st.multiselect directly here
         "Traffic Management Type",
         options=all_management_types,
         default=all_management_types
     )
-    df = df[df['MANAGEMENT_TYPE'].isin(selected_management_types)]
 
     # ----------------- NEW Filter 5: Public Transport Frequency -----------------
     if 'TOTAL PUBLIC TRANSPORT TRIP' in df_original.columns:
-        min_pt_trips, max_pt_trips = float(df_original['TOTAL PUBLIC TRANSPORT TRIP'].min()), float(df_original['TOTAL PUBLIC TRANSPORT TRIP'].max())
+        min_pt_trips, max_pt_trips = dataset_profile.range('TOTAL PUBLIC TRANSPORT TRIP')
         pt_trips_threshold = st.slider( # Using st.slider directly here
             "Total Public Transport Trips (per day)",
             min_value=min_pt_trips,
@@ -767,7 +789,7 @@ with st.sidebar.container(border=True):
             value=(min_pt_trips, max_pt_trips),
             step=100.0
         )
-        df = df[(df['TOTAL PUBLIC TRANSPORT TRIP'] >= pt_trips_threshold[0]) & (df['TOTAL PUBLIC TRANSPORT TRIP'] <= pt_trips_threshold[1])]
+        range_filters['TOTAL PUBLIC TRANSPORT TRIP'] = pt_trips_threshold
     else:
         st.warning("TOTAL PUBLIC TRANSPORT TRIP column not found for filtering.")
 
@@ -775,30 +797,58 @@ with st.sidebar.container(border=True):
 st.sidebar.markdown('<hr style="border-top:0.8px solid #444444;" />', unsafe_allow_html=True)
 
 # ----------------- NEW "Select Cities" filter -----------------
-all_cities = df_original['CITY'].unique().tolist()
+all_cities = dataset_profile.values('CITY')
 selected_cities = st.sidebar.multiselect(
     "Select Cities",
     options=all_cities,
     default=all_cities
 )
-df = df[df['CITY'].isin(selected_cities)]
+
+# Apply all filters in a single pass and materialize the filtered frame once;
+# an unchanged filter state is served from the engine's filter cache instead.
+# Filtered frames and their aggregates are shared by all sessions, so code
+# below must not modify `df` in place.
+filter_state = filters.FilterState(
+    ranges=range_filters,
+    selections={'MANAGEMENT_TYPE': selected_management_types, 'CITY': selected_cities},
+)
+filter_fingerprint = filter_state.fingerprint()
+filter_view = analysis_engine.view(filter_state)
+filter_result = filter_view.result
+filter_cube = filter_view.cube # stands in for `df` while the range sliders exclude no rows
+df = filter_result.frame
+
+# Collapsed panel with load-time and per-rerun performance figures
+diagnostics = st.sidebar.expander("Performance Diagnostics")
+with diagnostics:
+    raw_memory_mb = df_original.attrs.get('raw_memory_bytes', 0) / 1e6
+    typed_memory_mb = schema.memory_usage_bytes(df_original) / 1e6
+    st.markdown(
+        f"**Dataset memory**: {raw_memory_mb:.1f} MB as parsed, {typed_memory_mb:.1f} MB with the typed schema "
+        f"({typed_memory_mb * 1e6 / max(len(df_original), 1):.0f} bytes/row)."
+    )
+    st.markdown(f"**Filtered frame**: {schema.memory_usage_bytes(df) / 1e6:.1f} MB")
+    st.markdown(f"**Rows after filters**: {filter_result.kept_rows:,} of {filter_result.total_rows:,}")
+    filter_cache_stats = analysis_engine.filter_cache.stats()
+    st.markdown(
+        f"**Filter cache**: {'hit' if filter_view.cache_hit else 'miss'} for `{filter_fingerprint[:10]}`; "
+        f"{filter_cache_stats['entries']} entries, {filter_cache_stats['bytes'] / 1e6:.1f} MB, "
+        f"{filter_cache_stats['hits']} hits / {filter_cache_stats['misses']} misses"
+    )
+    st.markdown("\n".join(f"- `{col}` removes {count:,} rows" for col, count in filter_result.removed.items()))
+    st.markdown(
+        f"**Statistics cube**: {len(moment_cube):,} cells; "
+        + (f"answering from {len(filter_cube):,} cells" if filter_cube is not None else "not used while range filters exclude rows")
+    )
 
 st.sidebar.subheader("Ask me anything")
 # Add a prompt guide with reduced font size
+prompt_lines = "\n".join(f'    <p>&bull; "{prompt}"</p>' for prompt in router.SAMPLE_PROMPTS)
 st.sidebar.markdown(
-    """
+    f"""
     <div class="prompt-guide-text">
     <strong>Prompt Guide (Sample Questions):</strong>
-    <p>&bull; "Show congestion trend in LONDON"</p>
-    <p>&bull; "What is the correlation between AQI and congestion in PARIS?"</p>
-    <p>&bull; "Compare speed in BARCELONA and NEW YORK CITY"</p>
-    <p>&bull; "Rank cities by public transport trips"</p>
-    <p>&bull; "Show distribution of speed by management type"</p>
-    <p>&bull; "Show distribution of congestion by road type"</p>
-    <p>&bull; "What is the strongest factor affecting congestion?"</p>
-    <p>&bull; "Show correlation heatmap"</p>
-    <p>&bull; "Is congestion affected by holidays?"</p>
-    <p>&bull; "Compare congestion by AI vs conventional methods"</p>
+{prompt_lines}
     </div>
     """,
     unsafe_allow_html=True
@@ -807,6 +857,20 @@ st.sidebar.markdown(
 user_query = st.sidebar.text_area("Your Question:", "Compare congestion in BARCELONA and LONDON", height=100)
 gemini_api_key = st.sidebar.text_input("Your Gemini API Key", type="password", placeholder="Enter your Gemini API Key")
 
+# Column subset and method used when the question asks for a correlation heatmap
+with st.sidebar.expander("Heatmap Options"):
+    all_heatmap_columns = heatmap_columns(df_original)
+    selected_heatmap_columns = st.multiselect(
+        "Heatmap Columns",
+        options=all_heatmap_columns,
+        default=all_heatmap_columns
+    )
+    heatmap_method = st.selectbox(
+        "Correlation Method",
+        options=list(CORRELATION_METHODS),
+        format_func=str.title
+    )
+
 # =============================================================================
 #                        MAIN‐AREA: INITIAL CHECKS & HOME PAGE
 # =============================================================================
@@ -821,7 +885,10 @@ st.markdown('<hr class="main-separator" />', unsafe_allow_html=True)
 with st.container(border=True):
     st.header("City Congestion Ranking (Overall)")
     if not df.empty:
-        avg_congestion_overall = df.groupby("CITY")["congestion_index"].mean().sort_values(ascending=False).reset_index()
+        avg_congestion_overall = filter_result.aggregate(
+            "city_ranking",
+            lambda frame: frame.groupby("CITY", observed=True)["congestion_index"].mean().sort_values(ascending=False).reset_index()
+        )
 
         # REVERTED: Use highlight functions for min/max instead of a gradient
         def highlight_max(s):
@@ -850,19 +917,14 @@ if st.sidebar.checkbox("Show City Snapshots (based on filtered data)"):
     with st.container(border=True):
         st.header("City Traffic Snapshots")
         if not df.empty:
-            if 'date' in df.columns and pd.api.types.is_datetime64_any_dtype(df['date']):
-                df['year_month'] = df['date'].dt.to_period('M')
-            else:
-                st.warning("Date column not found or not in datetime format for city snapshots. Skipping monthly aggregation.")
-
-            city_summary = df.groupby('CITY').agg({
+            city_summary = filter_result.aggregate("city_snapshots", lambda frame: frame.groupby('CITY', observed=True).agg({
                 'congestion_index': 'mean',
                 'tavg': 'mean',
                 'prcp': 'mean',
                 'AQI_mean': 'mean',
                 'TOTAL PUBLIC TRANSPORT TRIP': 'mean',
                 'POPULATION DENSITY': 'mean'
-            }).reset_index()
+            }).reset_index())
 
             # Display snapshots as cards using st.columns for a grid layout
             # Use responsive columns for better mobile/desktop adaptation
@@ -883,916 +945,6 @@ if st.sidebar.checkbox("Show City Snapshots (based on filtered data)"):
         else:
             st.info("No data to display city snapshots after applying filters.")
 
-# =============================================================================
-#                             CORE FUNCTION
-# =============================================================================
-def plot_and_answer(query, data_frame, plot_template, font_color):
-    """
-    Analyzes the user query and generates appropriate Plotly visualizations
-    and textual responses based on the filtered data.
-    """
-    # This function now exclusively uses Plotly, so Matplotlib/Seaborn styling is removed.
-    query_lower = query.lower()
-    plot_generated = False # Flag to track if a Plotly figure was generated
-    fig = None # Kept for compatibility in case a Matplotlib plot is ever re-introduced
-    default_plot_height = 800 # Define a default height for plots
-
-    print(f"DEBUG: Processing query: '{query_lower}'")
-
-    # 1. Trend over time (Plotly Line Chart)
-    if "trend" in query_lower or "over time" in query_lower:
-        print("DEBUG: Triggered: Trend over time analysis.")
-        metric_keywords = {
-            "congestion": "congestion_index", "aqi": "AQI_mean", "speed": "SPEED",
-            "temperature": "tavg", "precipitation": "prcp", "wind speed": "wspd",
-            "public transport trips": "TOTAL PUBLIC TRANSPORT TRIP", "traffic volume": "TRAFFIC_VOLUME"
-        }
-        selected_metric_col = None
-        for keyword, col_name in metric_keywords.items():
-            if keyword in query_lower:
-                selected_metric_col = col_name
-                break
-
-        if not selected_metric_col:
-            return "Please specify which metric's trend you want to see (e.g., congestion, AQI, speed).", None
-
-        if selected_metric_col not in data_frame.columns:
-            return f"The '{selected_metric_col}' column is not available in the dataset.", None
-
-        city_specified = False
-        for city in data_frame['CITY'].unique():
-            if city.lower() in query_lower:
-                city_specified = True
-                city_data = data_frame[data_frame['CITY'].str.lower() == city.lower()].copy()
-                if city_data.empty:
-                    print(f"DEBUG: No data for {city} with current filters for trend.")
-                    return f"No data for {city} with current filters to plot trend for {selected_metric_col}.", None
-                if 'date' not in city_data.columns or not pd.api.types.is_datetime64_any_dtype(city_data['date']):
-                    st.warning(f"Date column not found or not in datetime format for {city}. Cannot plot trend.")
-                    return f"Could not plot trend for {city} due to date column issues.", None
-
-                city_data = city_data.sort_values(by='date')
-                px_fig = px.line(city_data, x='date', y=selected_metric_col, 
-                                 title=f"{selected_metric_col.replace('_', ' ').title()} Trend in {city}",
-                                 labels={'date': 'Date', selected_metric_col: selected_metric_col.replace('_', ' ').title()},
-                                 template=plot_template,
-                                 color_discrete_sequence=["#00D4FF"], # Vibrant blue
-                                 height=default_plot_height)
-                px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color) # Set title font color
-                px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-                px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-                px_fig.update_layout(legend_font_color=font_color) # Set legend font color
-                st.plotly_chart(px_fig, use_container_width=True)
-                plot_generated = True
-                return f"Interactive trend of {selected_metric_col.replace('_', ' ')} in {city}.", None
-
-        # If no specific city, plot overall trend
-        if not city_specified:
-            if 'date' not in data_frame.columns or not pd.api.types.is_datetime64_any_dtype(data_frame['date']):
-                st.warning(f"Date column not found or not in datetime format. Cannot plot overall trend.")
-                return f"Could not plot overall trend due to date column issues.", None
-
-            overall_trend_data = data_frame.groupby('date')[selected_metric_col].mean().reset_index()
-            overall_trend_data = overall_trend_data.sort_values(by='date')
-
-            px_fig = px.line(overall_trend_data, x='date', y=selected_metric_col, 
-                             title=f"Overall {selected_metric_col.replace('_', ' ').title()} Trend Across All Cities",
-                             labels={'date': 'Date', selected_metric_col: selected_metric_col.replace('_', ' ').title()},
-                             template=plot_template,
-                             color_discrete_sequence=["#7C4DFF"], # More dim purple accent
-                             height=default_plot_height)
-            px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color) # Set title font color
-            px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-            px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-            px_fig.update_layout(legend_font_color=font_color) # Set legend font color
-            st.plotly_chart(px_fig, use_container_width=True)
-            plot_generated = True
-            return f"Interactive overall trend of {selected_metric_col.replace('_', ' ')} across all cities.", None
-
-    # 2. Scatter Plots (Plotly)
-    elif "scatter" in query_lower or "relationship" in query_lower or ("vs" in query_lower and any(col in query_lower for col in ['congestion', 'temperature', 'precipitation', 'wind', 'population', 'aqi', 'public transport', 'speed', 'volume'])):
-        print("DEBUG: Triggered: Scatter plot analysis.")
-        all_numeric_cols = data_frame.select_dtypes(include='number').columns.tolist()
-        col_map = {
-            "congestion": "congestion_index", "aqi": "AQI_mean", "speed": "SPEED",
-            "temperature": "tavg", "precipitation": "prcp", "wind speed": "wspd", "wind": "wspd",
-            "public transport trips": "TOTAL PUBLIC TRANSPORT TRIP", "public transport": "TOTAL PUBLIC TRANSPORT TRIP",
-            "population density": "POPULATION DENSITY", "population": "POPULATION DENSITY",
-            "traffic volume": "TRAFFIC_VOLUME", "volume": "TRAFFIC_VOLUME"
-        }
-
-        found_cols = []
-        for term, col_name in col_map.items():
-            if term in query_lower and col_name in all_numeric_cols:
-                found_cols.append(col_name)
-
-        potential_x, potential_y = None, None
-        if len(found_cols) >= 2:
-            if "congestion_index" in found_cols:
-                potential_y = "congestion_index"
-                found_cols.remove("congestion_index")
-                potential_x = found_cols[0]
-            else:
-                potential_x, potential_y = found_cols[0], found_cols[1]
-        elif len(found_cols) == 1:
-            return f"Please specify two numeric columns for a scatter plot. You mentioned '{found_cols[0].replace('_', ' ')}'.", None
-        else:
-            return "Please specify two numeric columns for the scatter plot, e.g., 'AQI and congestion' or 'speed and volume'.", None
-
-        if potential_x and potential_y:
-            if potential_x not in data_frame.columns or potential_y not in data_frame.columns:
-                return f"One or both of the specified columns ('{potential_x}', '{potential_y}') are not available.", None
-
-            plot_data = data_frame.dropna(subset=[potential_x, potential_y])
-            if plot_data.empty:
-                print(f"DEBUG: Plot data is empty for scatter of {potential_x} vs {potential_y}.")
-                return f"No valid data points for a scatter plot of '{potential_x.replace('_', ' ')}' vs '{potential_y.replace('_', ' ')}' after filtering NaN values.", None
-
-            city_specified_in_query = False
-            selected_city_for_plot = None
-            # Robust city extraction for scatter plots
-            unique_df_cities = data_frame['CITY'].unique().tolist()
-            sorted_cities = sorted(unique_df_cities, key=len, reverse=True) # Sort to match longer names first
-
-            for df_city in sorted_cities:
-                if re.search(r'\b' + re.escape(df_city.lower()) + r'\b', query_lower):
-                    selected_city_for_plot = df_city
-                    city_specified_in_query = True
-                    break # Stop after finding the first city
-
-            if city_specified_in_query:
-                city_data = plot_data[plot_data['CITY'].str.lower() == selected_city_for_plot.lower()]
-                if city_data.empty:
-                    print(f"DEBUG: No data for {selected_city_for_plot} for scatter plot.")
-                    return f"No data for {selected_city_for_plot} with current filters to plot {potential_x.replace('_', ' ')} vs {potential_y.replace('_', ' ')}.", None
-
-                px_fig = px.scatter(city_data, x=potential_x, y=potential_y, 
-                                    title=f"{potential_y.replace('_', ' ').title()} vs {potential_x.replace('_', ' ').title()} in {selected_city_for_plot}",
-                                    labels={potential_x: potential_x.replace('_', ' ').title(), potential_y: potential_y.replace('_', ' ').title()},
-                                    template=plot_template,
-                                    color_discrete_sequence=["#FFA726"], # Vibrant orange accent
-                                    height=default_plot_height)
-                px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color) # Set title font color
-                px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-                px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-                px_fig.update_layout(legend_font_color=font_color) # Set legend font color
-                st.plotly_chart(px_fig, use_container_width=True)
-                plot_generated = True
-                return f"Interactive scatter plot showing {potential_y.replace('_', ' ')} vs. {potential_x.replace('_', ' ')} in {selected_city_for_plot}.", None
-            else:
-                px_fig = px.scatter(data_frame=plot_data, x=potential_x, y=potential_y, 
-                                    color='CITY' if data_frame['CITY'].nunique() > 1 else None,
-                                    title=f"{potential_y.replace('_', ' ').title()} vs {potential_x.replace('_', ' ').title()} Across Cities",
-                                    labels={potential_x: potential_x.replace('_', ' ').title(), potential_y: potential_y.replace('_', ' ').title()},
-                                    template=plot_template,
-                                    color_discrete_sequence=px.colors.qualitative.Plotly, # Use a good default palette
-                                    height=default_plot_height
-                                    )
-                px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color) # Set title font color
-                px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-                px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-                px_fig.update_layout(legend_font_color=font_color) # Set legend font color
-                st.plotly_chart(px_fig, use_container_width=True)
-                plot_generated = True
-                return f"Interactive scatter plot showing {potential_y.replace('_', ' ')} vs. {potential_x.replace('_', ' ')} across all filtered cities.", None
-        else:
-            return "Could not determine appropriate columns for scatter plot. Please be more specific.", None
-
-    # Specific AI Assistant Plotting Logic: Correlation AQI and Congestion in specific city
-    elif "correlation between aqi and congestion in" in query_lower:
-        print("DEBUG: Triggered: Correlation AQI and Congestion in specific city analysis.")
-        city_match = re.search(r"in (\w+)", query_lower)
-        if city_match:
-            city_name_from_query = city_match.group(1).upper()
-            if 'AQI_mean' in data_frame.columns and 'congestion_index' in data_frame.columns:
-                city_data = data_frame[data_frame['CITY'] == city_name_from_query]
-                if not city_data.empty:
-                    plot_data = city_data.dropna(subset=['AQI_mean', 'congestion_index'])
-                    if not plot_data.empty and plot_data['AQI_mean'].nunique() > 1 and plot_data['congestion_index'].nunique() > 1:
-                        correlation = plot_data['AQI_mean'].corr(plot_data['congestion_index'])
-                        
-                        px_fig = px.scatter(plot_data, x='AQI_mean', y='congestion_index',
-                                            title=f"AQI vs Congestion Index in {city_name_from_query}",
-                                            labels={'AQI_mean': 'Mean AQI', 'congestion_index': 'Congestion Index'},
-                                            template=plot_template,
-                                            color_discrete_sequence=["#FFA726"],
-                                            height=default_plot_height)
-                        px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color)
-                        px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-                        px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-                        px_fig.update_layout(legend_font_color=font_color)
-                        st.plotly_chart(px_fig, use_container_width=True)
-                        plot_generated = True
-                        return f"The correlation between AQI and congestion in {city_name_from_query} is **{correlation:.2f}**.", None
-                    else:
-                        print(f"DEBUG: Not enough valid data points for AQI and congestion in {city_name_from_query} to plot correlation.")
-                        return f"Not enough valid data points for AQI and congestion in {city_name_from_query} to plot correlation.", None
-                else:
-                    print(f"DEBUG: No data found for {city_name_from_query} to plot correlation.")
-                    return f"No data found for {city_name_from_query} to plot correlation.", None
-            else:
-                print("DEBUG: AQI_mean or congestion_index columns are missing for correlation analysis.")
-                return "AQI_mean or congestion_index columns are missing in the dataset.", None
-        else:
-            return "Please specify a city for AQI and congestion correlation analysis (e.g., 'What is the correlation between AQI and congestion in PARIS?').", None
-
-    # Specific AI Assistant Plotting Logic: Compare speed in CITY1 and CITY2
-    elif "compare speed in" in query_lower and "and" in query_lower:
-        print("DEBUG: Triggered: Compare speed in CITY1 and CITY2 analysis.")
-        
-        unique_df_cities = data_frame['CITY'].unique().tolist()
-        cities_to_compare_extracted = []
-        sorted_cities = sorted(unique_df_cities, key=len, reverse=True) # Sort to match longer names first
-
-        for df_city in sorted_cities:
-            # Use word boundaries \b to ensure whole word match
-            if re.search(r'\b' + re.escape(df_city.lower()) + r'\b', query_lower):
-                if df_city not in cities_to_compare_extracted:
-                    cities_to_compare_extracted.append(df_city)
-        
-        cities_to_compare = cities_to_compare_extracted[:2] # Take the first two found
-        print(f"DEBUG: Cities extracted for speed comparison: {cities_to_compare}")
-
-        if len(cities_to_compare) >= 2: # Check for at least two cities
-            subset = data_frame[data_frame["CITY"].isin(cities_to_compare)]
-            if not subset.empty and 'SPEED' in subset.columns:
-                avg_speed_df = subset.groupby("CITY")["SPEED"].mean().reset_index()
-                avg_speed_df = avg_speed_df[avg_speed_df['CITY'].isin(cities_to_compare)] # Ensure only queried cities are in plot
-                
-                if len(avg_speed_df) >= 2: # Ensure we have data for at least two cities
-                    px_fig = px.bar(avg_speed_df, x='CITY', y='SPEED',
-                                    title=f"Average Speed: {cities_to_compare[0]} vs {cities_to_compare[1]}",
-                                    labels={'CITY': 'City', 'SPEED': 'Average Speed'},
-                                    template=plot_template,
-                                    color='CITY',
-                                    color_discrete_map={cities_to_compare[0]: "#00D4FF", cities_to_compare[1]: "#7C4DFF"},
-                                    height=default_plot_height)
-                    px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color)
-                    px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-                    px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-                    px_fig.update_layout(legend_font_color=font_color)
-                    st.plotly_chart(px_fig, use_container_width=True)
-                    plot_generated = True
-                    return f"Interactive bar chart comparing average speed in {cities_to_compare[0]} and {cities_to_compare[1]}.", None
-                else:
-                    print(f"DEBUG: Not enough speed data for both {cities_to_compare[0]} and {cities_to_compare[1]} for comparison.")
-                    return f"Not enough speed data for both {cities_to_compare[0]} and {cities_to_compare[1]} with current filters.", None
-            else:
-                print("DEBUG: Speed column missing or no data for specified cities for comparison.")
-                return "Speed column missing or no data for specified cities with current filters.", None
-        else:
-            print(f"DEBUG: Did not find two cities for comparison. Found: {cities_to_compare}")
-            return "Please specify at least two cities to compare speed (e.g., 'Compare speed in BARCELONA and NEW YORK CITY').", None
-
-    # Specific AI Assistant Plotting Logic: Show distribution of speed by management type
-    elif "distribution of speed by management type" in query_lower:
-        print("DEBUG: Triggered: Distribution of speed by management type analysis.")
-        if 'MANAGEMENT_TYPE' in data_frame.columns and 'SPEED' in data_frame.columns:
-            plot_data = data_frame.dropna(subset=['MANAGEMENT_TYPE', 'SPEED'])
-            print(f"DEBUG: Speed by management type - plot_data shape: {plot_data.shape}, unique MANAGEMENT_TYPE: {plot_data['MANAGEMENT_TYPE'].unique()}")
-            if not plot_data.empty and plot_data['MANAGEMENT_TYPE'].nunique() > 1:
-                px_fig = px.box(plot_data, x="MANAGEMENT_TYPE", y="SPEED", 
-                                title="Distribution of Speed by Management Type",
-                                labels={"MANAGEMENT_TYPE": "Management Type", "SPEED": "Speed"},
-                                template=plot_template,
-                                color="MANAGEMENT_TYPE",
-                                color_discrete_sequence=px.colors.qualitative.D3,
-                                height=default_plot_height)
-                px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color)
-                px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-                px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-                px_fig.update_layout(legend_font_color=font_color)
-                st.plotly_chart(px_fig, use_container_width=True)
-                plot_generated = True
-                return "Interactive box plot showing the distribution of speed across different traffic management types.", None
-            else:
-                print("DEBUG: Not enough valid data or unique management types for speed distribution.")
-                return "Not enough valid data or unique management types to plot speed distribution by management type.", None
-        else:
-            print("DEBUG: MANAGEMENT_TYPE or SPEED columns are missing for speed distribution.")
-            return "MANAGEMENT_TYPE or SPEED columns are missing in the dataset.", None
-
-    # Specific AI Assistant Plotting Logic: Show distribution of congestion by road type
-    elif "distribution of congestion by road type" in query_lower:
-        print("DEBUG: Triggered: Distribution of congestion by road type analysis.")
-        if 'road_type' in data_frame.columns and 'congestion_index' in data_frame.columns:
-            plot_data = data_frame.dropna(subset=['road_type', 'congestion_index'])
-            print(f"DEBUG: Congestion by road type - plot_data shape: {plot_data.shape}, unique road_type: {plot_data['road_type'].unique()}")
-            if not plot_data.empty and plot_data['road_type'].nunique() > 1:
-                px_fig = px.box(plot_data, x="road_type", y="congestion_index", 
-                                title="Distribution of Congestion by Road Type",
-                                labels={"road_type": "Road Type", "congestion_index": "Congestion Index"},
-                                template=plot_template,
-                                color="road_type",
-                                color_discrete_sequence=px.colors.qualitative.Set2,
-                                height=default_plot_height)
-                px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color)
-                px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-                px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-                px_fig.update_layout(legend_font_color=font_color)
-                st.plotly_chart(px_fig, use_container_width=True)
-                plot_generated = True
-                return "Interactive box plot showing the distribution of congestion across different road types.", None
-            else:
-                print("DEBUG: Not enough valid data or unique road types for congestion distribution.")
-                return "Not enough valid data or unique road types to plot congestion distribution by road type.", None
-        else:
-            print("DEBUG: road_type or congestion_index columns are missing for congestion distribution.")
-            return "road_type or congestion_index columns are missing in the dataset.", None
-
-
-    # 3. Boxplot (by categorical) (Plotly)
-    elif ("boxplot" in query_lower or "distribution" in query_lower) and "by" in query_lower:
-        print("DEBUG: Triggered: General boxplot by categorical analysis.")
-        parts = query_lower.split(" by ")
-        if len(parts) == 2:
-            value_col_raw = parts[0].replace("show", "").replace("distribution", "").strip()
-            category_col_raw = parts[1].replace("type", "").strip()
-
-            col_map = {
-                "speed": "SPEED", "congestion": "congestion_index", "aqi": "AQI_mean",
-                "temperature": "tavg", "precipitation": "prcp", "management": "MANAGEMENT_TYPE",
-                "management type": "MANAGEMENT_TYPE", "city": "CITY", "road": "road_type", "road type": "road_type"
-            }
-            value_col = col_map.get(value_col_raw, None)
-            category_col = col_map.get(category_col_raw, None)
-
-            if value_col and category_col:
-                if value_col not in data_frame.columns or category_col not in data_frame.columns:
-                    return f"One or both of the specified columns ('{value_col}', '{category_col}') are not available for boxplot.", None
-
-                plot_data = data_frame.dropna(subset=[value_col, category_col])
-                print(f"DEBUG: General boxplot - plot_data shape: {plot_data.shape}, unique {category_col}: {plot_data[category_col].unique()}")
-                if plot_data.empty or plot_data[category_col].nunique() < 2:
-                    print(f"DEBUG: Not enough valid data or unique categories in '{category_col}' for boxplot.")
-                    return f"Not enough valid data or unique categories in '{category_col}' to create a boxplot for '{value_col}'.", None
-
-                px_fig = px.box(plot_data, x=category_col, y=value_col, 
-                                title=f"{value_col.replace('_', ' ').title()} Distribution by {category_col.replace('_', ' ').title()}",
-                                labels={category_col: category_col.replace('_', ' ').title(), value_col: value_col.replace('_', ' ').title()},
-                                template=plot_template,
-                                color=category_col if plot_data[category_col].nunique() < 10 else None, # Color by category if not too many
-                                color_discrete_sequence=px.colors.qualitative.D3, # Good qualitative palette
-                                height=default_plot_height
-                                )
-                px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color) # Set title font color
-                px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-                px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-                px_fig.update_layout(legend_font_color=font_color) # Set legend font color
-                st.plotly_chart(px_fig, use_container_width=True)
-                plot_generated = True
-                return f"Interactive boxplot of {value_col.replace('_', ' ')} distribution by {category_col.replace('_', ' ')}.", None
-            else:
-                print("DEBUG: Could not determine columns for general boxplot.")
-                return "Could not determine columns for boxplot. Please specify a numeric column and a categorical column, e.g., 'speed by management type'.", None
-
-    # 4. Ranking (Plotly Bar Chart with Dynamic Height)
-    elif "rank" in query_lower:
-        print("DEBUG: Triggered: Ranking analysis.")
-        metric_keywords = {
-            "congestion": "congestion_index", "aqi": "AQI_mean", "speed": "SPEED",
-            "temperature": "tavg", "precipitation": "prcp", "wind speed": "wspd",
-            "public transport trips": "TOTAL PUBLIC TRANSPORT TRIP", "population density": "POPULATION DENSITY",
-            "traffic volume": "TRAFFIC_VOLUME"
-        }
-        selected_metric_col = None
-        for keyword, col_name in metric_keywords.items():
-            if keyword in query_lower:
-                selected_metric_col = col_name
-                break
-
-        if not selected_metric_col:
-            return "Please specify which metric you want to rank cities by (e.g., congestion, AQI, speed).", None
-
-        if selected_metric_col not in data_frame.columns:
-            return f"The '{selected_metric_col}' column is not available in the dataset for ranking.", None
-
-        ascending_rank = True
-        if selected_metric_col in ["congestion_index", "AQI_mean"] or "worst" in query_lower or "highest" in query_lower:
-            ascending_rank = False
-        if "best" in query_lower or "lowest" in query_lower:
-            ascending_rank = True
-
-        avg_metric = data_frame.groupby("CITY")[selected_metric_col].mean().sort_values(ascending=ascending_rank).reset_index()
-
-        if avg_metric.empty:
-            print(f"DEBUG: Not enough data to rank cities by {selected_metric_col}.")
-            return f"Not enough data to rank cities by {selected_metric_col.replace('_', ' ')} with current filters.", None
-
-        # DYNAMIC SIZING: Calculate height based on number of cities (2x original)
-        num_cities = len(avg_metric['CITY'])
-        plot_height = max(600, num_cities * 70)  # Base height 600, add 70px per city
-
-        rank_order = "lowest" if ascending_rank else "highest"
-        
-        px_fig = px.bar(avg_metric, x=selected_metric_col, y='CITY', orientation='h',
-                        title=f"Average {selected_metric_col.replace('_', ' ').title()} by City",
-                        labels={selected_metric_col: f"Average {selected_metric_col.replace('_', ' ').title()}", 'CITY': 'City'},
-                        template=plot_template,
-                        color=selected_metric_col,
-                        color_continuous_scale=px.colors.sequential.Plasma,
-                        height=plot_height # Set dynamic height
-                        )
-        px_fig.update_layout(yaxis={'categoryorder':'total ascending' if ascending_rank else 'total descending'})
-        px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color) # Set title font color
-        px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-        px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-        px_fig.update_layout(legend_font_color=font_color) # Set legend font color
-        st.plotly_chart(px_fig, use_container_width=True)
-        plot_generated = True
-        return f"Interactive ranking of cities by average {selected_metric_col.replace('_', ' ')}. {rank_order.capitalize()} values are {'better' if ascending_rank else 'worse'}.", None
-
-    # 5. Impact by factor (Plotly Bar Chart)
-    elif "most affected by" in query_lower or "impact of" in query_lower:
-        print("DEBUG: Triggered: Impact by factor analysis.")
-        feature_map = {
-            "precipitation": "prcp", "aqi": "AQI_mean", "wind": "wspd",
-            "temperature": "tavg", "population density": "POPULATION DENSITY",
-            "public transport trips": "TOTAL PUBLIC TRANSPORT TRIP"
-        }
-        target_col = "congestion_index"
-        if "on speed" in query_lower:
-            target_col = "SPEED"
-        elif "on traffic volume" in query_lower:
-            target_col = "TRAFFIC_VOLUME"
-
-        selected_factor_col = None
-        for keyword, col_name in feature_map.items():
-            if keyword in query_lower:
-                selected_factor_col = col_name
-                break
-
-        if not selected_factor_col:
-            return "Please specify a factor to analyze its impact (e.g., precipitation, temperature, AQI).", None
-
-        if selected_factor_col not in data_frame.columns or target_col not in data_frame.columns:
-            return f"Required column '{selected_factor_col}' or '{target_col}' not found for impact analysis.", None
-
-        corrs = []
-        cities_for_corr = []
-        for city_name in data_frame['CITY'].unique():
-            city_df = data_frame[data_frame['CITY'] == city_name]
-            if len(city_df.dropna(subset=[selected_factor_col, target_col])) > 1 and \
-               city_df[selected_factor_col].nunique() > 1 and city_df[target_col].nunique() > 1:
-                corr_val = city_df[selected_factor_col].corr(city_df[target_col])
-                if pd.notnull(corr_val):
-                    corrs.append({"CITY": city_name, "Absolute Correlation": abs(corr_val), "Correlation": corr_val})
-                    cities_for_corr.append(city_name) # Ensure city is added to list
-
-        if not corrs:
-            print(f"DEBUG: Could not calculate correlations for {selected_factor_col} impact on {target_col}.")
-            return f"Could not calculate correlations for {selected_factor_col} impact on {target_col} with current filters; insufficient data or too many missing values.", None
-
-        corr_df = pd.DataFrame(corrs).sort_values(by="Absolute Correlation", ascending=False)
-        
-        px_fig = px.bar(corr_df, x="Absolute Correlation", y="CITY", orientation='h',
-                        title=f"Cities by Impact of {selected_factor_col.replace('_', ' ').title()} on {target_col.replace('_', ' ').title()} (Absolute Correlation)",
-                        labels={"Absolute Correlation": f"Absolute Correlation with {target_col.replace('_', ' ').title()} Index", "CITY": "City"},
-                        template=plot_template,
-                        color="Absolute Correlation", color_continuous_scale=px.colors.sequential.Plasma, # New palette for dark theme
-                        height=default_plot_height
-                        )
-        px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color) # Set title font color
-        px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-        px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-        px_fig.update_layout(legend_font_color=font_color) # Set legend font color
-        st.plotly_chart(px_fig, use_container_width=True)
-        plot_generated = True
-        return f"Interactive rank of cities by absolute correlation between {selected_factor_col.replace('_', ' ')} and {target_col.replace('_', ' ')}.", None
-
-    # 6. Compare two cities (Plotly Bar Chart)
-    elif "compare" in query_lower and "and" in query_lower:
-        print("DEBUG: Triggered: Compare two cities analysis (general).")
-        
-        unique_df_cities = data_frame['CITY'].unique().tolist()
-        cities_to_compare_extracted = []
-        sorted_cities = sorted(unique_df_cities, key=len, reverse=True) # Sort to match longer names first
-
-        for df_city in sorted_cities:
-            # Use word boundaries \b to ensure whole word match
-            if re.search(r'\b' + re.escape(df_city.lower()) + r'\b', query_lower):
-                if df_city not in cities_to_compare_extracted:
-                    cities_to_compare_extracted.append(df_city)
-        
-        cities_to_compare = cities_to_compare_extracted[:2] # Take the first two found
-        print(f"DEBUG: Cities extracted for general comparison: {cities_to_compare}")
-
-        if len(cities_to_compare) == 2:
-            metric_keywords = {
-                "congestion": "congestion_index", "aqi": "AQI_mean", "speed": "SPEED",
-                "temperature": "tavg", "precipitation": "prcp", "wind speed": "wspd",
-                "public transport trips": "TOTAL PUBLIC TRANSPORT TRIP", "population density": "POPULATION DENSITY",
-                "traffic volume": "TRAFFIC_VOLUME"
-            }
-            selected_metric_col = "congestion_index"
-            for keyword, col_name in metric_keywords.items():
-                if keyword in query_lower:
-                    selected_metric_col = col_name
-                    break
-
-            if selected_metric_col not in data_frame.columns:
-                return f"The '{selected_metric_col}' column is not available for comparison.", None
-
-            subset = data_frame[data_frame["CITY"].isin(cities_to_compare)]
-            if subset.empty:
-                print(f"DEBUG: No data for {cities_to_compare[0]} and {cities_to_compare[1]} for comparison.")
-                return f"No data for {cities_to_compare[0]} and {cities_to_compare[1]} with current filters.", None
-
-            avg_metric_df = subset.groupby("CITY")[selected_metric_col].mean().reset_index()
-            avg_metric_df = avg_metric_df[avg_metric_df['CITY'].isin(cities_to_compare)] # Filter to ensure only queried cities
-
-            if len(avg_metric_df) < 2:
-                print(f"DEBUG: Could not find sufficient {selected_metric_col} data for both specified cities for comparison.")
-                return f"Could not find sufficient {selected_metric_col.replace('_', ' ')} data for both specified cities with current filters.", None
-
-            px_fig = px.bar(avg_metric_df, x='CITY', y=selected_metric_col, 
-                            title=f"Average {selected_metric_col.replace('_', ' ').title()}: {cities_to_compare[0]} vs {cities_to_compare[1]}",
-                            labels={'CITY': 'City', selected_metric_col: f"Average {selected_metric_col.replace('_', ' ').title()}"},
-                            template=plot_template,
-                            color='CITY', # Color bars by city
-                            color_discrete_map={cities_to_compare[0]: "#00D4FF", cities_to_compare[1]: "#7C4DFF"}, # Custom colors
-                            height=default_plot_height
-                            )
-            px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color) # Set title font color
-            px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-            px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-            px_fig.update_layout(legend_font_color=font_color) # Set legend font color
-            st.plotly_chart(px_fig, use_container_width=True)
-            plot_generated = True
-            return f"Interactive comparison of average {selected_metric_col.replace('_', ' ')} between {cities_to_compare[0]} and {cities_to_compare[1]}.", None
-        else:
-            print(f"DEBUG: Did not find two cities for general comparison. Found: {cities_to_compare}")
-            return "Please specify exactly two cities to compare.", None
-
-    # 7. Speed comparison by management type (Plotly Boxplot)
-    elif ("speed" in query_lower and ("ai" in query_lower or "conventional" in query_lower or "management" in query_lower)):
-        print("DEBUG: Triggered: Speed comparison by management type analysis.")
-        if 'MANAGEMENT_TYPE' not in data_frame.columns or 'SPEED' not in data_frame.columns:
-            print("DEBUG: Missing MANAGEMENT_TYPE or SPEED columns for speed comparison.")
-            return "Required columns (MANAGEMENT_TYPE, SPEED) are missing for this plot.", None
-
-        plot_data = data_frame.dropna(subset=['MANAGEMENT_TYPE', 'SPEED'])
-        print(f"DEBUG: Speed by management type - plot_data shape: {plot_data.shape}, unique MANAGEMENT_TYPE: {plot_data['MANAGEMENT_TYPE'].unique()}")
-        if plot_data.empty or plot_data['MANAGEMENT_TYPE'].nunique() < 2:
-            print("DEBUG: Not enough unique management types or speed data for speed comparison.")
-            return "Not enough unique management types or speed data to create a boxplot with current filters.", None
-
-        px_fig = px.box(plot_data, x="MANAGEMENT_TYPE", y="SPEED", 
-                        title="Traffic Speed: AI vs Conventional Management",
-                        labels={"MANAGEMENT_TYPE": "Management Type", "SPEED": "Speed"},
-                        template=plot_template,
-                        color="MANAGEMENT_TYPE", # Color by management type
-                        color_discrete_map={"AI- MANAGEMENT SYSTEM": "#00D4FF", "CONVENTIONAL METHOD": "#7C4DFF"}, # Custom palette
-                        height=default_plot_height
-                        )
-        px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color) # Set title font color
-        px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-        px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-        px_fig.update_layout(legend_font_color=font_color) # Set legend font color
-        st.plotly_chart(px_fig, use_container_width=True)
-        plot_generated = True
-        return "Interactive boxplot comparing traffic speed distributions between AI and conventionally managed systems.", None
-
-    # --- NEW: Congestion comparison by management type (Plotly Bar Chart) ---
-    elif ("congestion" in query_lower and ("ai" in query_lower or "conventional" in query_lower or "management" in query_lower)):
-        print("DEBUG: Triggered: Congestion comparison by management type analysis.")
-        if 'MANAGEMENT_TYPE' not in data_frame.columns or 'congestion_index' not in data_frame.columns:
-            print("DEBUG: Missing MANAGEMENT_TYPE or congestion_index columns for congestion comparison.")
-            return "Required columns (MANAGEMENT_TYPE, congestion_index) are missing for this plot.", None
-
-        plot_data = data_frame.dropna(subset=['MANAGEMENT_TYPE', 'congestion_index'])
-        print(f"DEBUG: Congestion by management type - plot_data shape: {plot_data.shape}, unique MANAGEMENT_TYPE: {plot_data['MANAGEMENT_TYPE'].unique()}")
-        if plot_data.empty or plot_data['MANAGEMENT_TYPE'].nunique() < 2:
-            print("DEBUG: Not enough unique management types or congestion data for comparison.")
-            return "Not enough unique management types or congestion data to compare congestion by management type.", None
-        
-        # Calculate average congestion for each management type
-        avg_congestion_by_mgmt = plot_data.groupby('MANAGEMENT_TYPE')['congestion_index'].mean().reset_index()
-
-        px_fig = px.bar(avg_congestion_by_mgmt, x="MANAGEMENT_TYPE", y="congestion_index", 
-                        title="Average Congestion Index: AI vs Conventional Management",
-                        labels={"MANAGEMENT_TYPE": "Management Type", "congestion_index": "Average Congestion Index"},
-                        template=plot_template,
-                        color="MANAGEMENT_TYPE", # Color by management type
-                        color_discrete_map={"AI- MANAGEMENT SYSTEM": "#00D4FF", "CONVENTIONAL METHOD": "#7C4DFF"}, # Custom palette
-                        height=default_plot_height
-                        )
-        px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color) # Set title font color
-        px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-        px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-        px_fig.update_layout(legend_font_color=font_color) # Set legend font color
-        st.plotly_chart(px_fig, use_container_width=True)
-        plot_generated = True
-
-        response_msg = "Interactive bar chart comparing average congestion index between AI and conventionally managed systems."
-        for index, row in avg_congestion_by_mgmt.iterrows():
-            response_msg += f"\n- Average Congestion Index for **{row['MANAGEMENT_TYPE']}**: {row['congestion_index']:.2f}"
-        return response_msg, None
-    # --- END NEW: Congestion comparison by management type (Plotly Bar Chart) ---
-
-
-    # 8. Correlation between two numeric columns (Text output, no plot)
-    elif ("correlated" in query_lower or "correlation" in query_lower) and "with" in query_lower:
-        print("DEBUG: Triggered: Correlation between two numeric columns analysis.")
-        parts = query_lower.split(" with ")
-        if len(parts) == 2:
-            col1_raw = parts[0].replace("what is the correlation between", "").strip()
-            col2_raw = parts[1].strip()
-
-            col_map = {
-                "wind speed": "wspd", "wind": "wspd", "congestion": "congestion_index",
-                "aqi": "AQI_mean", "temperature": "tavg", "precipitation": "prcp",
-                "population density": "POPULATION DENSITY", "public transport trips": "TOTAL PUBLIC TRANSPORT TRIP",
-                "traffic volume": "TRAFFIC_VOLUME", "speed": "SPEED"
-            }
-            col1 = col_map.get(col1_raw, None)
-            col2 = col_map.get(col2_raw, None)
-
-            if col1 and col2:
-                if col1 not in data_frame.columns or col2 not in data_frame.columns:
-                    return f"One or both of the specified columns ('{col1}', '{col2}') are not available for correlation.", None
-
-                city_found = False
-                for city in data_frame["CITY"].unique():
-                    if city.lower() in query_lower:
-                        city_found = True
-                        subset = data_frame[data_frame["CITY"].str.lower() == city.lower()]
-                        if subset.empty:
-                            print(f"DEBUG: No data for {city} for correlation between {col1} and {col2}.")
-                            return f"No data for {city} with current filters to calculate correlation between {col1} and {col2}.", None
-
-                        subset_clean = subset.dropna(subset=[col1, col2])
-                        if len(subset_clean) < 2 or subset_clean[col1].nunique() < 2 or subset_clean[col2].nunique() < 2:
-                            print(f"DEBUG: Not enough varying data for correlation between {col1} and {col2} for {city}.")
-                            return f"Not enough varying data to calculate correlation between {col1} and {col2} for {city} with current filters.", None
-
-                        correlation = subset_clean[col1].corr(subset_clean[col2])
-                        if pd.isna(correlation):
-                            print(f"DEBUG: Could not calculate correlation for {city} (NaN result).")
-                            return f"Could not calculate correlation for {city} (likely due to insufficient or non-varying data with current filters).", None
-                        return f"The correlation between {col1.replace('_', ' ')} and {col2.replace('_', ' ')} in {city} is **{correlation:.2f}**.", None
-
-                if not city_found:
-                    subset_clean = data_frame.dropna(subset=[col1, col2])
-                    if len(subset_clean) < 2 or subset_clean[col1].nunique() < 2 or subset_clean[col2].nunique() < 2:
-                        print(f"DEBUG: Not enough varying data for overall correlation between {col1} and {col2}.")
-                        return f"Not enough varying data to calculate overall correlation between {col1} and {col2} with current filters.", None
-
-                    correlation = subset_clean[col1].corr(subset_clean[col2])
-                    if pd.isna(correlation):
-                        print(f"DEBUG: Could not calculate overall correlation (NaN result).")
-                        return f"Could not calculate overall correlation (likely due to insufficient or non-varying data with current filters).", None
-                    return f"The overall correlation between {col1.replace('_', ' ')} and {col2.replace('_', ' ')} across all filtered data is **{correlation:.2f}**.", None
-            else:
-                return "Please specify two valid numeric columns for correlation (e.g., 'wind speed and congestion').", None
-        else:
-            return "Please rephrase your correlation query using 'X with Y' format.", None
-
-    # 9. Temperature impact on congestion (Plotly Bar Chart)
-    elif ("temperature" in query_lower and ("effect" in query_lower or "impact" in query_lower) and "congestion" in query_lower):
-        print("DEBUG: Triggered: Temperature impact on congestion analysis.")
-        val_col = "tavg"
-        target_col = "congestion_index"
-        if val_col not in data_frame.columns or target_col not in data_frame.columns:
-            return f"Required columns ('{val_col}', '{target_col}') not found for temperature impact analysis.", None
-
-        corrs = []
-        for city_name in data_frame['CITY'].unique():
-            city_df = data_frame[data_frame['CITY'] == city_name]
-            if len(city_df.dropna(subset=[val_col, target_col])) > 1 and \
-               city_df[val_col].nunique() > 1 and city_df[target_col].nunique() > 1:
-                corr_val = city_df[val_col].corr(city_df[target_col])
-                if pd.notnull(corr_val):
-                    corrs.append({"CITY": city_name, "Absolute Correlation": abs(corr_val), "Correlation": corr_val})
-
-        if not corrs:
-            print("DEBUG: Could not calculate temperature impact correlations.")
-            return "Could not calculate temperature impact correlations with current filters; insufficient data.", None
-
-        corr_df = pd.DataFrame(corrs).sort_values(by="Absolute Correlation", ascending=False)
-        
-        px_fig = px.bar(corr_df, x="Absolute Correlation", y="CITY", orientation='h',
-                        title="Cities by Impact of Temperature on Congestion (Absolute Correlation)",
-                        labels={"Absolute Correlation": "Absolute Correlation with Congestion Index", "CITY": "City"},
-                        template=plot_template,
-                        color="Absolute Correlation", color_continuous_scale=px.colors.sequential.OrRd, # Changed palette for dark theme
-                        height=default_plot_height
-                        )
-        px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color) # Set title font color
-        px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-        px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-        px_fig.update_layout(legend_font_color=font_color) # Set legend font color
-        st.plotly_chart(px_fig, use_container_width=True)
-        plot_generated = True
-        return f"{corr_df['CITY'].iloc[0]} shows the highest absolute correlation between temperature and congestion. This plot shows the strength of this relationship across cities.", None
-
-    # 10. Strongest factor affecting congestion (Plotly Bar Chart)
-    elif "strongest factor" in query_lower or ("strongest" in query_lower and "effect" in query_lower):
-        print("DEBUG: Triggered: Strongest factor analysis.")
-        target_col = "congestion_index"
-        if "on speed" in query_lower:
-            target_col = "SPEED"
-        elif "on traffic volume" in query_lower:
-            target_col = "TRAFFIC_VOLUME"
-
-        possible_factors = ["AQI_mean", "prcp", "tavg", "wspd", "POPULATION DENSITY", "TOTAL PUBLIC TRANSPORT TRIP", "TRAFFIC_VOLUME", "SPEED"]
-        numeric_cols_present = [col for col in possible_factors if col in data_frame.columns and
-                                pd.api.types.is_numeric_dtype(data_frame[col]) and col != target_col]
-
-        if not numeric_cols_present:
-            return "No suitable numeric factor columns found to analyze the strongest effect with current filters.", None
-        if target_col not in data_frame.columns or not pd.api.types.is_numeric_dtype(data_frame[target_col]):
-            return f"{target_col.replace('_', ' ')} column is missing or not numeric, cannot perform correlation analysis.", None
-
-        corr_values = {}
-        for col in numeric_cols_present:
-            subset_clean = data_frame.dropna(subset=[col, target_col])
-            if len(subset_clean) > 1 and subset_clean[col].nunique() > 1 and subset_clean[target_col].nunique() > 1:
-                correlation = subset_clean[col].corr(subset_clean[target_col])
-                if pd.notnull(correlation):
-                    corr_values[col] = correlation
-
-        if not corr_values:
-            print(f"DEBUG: Could not calculate correlations for any factors with {target_col}.")
-            return f"Could not calculate correlations for any factors with current filters (likely due to insufficient or non-varying data for {target_col.replace('_', ' ')}).", None
-
-        corr_df = pd.DataFrame(list(corr_values.items()), columns=['Factor', 'Correlation'])
-        corr_df['Absolute Correlation'] = corr_df['Correlation'].abs()
-        corr_df = corr_df.sort_values(by='Absolute Correlation', ascending=False)
-
-        px_fig = px.bar(corr_df, x="Correlation", y="Factor", orientation='h',
-                        title=f"Correlation of Various Factors with {target_col.replace('_', ' ').title()}",
-                        labels={"Correlation": "Correlation Coefficient (closer to +/-1 indicates stronger relationship)", "Factor": "Factor"},
-                        template=plot_template,
-                        color="Correlation", color_continuous_scale=px.colors.sequential.RdPu, # New palette for dark theme
-                        height=default_plot_height
-                        )
-        px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color) # Set title font color
-        px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-        px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-        px_fig.update_layout(legend_font_color=font_color) # Set legend font color
-        st.plotly_chart(px_fig, use_container_width=True)
-        plot_generated = True
-        return f"The factor with the strongest absolute correlation to {target_col.replace('_', ' ')} is **{corr_df['Factor'].iloc[0].replace('_', ' ')}** (Correlation: {corr_df['Correlation'].iloc[0]:.2f}). The plot shows other factors as well.", None
-
-    # 11. Correlation Heatmap (Plotly with Dynamic Height)
-    elif "heatmap" in query_lower or "correlation matrix" in query_lower:
-        print("DEBUG: Triggered: Correlation Heatmap analysis.")
-        numeric_df = data_frame.select_dtypes(include='number')
-        if numeric_df.shape[1] < 2:
-             return "Not enough numeric data to generate a correlation heatmap with current filters.", None
-
-        numeric_df_cleaned = numeric_df.dropna(axis=1, how='all')
-        if numeric_df_cleaned.shape[1] < 2:
-            return "Not enough numeric columns with valid data to generate a correlation heatmap.", None
-
-        corr_matrix = numeric_df_cleaned.corr()
-        if corr_matrix.empty:
-            print("DEBUG: Could not compute correlation matrix.")
-            return "Could not compute correlation matrix; likely no variance in filtered numeric data.", None
-
-        # DYNAMIC SIZING: Calculate height based on number of features (2x original)
-        num_features = len(corr_matrix.columns)
-        plot_height = max(800, num_features * 60) # Base height 800, add 60px per feature
-
-        px_fig = px.imshow(corr_matrix, 
-                           text_auto=".2f", # Show correlation values on heatmap, formatted to 2 decimal places
-                           color_continuous_scale=px.colors.sequential.Magma if plot_template == "plotly_dark" else px.colors.sequential.Blues,
-                           aspect="equal", # Make it a square grid
-                           title="Correlation Heatmap of Numeric Features",
-                           template=plot_template,
-                           height=plot_height # Set dynamic height
-                           )
-        px_fig.update_xaxes(side="bottom") # Ensure x-axis labels are at the bottom
-        px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color) # Set title font color
-        px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-        px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-        px_fig.update_layout(legend_font_color=font_color) # Set legend font color
-        px_fig.update_traces(textfont_color=font_color) # Ensure text on heatmap is white
-        px_fig.update_traces(textfont_size=16) # Increased font size for values on heatmap
-        st.plotly_chart(px_fig, use_container_width=True) # use_container_width will respect the width, and the height is set in layout
-        plot_generated = True
-        return "Interactive correlation heatmap showing relationships between all numeric features in the dataset. The plot size has been adjusted for better visibility.", None
-
-    # 12. Multivariable AQI vs Volume by Management/City (Plotly Scatter)
-    elif ("volume" in query_lower or "traffic volume" in query_lower) and ("aqi" in query_lower or "congestion" in query_lower) and ("by management" in query_lower or "by city" in query_lower):
-        print("DEBUG: Triggered: Multivariable AQI/Volume by Management/City analysis.")
-        x_col, y_col, hue_col = None, None, None
-
-        if "aqi" in query_lower: x_col = "AQI_mean"
-        elif "congestion" in query_lower: x_col = "congestion_index"
-
-        if "volume" in query_lower or "traffic volume" in query_lower: y_col = "TRAFFIC_VOLUME"
-        elif "speed" in query_lower: y_col = "SPEED"
-
-        if "by management" in query_lower: hue_col = "MANAGEMENT_TYPE"
-        elif "by city" in query_lower: hue_col = "CITY"
-        else: return "Please specify grouping for scatter plot (e.g., 'by management' or 'by city').", None
-
-        if not all(c in data_frame.columns for c in [x_col, y_col, hue_col]):
-            return f"One or more required columns ({x_col}, {y_col}, {hue_col}) are missing for this plot with current filters.", None
-
-        plot_data = data_frame.dropna(subset=[x_col, y_col, hue_col])
-        print(f"DEBUG: Multi-variable scatter - plot_data shape: {plot_data.shape}, unique {hue_col}: {plot_data[hue_col].unique()}")
-        if plot_data.empty or plot_data[hue_col].nunique() < 2:
-            print(f"DEBUG: Insufficient data or unique '{hue_col}' values for multi-variable scatter plot.")
-            return f"Insufficient data or unique '{hue_col.replace('_', ' ')}' values for scatter plot with current filters.", None
-
-        px_fig = px.scatter(plot_data, x=x_col, y=y_col, color=hue_col, 
-                            title=f"{y_col.replace('_', ' ').title()} vs {x_col.replace('_', ' ').title()}, by {hue_col.replace('_', ' ').title()}",
-                            labels={x_col: x_col.replace('_', ' ').title(), y_col: y_col.replace('_', ' ').title(), hue_col: hue_col.replace('_', ' ').title()},
-                            template=plot_template,
-                            color_discrete_sequence=px.colors.qualitative.Vivid if plot_template == "plotly_dark" else px.colors.qualitative.Safe, # Varied palette
-                            height=default_plot_height
-                            )
-        px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color) # Set title font color
-        px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-        px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-        px_fig.update_layout(legend_font_color=font_color) # Set legend font color
-        st.plotly_chart(px_fig, use_container_width=True)
-        plot_generated = True
-        return f"Interactive scatter plot showing {y_col.replace('_', ' ')} vs. {x_col.replace('_', ' ')}, color-coded by {hue_col.replace('_', ' ')}.", None
-
-    # 13. Season-based analysis (Plotly Boxplot)
-    elif "season" in query_lower or "seasonal" in query_lower:
-        print("DEBUG: Triggered: Season-based analysis.")
-        if 'date' not in data_frame.columns or not pd.api.types.is_datetime64_any_dtype(data_frame['date']):
-            return "Date column not found or not in datetime format. Cannot analyze by season.", None
-
-        def get_season(date):
-            month = date.month
-            if 3 <= month <= 5: return 'Spring'
-            elif 6 <= month <= 8: return 'Summer'
-            elif 9 <= month <= 11: return 'Autumn'
-            else: return 'Winter'
-
-        temp_df = data_frame.copy()
-        temp_df['season'] = temp_df['date'].apply(get_season)
-
-        if "congestion by season" in query_lower or "seasonal congestion" in query_lower or "congestion in seasons" in query_lower:
-            if 'congestion_index' not in temp_df.columns:
-                return "Congestion index column not found for seasonal analysis.", None
-
-            plot_data = temp_df.dropna(subset=['congestion_index', 'season'])
-            print(f"DEBUG: Seasonal congestion - plot_data shape: {plot_data.shape}, unique seasons: {plot_data['season'].unique()}")
-            if plot_data.empty:
-                print("DEBUG: No valid data to plot seasonal congestion.")
-                return "No valid data to plot seasonal congestion after filtering NaN values.", None
-
-            px_fig = px.box(plot_data, x='season', y='congestion_index', 
-                            category_orders={"season": ['Spring', 'Summer', 'Autumn', 'Winter']},
-                            title="Congestion Index Distribution by Season",
-                            labels={'season': 'Season', 'congestion_index': 'Congestion Index'},
-                            template=plot_template,
-                            color='season', # Color by season
-                            color_discrete_sequence=px.colors.qualitative.Pastel, # Changed palette for dark theme
-                            height=default_plot_height
-                            )
-            px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color) # Set title font color
-            px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-            px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-            px_fig.update_layout(legend_font_color=font_color) # Set legend font color
-            st.plotly_chart(px_fig, use_container_width=True)
-            plot_generated = True
-            return "Interactive boxplot showing congestion index distribution by season.", None
-
-        return "Please specify what seasonal analysis you'd like (e.g., 'congestion by season').", None
-
-    # 14. Holiday vs Non-Holiday analysis (Plotly Boxplot)
-    elif "holiday" in query_lower:
-        print("DEBUG: Triggered: Holiday vs Non-Holiday analysis.")
-        if 'Holiday_Flag' not in data_frame.columns:
-            return "The 'Holiday_Flag' column is not found in the dataset. Please ensure your 'city_data.csv' includes this column with boolean (True/False) values to analyze holiday impact.", None
-        if 'congestion_index' not in data_frame.columns:
-            return "Congestion index column not found for holiday analysis.", None
-
-        plot_data = data_frame.dropna(subset=['congestion_index', 'Holiday_Flag'])
-        print(f"DEBUG: Holiday analysis - plot_data shape: {plot_data.shape}, unique Holiday_Flag: {plot_data['Holiday_Flag'].unique()}")
-        if plot_data.empty or plot_data['Holiday_Flag'].nunique() < 2:
-            print("DEBUG: Not enough valid data or unique values in 'Holiday_Flag' for holiday analysis.")
-            return "Not enough valid data or unique values in 'Holiday_Flag' to compare holiday vs non-holiday congestion. Ensure there are both holiday and non-holiday entries.", None
-
-        px_fig = px.box(plot_data, x='Holiday_Flag', y='congestion_index', 
-                        title="Congestion Index: Holiday vs Non-Holiday",
-                        labels={'Holiday_Flag': 'Is Holiday?', 'congestion_index': 'Congestion Index'},
-                        template=plot_template,
-                        color='Holiday_Flag', # Color by holiday flag
-                        color_discrete_map={True: "#00D4FF", False: "#7C4DFF"}, # Custom palette
-                        height=default_plot_height
-                        )
-        px_fig.update_xaxes(tickvals=[0, 1], ticktext=['Non-Holiday', 'Holiday'])
-        px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color) # Set title font color
-        px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-        px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
-        px_fig.update_layout(legend_font_color=font_color) # Set legend font color
-        st.plotly_chart(px_fig, use_container_width=True)
-        plot_generated = True
-        return "Interactive boxplot comparing congestion index on holidays versus non-holidays.", None
-
-    # Default fallback
-    print("DEBUG: No specific plotting logic matched the query.")
-    return "I'm still learning to understand this question. Try asking for trends, comparisons, rankings, correlations, or specific plots like heatmaps. Be more specific about columns.", None
-
 # =============================================================================
 #                     GEMINI LLM INTEGRATION (UNCHANGED)
 # =============================================================================
@@ -1804,6 +956,7 @@ def get_gemini_answer(query, context_summary, plot_description):
     if not gemini_api_key:
         return "Gemini LLM not active. Please enter your Gemini API key in the sidebar to get AI-powered explanations."
     try:
+        import google.generativeai as genai # deferred until a key is entered
         genai.configure(api_key=gemini_api_key)
         model = genai.GenerativeModel("models/gemini-1.5-flash-latest")
         prompt_parts = [
@@ -1831,42 +984,64 @@ if user_query:
     with st.container(border=True):
         st.markdown('<hr class="main-separator" />', unsafe_allow_html=True)
         with st.spinner("Analyzing your query..."):
-            # Pass the selected Plotly template and font_color to the plotting function
-            response_text, fig_object = plot_and_answer(user_query, df, plotly_template, plotly_font_color)
+            query_cache = get_query_cache()
+            normalized_query = router.normalize_query(user_query)
+            query_key = (
+                df_original.attrs.get('dataset_version'), normalized_query, filter_fingerprint,
+                st.session_state.theme, tuple(selected_heatmap_columns), heatmap_method
+            )
+            cached_answer = query_cache.get(query_key)
+            query_cache_hit = cached_answer is not None
+            if not query_cache_hit:
+                answer = analysis_engine.ask(
+                    normalized_query, filter_view, theme=st.session_state.theme,
+                    heatmap_subset=selected_heatmap_columns, heatmap_method=heatmap_method
+                )
+                # Figures are stored as JSON: compact, and a hit rebuilds a fresh figure
+                cached_answer = query_cache.put(query_key, (answer.text, answer.figure_json()))
+            response_text, fig_json = cached_answer
+
+            if fig_json is not None:
+                st.plotly_chart(pio.from_json(fig_json), use_container_width=True)
 
             st.subheader("Analysis Result")
             st.write(response_text)
 
-            # Only provide download button for Matplotlib figures (Plotly figures have built-in download)
-            if fig_object: # This means a Matplotlib figure was returned (e.g., if a new plot type is added later)
-                buf = io.BytesIO()
-                fig_object.savefig(buf, format="png", bbox_inches='tight', facecolor=fig_object.get_facecolor())
-                buf.seek(0)
-                st.download_button("Download Plot (PNG)", buf, "plot.png", "image/png")
-                plt.close(fig_object)
-            elif "Interactive" in response_text: # If a Plotly figure was generated
+            # Plotly figures have a built-in download in their menu
+            if fig_json is not None:
                  st.info("The interactive plot above allows zooming, panning, and data inspection. You can download it directly from the plot's menu.")
 
             if gemini_api_key:
                 st.subheader("Gemini-enhanced Explanation")
                 context = ""
                 if df is not None and not df.empty:
-                    numeric_cols = df.select_dtypes(include='number').columns.tolist()
-                    non_numeric_cols = df.select_dtypes(exclude='number').columns.tolist()
-                    context = f"Numerical features in filtered data: {', '.join(numeric_cols)}.\nCategorical features in filtered data: {', '.join(non_numeric_cols)}.\nNumber of rows in filtered data: {len(df)}.\nUnique Cities in filtered data: {df['CITY'].nunique()}."
-                    if 'date' in df.columns and pd.api.types.is_datetime64_any_dtype(df['date']):
-                        context += f"\nDate Range in filtered data: {df['date'].min().strftime('%Y-%m-%d')} to {df['date'].max().strftime('%Y-%m-%d')}."
-                    if 'Holiday_Flag' in df.columns:
-                        holiday_count = df['Holiday_Flag'].sum()
-                        non_holiday_count = len(df) - holiday_count
+                    filtered_profile = filter_view.profile() # kept with the cached filter result
+                    numeric_cols = filtered_profile.columns_of_kind('numeric')
+                    non_numeric_cols = filtered_profile.columns_of_kind('boolean', 'datetime', 'categorical')
+                    context = f"Numerical features in filtered data: {', '.join(numeric_cols)}.\nCategorical features in filtered data: {', '.join(non_numeric_cols)}.\nNumber of rows in filtered data: {filtered_profile.rows}.\nUnique Cities in filtered data: {len(filtered_profile.group_rows)}."
+                    date_range = filtered_profile.date_coverage() if 'date' in filtered_profile else None
+                    if date_range is not None:
+                        context += f"\nDate Range in filtered data: {date_range[0].strftime('%Y-%m-%d')} to {date_range[1].strftime('%Y-%m-%d')}."
+                    if 'Holiday_Flag' in filtered_profile:
+                        holiday_count = filtered_profile.columns['Holiday_Flag'].n_true
+                        non_holiday_count = filtered_profile.rows - holiday_count
                         context += f"\nHoliday entries: {holiday_count}, Non-holiday entries: {non_holiday_count}."
                 else:
                     context = "No data loaded or available after filters. Gemini will provide a general explanation."
 
                 gemini_response = get_gemini_answer(user_query, context, response_text)
                 st.markdown(gemini_response)
-            elif not fig_object and "I'm still learning" in response_text and 'plot_generated' not in locals():
+            elif fig_json is None and "I'm still learning" in response_text:
                 st.info("Try asking about trends, comparisons, or add a Gemini key for enhanced insights.")
+
+    with diagnostics:
+        query_cache_stats = query_cache.stats()
+        st.markdown(
+            f"**Query cache**: {'hit' if query_cache_hit else 'miss'}; "
+            f"{query_cache_stats['entries']} answers, {query_cache_stats['bytes'] / 1e6:.1f} MB, "
+            f"{query_cache_stats['hits']} hits / {query_cache_stats['misses']} misses, "
+            f"{query_cache_stats['expirations']} expired"
+        )
 # -------------------- Separator before “Download Filtered Data” --------------------
 st.markdown('<hr class="main-separator" />', unsafe_allow_html=True)
 
@@ -1876,12 +1051,25 @@ st.markdown('<hr class="main-separator" />', unsafe_allow_html=True)
 # Wrap data download section in a container
 with st.container(border=True):
     st.header("Download Filtered Data")
-    csv_data = df.to_csv(index=False).encode('utf-8')
+    export_col1, export_col2 = st.columns([1, 3])
+    with export_col1:
+        export_format = st.selectbox(
+            "Format", list(export.EXPORT_FORMATS),
+            format_func=lambda key: export.EXPORT_FORMATS[key].label, key="export_format"
+        )
+    with export_col2:
+        export_selected_columns = st.multiselect(
+            "Columns", export.export_columns(df), key="export_columns",
+            placeholder="All columns", help="Leave empty to export every column."
+        )
+    export_spec = export.EXPORT_FORMATS[export_format]
+    # The export is only written when the button is clicked, not on every rerun
     st.download_button(
-        label="Download Filtered Data as CSV",
-        data=csv_data,
-        file_name="filtered_traffic_data.csv",
-        mime="text/csv",
+        label=f"Download Filtered Data as {export_spec.label}",
+        data=functools.partial(export.export_file, df, export_format, export_selected_columns),
+        file_name=f"filtered_traffic_data.{export_spec.extension}",
+        mime=export_spec.mime,
+        on_click="ignore",
     )
     st.info("This download provides the data currently visible/used after applying all filters.")
 
@@ -1894,48 +1082,120 @@ st.markdown('<hr class="main-separator" />', unsafe_allow_html=True)
 # Wrap city dashboard section in a container
 with st.container(border=True):
     st.header("City Traffic Dashboard")
-    city_geojsons = {
-        "BARCELONA": "geojson/barcelona_congestion_randomized.geojson",
-        "LONDON": "geojson/london_congestion_randomized.geojson",
-        "NEW YORK CITY": "geojson/new_york_congestion_randomized.geojson",
-        "LOS ANGELES": "geojson/los_angeles_congestion_randomized.geojson",
-        "PARIS": "geojson/paris_congestion_randomized.geojson",
-        "MELBOURNE": "geojson/melbourne_congestion_randomized.geojson",
-        "BANGALORE": "geojson/bangalore_congestion_randomized.geojson",
-        "BUENOS AIRES": "geojson/buenos_aires_congestion_randomized.geojson"
-    }
+    city_geojsons = geostore.CITY_GEOJSONS
 
     st.sidebar.subheader("City Dashboard Controls")
     dashboard_city = st.sidebar.selectbox("Select a City for Dashboard", list(city_geojsons.keys()))
 
-    @st.cache_data
-    def load_single_geojson(geo_path):
+    # The map is sent at the coarsest stored simplification level that still
+    # looks exact at its initial zoom (see flowsight.geostore)
+    MAP_INITIAL_ZOOM = 11
+    full_map_detail = st.sidebar.toggle(
+        "Full map detail", value=False,
+        help="Send the road network unsimplified. Slower to load; only visible when zooming far in."
+    )
+    map_tolerance = 0.0 if full_map_detail else geostore.tolerance_for_zoom(MAP_INITIAL_ZOOM)
+
+    # Shared by all sessions without the copy st.cache_data makes on every
+    # hit, so the layer must not be modified in place. The (size, mtime) stamp
+    # reloads a source file that changed while the server runs.
+    @st.cache_resource
+    def load_single_geojson(geo_path, source_stamp, tolerance=0.0):
         """
-        Loads a single GeoJSON file using geopandas.
-        Caches the result for performance.
+        Loads a city GeoJSON through the GeoParquet store (flowsight.geostore)
+        at a simplification tolerance, converting it on first use. Returns a
+        geostore.CityLayer.
         """
         try:
-            return gpd.read_file(geo_path)
+            return geostore.load_city_layer(geo_path, tolerance=tolerance)
         except Exception as e:
             st.error(f"Error loading GeoJSON file '{geo_path}': {e}. Please check file path and content.")
             return None
 
+    KEPLER_HTML_CACHE_ENTRIES = 16
+
+    # Building the map re-serializes the whole road network into a
+    # multi-megabyte HTML page, so it is done once per city, layer version
+    # (source content hash), simplification level and segment color rather
+    # than on every rerun.
+    @st.cache_resource(max_entries=KEPLER_HTML_CACHE_ENTRIES)
+    def kepler_map_html(city, layer_version, tolerance, segment_color, _city_layer):
+        """
+        Returns the Kepler.gl HTML of a city layer (a geostore.CityLayer).
+        The leading underscore keeps Streamlit from hashing the layer;
+        `layer_version` and `tolerance` identify it instead.
+        """
+        # Initial view state: the mean feature centroid, precomputed by the store
+        lat, lon = _city_layer.center
+
+        # Updated Kepler.gl config to use Positron basemap.
+        kepler_config = {
+            "version": "v1",
+            "config": {
+                "mapState": {
+                    "latitude": lat,
+                    "longitude": lon,
+                    "zoom": MAP_INITIAL_ZOOM
+                },
+                "mapStyle": {
+                    "styleType": "positron" # Changed to Positron basemap
+                },
+                "visState": {
+                    "layers": [
+                        {
+                            "id": "traffic_segments",
+                            "type": "geojson",
+                            "config": {
+                                "dataId": f"{city}_data",
+                                "label": "Traffic Segments",
+                                "color": list(segment_color),
+                                "highlightColor": [255, 167, 38, 255], # Vibrant orange accent for highlight
+                                "columns": {
+                                    "geojson": "geometry"
+                                },
+                                "isVisible": True,
+                                "visConfig": {
+                                    "opacity": 0.8,
+                                    "thickness": 0.5
+                                }
+                            }
+                        }
+                    ]
+                }
+            }
+        }
+
+        # Instantiate Kepler with an increased height and default config
+        from keplergl import KeplerGl # deferred until the dashboard map is shown
+        map_viewer = KeplerGl(height=800, config=kepler_config)
+
+        # Add the full GeoDataFrame. User can now use the Kepler UI to configure layers.
+        map_viewer.add_data(data=_city_layer.frame, name=f"{city}_data")
+        return map_viewer._repr_html_()
+
+    @st.cache_resource
+    def load_segment_matrix(city, layer_version, _city_layer):
+        """
+        Builds the segment x month congestion matrix of a city layer from its
+        monthly columns (flowsight.segments), once per city and layer version.
+        """
+        return segments.SegmentMatrix.build(_city_layer.frame)
+
     geo_path = city_geojsons.get(dashboard_city)
-    gdf = None
+    city_layer = None
     if geo_path:
-        gdf = load_single_geojson(geo_path)
+        city_layer = load_single_geojson(geo_path, geostore.source_stamp(geo_path), map_tolerance)
+    gdf = city_layer.frame if city_layer is not None else None
 
 
     if gdf is None:
         st.warning(f"GeoJSON data could not be loaded for {dashboard_city}. Map controls are disabled.")
 
 
-    if 'date' in df_original.columns and pd.api.types.is_datetime64_any_dtype(df_original['date']):
-        available_dates_for_dashboard_city = df_original[df_original['CITY'] == dashboard_city]['date'].unique()
-        # Check if available_dates_for_dashboard_city is not empty before accessing .size
-        if available_dates_for_dashboard_city.size > 0: 
-            min_date_dash = pd.to_datetime(available_dates_for_dashboard_city.min())
-            max_date_dash = pd.to_datetime(available_dates_for_dashboard_city.max())
+    if 'date' in dataset_profile and dataset_profile.columns['date'].kind == 'datetime':
+        dashboard_date_coverage = dataset_profile.date_coverage(dashboard_city)
+        if dashboard_date_coverage is not None:
+            min_date_dash, max_date_dash = dashboard_date_coverage
             default_date_dash = max_date_dash
             dashboard_date_selected = st.sidebar.date_input(
                 "Select Date for Dashboard Stats",
@@ -1952,13 +1212,14 @@ with st.container(border=True):
 
     if dashboard_date_selected:
         filter_date = pd.to_datetime(dashboard_date_selected)
-        city_df_dashboard = df_original[(df_original['CITY'] == dashboard_city) & (df_original['date'] == filter_date)]
+        city_rows_dashboard = select_cities(df_original, [dashboard_city], dataset_index)
+        city_df_dashboard = city_rows_dashboard[city_rows_dashboard['date'] == filter_date]
         
         st.markdown(f"### {dashboard_city.upper()} - TRAFFIC STATS")
         
         if city_df_dashboard.empty:
             st.warning(f"No daily data available for {dashboard_city} on {dashboard_date_selected.strftime('%B %d, %Y')}. Displaying overall city averages for stats below.")
-            city_df_dashboard_display = df_original[df_original['CITY'] == dashboard_city]
+            city_df_dashboard_display = city_rows_dashboard
             if city_df_dashboard_display.empty:
                 st.error(f"No data found for {dashboard_city} at all in the original dataset.")
                 st.stop()
@@ -1994,9 +1255,9 @@ with st.container(border=True):
 
         st.subheader("Monthly Congestion Trend")
         if 'date' in df_original.columns and pd.api.types.is_datetime64_any_dtype(df_original['date']):
-            monthly_avg = df_original[df_original['CITY'] == dashboard_city].groupby(df_original['date'].dt.to_period("M"))['congestion_index'].mean()
+            monthly_avg = moment_cube.where({'CITY': [dashboard_city]}).mean_by('year_month', 'congestion_index').set_index('year_month')['congestion_index']
+            monthly_avg.index.name = 'date'
             if not monthly_avg.empty:
-                monthly_avg.index = monthly_avg.index.to_timestamp()
                 # Plotly line chart for monthly trend
                 px_fig_monthly = px.line(monthly_avg.reset_index(), x='date', y='congestion_index',
                                          title=f"Monthly Congestion Trend in {dashboard_city}",
@@ -2018,66 +1279,15 @@ with st.container(border=True):
     st.subheader(f"Interactive Traffic Congestion Map for {dashboard_city}")
     if gdf is not None and not gdf.empty:
         try:
-            # Determine initial view state from the GeoDataFrame
-            if not gdf.empty:
-                geom_type = gdf.geometry.iloc[0].geom_type
-                if geom_type == 'Point':
-                    lat = float(gdf.geometry.y.mean())
-                    lon = float(gdf.geometry.x.mean())
-                else: # LineString or Polygon
-                    lat = float(gdf.geometry.centroid.y.mean())
-                    lon = float(gdf.geometry.centroid.x.mean())
-            else:
-                lat, lon = 0, 0 # Fallback
-
-            # Updated Kepler.gl config to use Positron basemap.
-            kepler_config = {
-                "version": "v1",
-                "config": {
-                    "mapState": {
-                        "latitude": lat,
-                        "longitude": lon,
-                        "zoom": 11
-                    },
-                    "mapStyle": {
-                        "styleType": "positron" # Changed to Positron basemap
-                    },
-                    "visState": {
-                        "layers": [
-                            {
-                                "id": "traffic_segments",
-                                "type": "geojson",
-                                "config": {
-                                    "dataId": f"{dashboard_city}_data",
-                                    "label": "Traffic Segments",
-                                    "color": [0, 212, 255] if plotly_template == "plotly_dark" else [33, 150, 243], # Vibrant blue for segments
-                                    "highlightColor": [255, 167, 38, 255], # Vibrant orange accent for highlight
-                                    "columns": {
-                                        "geojson": "geometry"
-                                    },
-                                    "isVisible": True,
-                                    "visConfig": {
-                                        "opacity": 0.8,
-                                        "thickness": 0.5
-                                    }
-                                }
-                            }
-                        ]
-                    }
-                }
-            }
-            
-            # Instantiate Kepler with an increased height and default config
-            map_viewer = KeplerGl(height=800, config=kepler_config)
-            
-            # Add the full GeoDataFrame. User can now use the Kepler UI to configure layers.
-            map_viewer.add_data(data=gdf, name=f"{dashboard_city}_data")
+            # Map HTML cached per (city, layer version, level, segment color); see kepler_map_html
+            segment_color = [0, 212, 255] if plotly_template == "plotly_dark" else [33, 150, 243] # Vibrant blue for segments
+            map_html = kepler_map_html(dashboard_city, city_layer.version, city_layer.tolerance, tuple(segment_color), city_layer)
 
-            map_html = map_viewer._repr_html_()
-            
             # Display the map with an increased height
             st.components.v1.html(map_html, height=800, scrolling=True)
             st.info("Use the map controls to add layers, select data columns (e.g., monthly congestion), and customize the visualization.")
+            if city_layer.tolerance:
+                st.caption(f"Road geometry simplified to {city_layer.tolerance:g}° for the initial zoom. Turn on 'Full map detail' in the sidebar for exact geometry.")
 
         except Exception as e:
             st.error(f"An unexpected error occurred while setting up Kepler.gl map: {e}")
@@ -2087,6 +1297,38 @@ with st.container(border=True):
         elif gdf is not None and gdf.empty:
             st.warning(f"GeoJSON data for {dashboard_city} is empty. Cannot display map.")
 
+    # Segment rankings from the layer's monthly congestion columns ("2023-06", ...)
+    if gdf is not None and not gdf.empty:
+        segment_matrix = load_segment_matrix(dashboard_city, city_layer.version, city_layer)
+        if segment_matrix.months:
+            st.subheader(f"Most Congested Segments in {dashboard_city}")
+            seg_col1, seg_col2, seg_col3 = st.columns([2, 3, 1])
+            with seg_col1:
+                segment_month = st.selectbox("Month", segment_matrix.months, index=len(segment_matrix.months) - 1, key="segment_month")
+            with seg_col2:
+                segment_ranking = st.radio("Rank by", ["Congestion", "Increase from previous month"], horizontal=True, key="segment_ranking")
+            with seg_col3:
+                segment_top_n = st.number_input("Segments", min_value=1, max_value=1000, value=segments.TOP_N_DEFAULT, step=10, key="segment_top_n")
+
+            top_segments = segment_matrix.top(
+                segment_month, int(segment_top_n), by='value' if segment_ranking == "Congestion" else 'delta'
+            )
+            if top_segments.empty:
+                st.info(f"No segment has {'a congestion value' if segment_ranking == 'Congestion' else 'values for both this and the previous month'} in {segment_month}.")
+            else:
+                st.plotly_chart(
+                    segments.highlight_figure(city_layer, top_segments, segment_month, plotly_template, font_color=plotly_font_color),
+                    use_container_width=True
+                )
+                st.dataframe(
+                    top_segments.drop(columns='row').rename(columns={
+                        'rank': "Rank", 'segment_id': segment_matrix.id_column or "Segment",
+                        'value': f"Congestion {segment_month}", 'change': "Change from previous month",
+                        'worst_month': "Worst month", 'worst_value': "Worst month congestion",
+                    }),
+                    hide_index=True, use_container_width=True
+                )
+
 
 # -------------------- Separator before “Traffic Policy Impact Analysis” --------------------
 st.markdown('<hr class="main-separator" />', unsafe_allow_html=True)
@@ -2129,10 +1371,10 @@ def analyze_policy_impact(df_traffic, df_policies, days_window=300, plot_templat
             start_date = policy_date - timedelta(days=days_window)
             end_date = policy_date + timedelta(days=days_window)
 
-            analysis_data = df_original[
-                (df_original['CITY'] == selected_city) &
-                (df_original['date'] >= start_date) &
-                (df_original['date'] <= end_date)
+            city_traffic = select_cities(df_original, [selected_city], dataset_index)
+            analysis_data = city_traffic[
+                (city_traffic['date'] >= start_date) &
+                (city_traffic['date'] <= end_date)
             ].copy()
 
             if analysis_data.empty:
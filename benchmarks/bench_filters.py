@@ -0,0 +1,100 @@
+"""
+Benchmark: sidebar filter latency as the row count grows.
+
+Compares three ways of applying the sidebar filters to the city traffic data:
+
+- chained:  the old sidebar code, one boolean filter and one new DataFrame per widget
+- mask:     flowsight.filters single-pass mask
+- indexed:  flowsight.filters with the range and bitmap indexes
+
+Larger datasets are synthesized by repeating the real rows with a little noise
+on the numeric columns. Run from the repository root:
+
+    python benchmarks/bench_filters.py --sizes 25000 250000 2500000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flowsight import datasets, filters, indexes  # noqa: E402
+
+
+def synthesize(df, n_rows, seed=0):
+    """Repeats the rows of `df` up to `n_rows`, jittering the float columns."""
+    rng = np.random.default_rng(seed)
+    positions = np.resize(np.arange(len(df)), n_rows)
+    big = df.iloc[positions].reset_index(drop=True)
+    for col in big.select_dtypes(include='float32').columns:
+        values = big[col].to_numpy()
+        big[col] = values + rng.normal(0, 0.01, n_rows).astype(np.float32) * np.abs(values).mean()
+    return big
+
+
+def chained_filters(df, state):
+    """The pre-engine sidebar: copy once, then one boolean filter per widget."""
+    out = df.copy()
+    for col, (low, high) in state.ranges.items():
+        out = out[(out[col] >= low) & (out[col] <= high)]
+    for col, selected in state.selections.items():
+        out = out[out[col].isin(selected)]
+    return out
+
+
+def full_state(df):
+    ranges = {col: (float(df[col].min()), float(df[col].max())) for col in indexes.RANGE_INDEX_COLUMNS}
+    selections = {'MANAGEMENT_TYPE': df['MANAGEMENT_TYPE'].unique().tolist(), 'CITY': df['CITY'].unique().tolist()}
+    return filters.FilterState(ranges=ranges, selections=selections)
+
+
+def narrowed_state(df):
+    state = full_state(df)
+    state.ranges['tavg'] = (5.0, 20.0)
+    state.ranges['AQI_mean'] = (20.0, 80.0)
+    state.selections['CITY'] = ['LONDON', 'PARIS', 'MELBOURNE']
+    return state
+
+
+def selective_state(df):
+    state = full_state(df)
+    state.ranges['prcp'] = (20.0, state.ranges['prcp'][1])
+    state.ranges['tavg'] = (25.0, state.ranges['tavg'][1])
+    return state
+
+
+def time_ms(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[25_000, 250_000, 2_500_000])
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    base = datasets.read_city_data()
+    print(f"{'rows':>12} {'scenario':>10} {'chained ms':>11} {'mask ms':>9} {'indexed ms':>11} {'index build ms':>15}")
+    for n_rows in args.sizes:
+        df = synthesize(base, n_rows)
+        build_start = time.perf_counter()
+        index = indexes.DatasetIndex.build(df)
+        build_ms = (time.perf_counter() - build_start) * 1000
+        for name, state in (('default', full_state(df)), ('narrowed', narrowed_state(df)), ('selective', selective_state(df))):
+            chained = time_ms(lambda: chained_filters(df, state), args.repeats)
+            mask = time_ms(lambda: filters.apply_filters(df, state), args.repeats)
+            indexed = time_ms(lambda: filters.apply_filters(df, state, index=index), args.repeats)
+            print(f"{n_rows:>12,} {name:>10} {chained:>11.1f} {mask:>9.1f} {indexed:>11.1f} {build_ms:>15.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Benchmark and regression check: routing "Ask me anything" queries.
+
+Compares flowsight.router against the if/elif chain of substring tests it
+replaced (reproduced below as `legacy_intent`). Every prompt of the corpus
+(the sidebar prompt guide plus variations) must reach the same intent through
+both, and the sidebar prompts must reach the intents recorded in
+flowsight.router.SAMPLE_PROMPTS; the script exits with status 1 otherwise.
+
+Then it times both per query. The router's cost depends on the query length
+only, while the chain's cost grows with the number of intents ahead of the
+matching one. Run from the repository root:
+
+    python benchmarks/bench_router.py --repeats 2000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flowsight import router  # noqa: E402
+
+CITIES = ['BANGALORE', 'BARCELONA', 'BUENOS AIRES', 'LONDON', 'LOS ANGELES', 'MELBOURNE', 'NEW YORK CITY', 'PARIS']
+
+EXTRA_PROMPTS = [
+    "Show aqi trend over time", "Rank cities by congestion", "Rank cities by lowest speed",
+    "Compare congestion in BARCELONA and LONDON", "Which city is most affected by AQI?",
+    "impact of precipitation on speed", "scatter of aqi and congestion in paris",
+    "relationship between temperature and speed", "congestion by season",
+    "what is the effect of temperature on congestion", "correlation of wind speed with congestion",
+    "distribution of aqi by city", "traffic volume vs aqi by management", "traffic volume and aqi by city",
+    "show boxplot of speed by management type", "which is the strongest effect on traffic volume",
+    "correlation matrix please", "seasonal patterns", "speed under ai management", "hello there", "",
+    "Show congestion trend in NYC", "Compare speed in Bengaluru and Paris",
+]
+
+
+def legacy_intent(query):
+    """The routing conditions of the original plot_and_answer chain, in order."""
+    q = query.lower()
+    if "trend" in q or "over time" in q:
+        return 'trend'
+    elif "scatter" in q or "relationship" in q or ("vs" in q and any(col in q for col in ['congestion', 'temperature', 'precipitation', 'wind', 'population', 'aqi', 'public transport', 'speed', 'volume'])):
+        return 'scatter'
+    elif "correlation between aqi and congestion in" in q:
+        return 'city_aqi_congestion_correlation'
+    elif "compare speed in" in q and "and" in q:
+        return 'compare_speed'
+    elif "distribution of speed by management type" in q:
+        return 'speed_by_management_distribution'
+    elif "distribution of congestion by road type" in q:
+        return 'congestion_by_road_type_distribution'
+    elif ("boxplot" in q or "distribution" in q) and "by" in q:
+        return 'boxplot'
+    elif "rank" in q:
+        return 'ranking'
+    elif "most affected by" in q or "impact of" in q:
+        return 'impact'
+    elif "compare" in q and "and" in q:
+        return 'compare_cities'
+    elif ("speed" in q and ("ai" in q or "conventional" in q or "management" in q)):
+        return 'speed_by_management'
+    elif ("congestion" in q and ("ai" in q or "conventional" in q or "management" in q)):
+        return 'congestion_by_management'
+    elif ("correlated" in q or "correlation" in q) and "with" in q:
+        return 'correlation'
+    elif ("temperature" in q and ("effect" in q or "impact" in q) and "congestion" in q):
+        return 'temperature_impact'
+    elif "strongest factor" in q or ("strongest" in q and "effect" in q):
+        return 'strongest_factor'
+    elif "heatmap" in q or "correlation matrix" in q:
+        return 'heatmap'
+    elif ("volume" in q or "traffic volume" in q) and ("aqi" in q or "congestion" in q) and ("by management" in q or "by city" in q):
+        return 'multivariable_scatter'
+    elif "season" in q or "seasonal" in q:
+        return 'season'
+    elif "holiday" in q:
+        return 'holiday'
+    return None
+
+
+def check_corpus(intent_router, corpus):
+    failures = []
+    for prompt in corpus:
+        expected = legacy_intent(prompt)
+        actual = intent_router.route(prompt).intent
+        if actual != expected:
+            failures.append(f"{prompt!r}: router {actual}, chain {expected}")
+    for prompt, intent in router.SAMPLE_PROMPTS.items():
+        if intent_router.route(prompt).intent != intent:
+            failures.append(f"{prompt!r}: expected {intent}")
+    return failures
+
+
+def time_per_call(func, prompts, repeats):
+    """Median time of one call over `repeats` passes through `prompts`, in microseconds."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for prompt in prompts:
+            func(prompt)
+        timings.append((time.perf_counter() - start) / len(prompts))
+    return statistics.median(timings) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeats', type=int, default=2000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    intent_router = router.IntentRouter(cities=CITIES)
+    build_ms = (time.perf_counter() - start) * 1e3
+
+    corpus = list(router.SAMPLE_PROMPTS) + EXTRA_PROMPTS
+    failures = check_corpus(intent_router, corpus)
+    for failure in failures:
+        print(f"MISMATCH {failure}")
+    print(f"corpus: {len(corpus)} prompts, {len(failures)} mismatches")
+    print(f"router build (with {len(CITIES)} cities): {build_ms:.2f} ms")
+
+    prompts = [prompt for prompt in corpus if prompt]
+    print(f"{'method':<22}{'us/query':>10}")
+    print(f"{'if/elif chain':<22}{time_per_call(legacy_intent, prompts, args.repeats):>10.2f}")
+    print(f"{'router':<22}{time_per_call(intent_router.route, prompts, args.repeats):>10.2f}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+Benchmark: import time of the Streamlit page, per top-level package.
+
+Runs the module-level imports of app.py in a fresh interpreter with
+`python -X importtime` and reports the cumulative import time of each
+top-level package, slowest first. Import time is the part of
+time-to-first-paint spent before the first widget renders, so track the
+total per release. A package's time includes the dependencies it imports
+first; dependencies shared with an earlier import are not counted again.
+
+The imports app.py defers until a feature needs them are then timed on top
+of the page imports: each fresh interpreter runs the page imports first and
+then times the deferred import alone, which is what the deferral saves.
+Run from the repository root:
+
+    python benchmarks/bench_startup.py --repeats 5
+"""
+import argparse
+import ast
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, 'app.py')
+
+# Imported inside the features that need them (dashboard map, Gemini explanations)
+DEFERRED_IMPORTS = ['geopandas', 'keplergl', 'google.generativeai']
+
+
+def page_imports(path=APP_PATH):
+    """Returns the source of the module-level import statements of `path`."""
+    with open(path, encoding='utf-8') as f:
+        source = f.read()
+    tree = ast.parse(source)
+    return [ast.get_source_segment(source, node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+
+def import_times(code):
+    """
+    Runs `code` in a fresh interpreter and returns the cumulative import
+    time of every top-level import, in microseconds, by module name.
+    """
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name.startswith('   '): # nested imports are indented below their parent
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def by_package(times):
+    """Sums top-level import times per root package."""
+    totals = {}
+    for name, micros in times.items():
+        package = name.split('.')[0]
+        totals[package] = totals.get(package, 0) + micros
+    return totals
+
+
+def deferred_import_time(page_code, module):
+    """
+    Runs `page_code` in a fresh interpreter, then imports `module` and
+    returns how long that import alone took, in microseconds.
+    """
+    code = (f"{page_code}\nimport time as _time\n_start = _time.perf_counter()\nimport {module}\n"
+            f"print((_time.perf_counter() - _start) * 1e6)")
+    completed = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return float(completed.stdout.strip().splitlines()[-1])
+
+
+def median_times(code, repeats):
+    """Median per-package import times of `code`, leaving out what the interpreter imports at startup."""
+    startup = set(by_package(import_times('pass')))
+    runs = [by_package(import_times(code)) for _ in range(repeats)]
+    packages = set().union(*runs) - startup
+    return {package: statistics.median(run.get(package, 0) for run in runs) for package in packages}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help="packages to list")
+    args = parser.parse_args()
+
+    statements = page_imports()
+    page_code = '\n'.join(statements)
+    times = median_times(page_code, args.repeats)
+    total = sum(times.values())
+
+    print(f"app.py module-level imports ({len(statements)} statements, median of {args.repeats} runs)")
+    print(f"{'package':<28}{'ms':>10}{'share':>8}")
+    for package, micros in sorted(times.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{package:<28}{micros / 1e3:>10.1f}{micros / total:>8.0%}")
+    print(f"{'total':<28}{total / 1e3:>10.1f}")
+
+    print()
+    print("deferred imports, on top of the page imports")
+    print(f"{'module':<28}{'ms':>10}")
+    for module in DEFERRED_IMPORTS:
+        try:
+            added = statistics.median(deferred_import_time(page_code, module) for _ in range(args.repeats))
+        except subprocess.CalledProcessError:
+            print(f"{module:<28}{'not installed':>10}")
+            continue
+        print(f"{module:<28}{added / 1e3:>10.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
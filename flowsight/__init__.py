@@ -0,0 +1,6 @@
+"""
+FlowSIGHT data layer.
+
+Helpers used by the Streamlit dashboard (`app.py`) to load, cache and prepare
+the city traffic datasets. Nothing in this package imports Streamlit.
+"""
@@ -0,0 +1,822 @@
+"""
+The "Ask me anything" analyses.
+
+`plot_and_answer` routes a query to one of the analyses and returns the
+response text and a Plotly figure; nothing is rendered here. The module
+imports nothing from Streamlit, so the analyses also run in batch jobs,
+benchmarks and worker processes (see `flowsight.engine`).
+"""
+import re
+
+import pandas as pd
+
+from flowsight import derived, rendering, router
+from flowsight.correlation import CorrelationMatrix, CorrelationTensor, heatmap_columns
+
+
+def select_cities(data_frame, cities, index=None):
+    """
+    Returns the rows of `data_frame` belonging to any of `cities`.
+    With the dataset index this is a row-group (or bitmap) lookup instead of a
+    string scan; `data_frame` must then be df_original or a filtered frame
+    derived from it.
+    """
+    if index is not None and 'CITY' in index.row_groups:
+        return index.row_groups['CITY'].select(data_frame, cities)
+    if index is not None and 'CITY' in index.bitmaps:
+        return index.bitmaps.select(data_frame, 'CITY', cities)
+    return data_frame[data_frame['CITY'].isin(cities)]
+
+
+def plot_and_answer(query, data_frame, plot_template, font_color, index=None, cube=None, correlations=None,
+                    heatmap_subset=None, heatmap_method="pearson", correlation_matrices=None, intent_router=None):
+    """
+    Analyzes the user query and generates appropriate Plotly visualizations
+    and textual responses based on the filtered data.
+    `index` is the optional dataset index used for per-city slices.
+    `cube` is an optional `flowsight.stats.MomentCube` holding exactly the rows
+    of `data_frame`; means are then summed from its cells.
+    `correlations` is an optional callable returning the memoized
+    `CorrelationTensor` of `data_frame`; without it the tensor is built on demand.
+    `heatmap_subset` (columns) and `heatmap_method` configure the correlation heatmap, and
+    `correlation_matrices` is an optional callable returning the memoized
+    `CorrelationMatrix` of `data_frame` for a method.
+    `intent_router` is the `flowsight.router.IntentRouter` that picks the
+    analysis; the module-level router (without city names) is used by default.
+    Returns the response text and the Plotly figure to show (or None); the
+    figure is not rendered here, so answers can be cached and replayed.
+    """
+    import plotly.express as px # imported on the first answer, so importing the engine stays light
+
+    # This function now exclusively uses Plotly, so Matplotlib/Seaborn styling is removed.
+    query_lower = query.lower()
+    default_plot_height = 800 # Define a default height for plots
+
+    print(f"DEBUG: Processing query: '{query_lower}'")
+
+    # One scan of the query picks the analysis and reads its columns and cities
+    route = (intent_router or router.ROUTER).route(query)
+    print(f"DEBUG: Routed to intent: {route.intent}")
+
+    # 1. Trend over time (Plotly Line Chart)
+    if route.intent == 'trend':
+        print("DEBUG: Triggered: Trend over time analysis.")
+        selected_metric_col = route.metric
+
+        if not selected_metric_col:
+            return "Please specify which metric's trend you want to see (e.g., congestion, AQI, speed).", None
+
+        if selected_metric_col not in data_frame.columns:
+            return f"The '{selected_metric_col}' column is not available in the dataset.", None
+
+        city_specified = False
+        for city in route.cities[:1]: # the first city mentioned, matched by name or alias
+            city_specified = True
+            city_data = select_cities(data_frame, [city], index)[['date', selected_metric_col]]
+            if city_data.empty:
+                print(f"DEBUG: No data for {city} with current filters for trend.")
+                return f"No data for {city} with current filters to plot trend for {selected_metric_col}.", None
+            if 'date' not in city_data.columns or not pd.api.types.is_datetime64_any_dtype(city_data['date']):
+                print(f"DEBUG: Date column not found or not in datetime format for {city}. Cannot plot trend.")
+                return f"Could not plot trend for {city} due to date column issues.", None
+
+            city_data = city_data.sort_values(by='date')
+            # Long series are thinned with LTTB so the browser gets a bounded number of points
+            line_data, total_points = rendering.downsample_line(city_data, 'date', selected_metric_col)
+            px_fig = px.line(line_data, x='date', y=selected_metric_col, 
+                             title=f"{selected_metric_col.replace('_', ' ').title()} Trend in {city}",
+                             labels={'date': 'Date', selected_metric_col: selected_metric_col.replace('_', ' ').title()},
+                             template=plot_template,
+                             color_discrete_sequence=["#00D4FF"], # Vibrant blue
+                             render_mode=rendering.render_mode(len(line_data)),
+                             height=default_plot_height)
+            rendering.note_downsampling(px_fig, len(line_data), total_points, font_color)
+            px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color) # Set title font color
+            px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+            px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+            px_fig.update_layout(legend_font_color=font_color) # Set legend font color
+            return f"Interactive trend of {selected_metric_col.replace('_', ' ')} in {city}.", px_fig
+
+        # If no specific city, plot overall trend
+        if not city_specified:
+            if 'date' not in data_frame.columns or not pd.api.types.is_datetime64_any_dtype(data_frame['date']):
+                print(f"DEBUG: Date column not found or not in datetime format. Cannot plot overall trend.")
+                return f"Could not plot overall trend due to date column issues.", None
+
+            overall_trend_data = data_frame.groupby('date')[selected_metric_col].mean().reset_index()
+            overall_trend_data = overall_trend_data.sort_values(by='date')
+            line_data, total_points = rendering.downsample_line(overall_trend_data, 'date', selected_metric_col)
+
+            px_fig = px.line(line_data, x='date', y=selected_metric_col, 
+                             title=f"Overall {selected_metric_col.replace('_', ' ').title()} Trend Across All Cities",
+                             labels={'date': 'Date', selected_metric_col: selected_metric_col.replace('_', ' ').title()},
+                             template=plot_template,
+                             color_discrete_sequence=["#7C4DFF"], # More dim purple accent
+                             render_mode=rendering.render_mode(len(line_data)),
+                             height=default_plot_height)
+            rendering.note_downsampling(px_fig, len(line_data), total_points, font_color)
+            px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color) # Set title font color
+            px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+            px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+            px_fig.update_layout(legend_font_color=font_color) # Set legend font color
+            return f"Interactive overall trend of {selected_metric_col.replace('_', ' ')} across all cities.", px_fig
+
+    # 2. Scatter Plots (Plotly)
+    elif route.intent == 'scatter':
+        print("DEBUG: Triggered: Scatter plot analysis.")
+        all_numeric_cols = data_frame.select_dtypes(include='number').columns.tolist()
+        found_cols = [col_name for col_name in route.columns if col_name in all_numeric_cols]
+
+        potential_x, potential_y = None, None
+        if len(found_cols) >= 2:
+            if "congestion_index" in found_cols:
+                potential_y = "congestion_index"
+                found_cols.remove("congestion_index")
+                potential_x = found_cols[0]
+            else:
+                potential_x, potential_y = found_cols[0], found_cols[1]
+        elif len(found_cols) == 1:
+            return f"Please specify two numeric columns for a scatter plot. You mentioned '{found_cols[0].replace('_', ' ')}'.", None
+        else:
+            return "Please specify two numeric columns for the scatter plot, e.g., 'AQI and congestion' or 'speed and volume'.", None
+
+        if potential_x and potential_y:
+            if potential_x not in data_frame.columns or potential_y not in data_frame.columns:
+                return f"One or both of the specified columns ('{potential_x}', '{potential_y}') are not available.", None
+
+            plot_data = data_frame.dropna(subset=[potential_x, potential_y])
+            if plot_data.empty:
+                print(f"DEBUG: Plot data is empty for scatter of {potential_x} vs {potential_y}.")
+                return f"No valid data points for a scatter plot of '{potential_x.replace('_', ' ')}' vs '{potential_y.replace('_', ' ')}' after filtering NaN values.", None
+
+            city_specified_in_query = False
+            selected_city_for_plot = None
+            # Robust city extraction for scatter plots
+            unique_df_cities = data_frame['CITY'].unique().tolist()
+            for df_city in sorted(route.cities, key=len, reverse=True): # Longer names first
+                if df_city in unique_df_cities:
+                    selected_city_for_plot = df_city
+                    city_specified_in_query = True
+                    break # Stop after finding the first city
+
+            if city_specified_in_query:
+                city_data = select_cities(plot_data, [selected_city_for_plot], index)
+                if city_data.empty:
+                    print(f"DEBUG: No data for {selected_city_for_plot} for scatter plot.")
+                    return f"No data for {selected_city_for_plot} with current filters to plot {potential_x.replace('_', ' ')} vs {potential_y.replace('_', ' ')}.", None
+
+                px_fig = px.scatter(city_data, x=potential_x, y=potential_y, 
+                                    title=f"{potential_y.replace('_', ' ').title()} vs {potential_x.replace('_', ' ').title()} in {selected_city_for_plot}",
+                                    labels={potential_x: potential_x.replace('_', ' ').title(), potential_y: potential_y.replace('_', ' ').title()},
+                                    template=plot_template,
+                                    color_discrete_sequence=["#FFA726"], # Vibrant orange accent
+                                    render_mode=rendering.render_mode(len(city_data)),
+                                    height=default_plot_height)
+                px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color) # Set title font color
+                px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+                px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+                px_fig.update_layout(legend_font_color=font_color) # Set legend font color
+                return f"Interactive scatter plot showing {potential_y.replace('_', ' ')} vs. {potential_x.replace('_', ' ')} in {selected_city_for_plot}.", px_fig
+            else:
+                px_fig = px.scatter(data_frame=plot_data, x=potential_x, y=potential_y, 
+                                    color='CITY' if data_frame['CITY'].nunique() > 1 else None,
+                                    title=f"{potential_y.replace('_', ' ').title()} vs {potential_x.replace('_', ' ').title()} Across Cities",
+                                    labels={potential_x: potential_x.replace('_', ' ').title(), potential_y: potential_y.replace('_', ' ').title()},
+                                    template=plot_template,
+                                    color_discrete_sequence=px.colors.qualitative.Plotly, # Use a good default palette
+                                    render_mode=rendering.render_mode(len(plot_data)),
+                                    height=default_plot_height
+                                    )
+                px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color) # Set title font color
+                px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+                px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+                px_fig.update_layout(legend_font_color=font_color) # Set legend font color
+                return f"Interactive scatter plot showing {potential_y.replace('_', ' ')} vs. {potential_x.replace('_', ' ')} across all filtered cities.", px_fig
+        else:
+            return "Could not determine appropriate columns for scatter plot. Please be more specific.", None
+
+    # Specific AI Assistant Plotting Logic: Correlation AQI and Congestion in specific city
+    elif route.intent == 'city_aqi_congestion_correlation':
+        print("DEBUG: Triggered: Correlation AQI and Congestion in specific city analysis.")
+        # Cities are matched by name or alias; another word after "in" is reported as having no data
+        city_match = re.search(r"in (\w+)", query_lower)
+        if route.cities or city_match:
+            city_name_from_query = route.cities[0] if route.cities else city_match.group(1).upper()
+            if 'AQI_mean' in data_frame.columns and 'congestion_index' in data_frame.columns:
+                city_data = select_cities(data_frame, [city_name_from_query], index)
+                if not city_data.empty:
+                    plot_data = city_data.dropna(subset=['AQI_mean', 'congestion_index'])
+                    if not plot_data.empty and plot_data['AQI_mean'].nunique() > 1 and plot_data['congestion_index'].nunique() > 1:
+                        correlation = plot_data['AQI_mean'].corr(plot_data['congestion_index'])
+                        
+                        px_fig = px.scatter(plot_data, x='AQI_mean', y='congestion_index',
+                                            title=f"AQI vs Congestion Index in {city_name_from_query}",
+                                            labels={'AQI_mean': 'Mean AQI', 'congestion_index': 'Congestion Index'},
+                                            template=plot_template,
+                                            color_discrete_sequence=["#FFA726"],
+                                            render_mode=rendering.render_mode(len(plot_data)),
+                                            height=default_plot_height)
+                        px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color)
+                        px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+                        px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+                        px_fig.update_layout(legend_font_color=font_color)
+                        return f"The correlation between AQI and congestion in {city_name_from_query} is **{correlation:.2f}**.", px_fig
+                    else:
+                        print(f"DEBUG: Not enough valid data points for AQI and congestion in {city_name_from_query} to plot correlation.")
+                        return f"Not enough valid data points for AQI and congestion in {city_name_from_query} to plot correlation.", None
+                else:
+                    print(f"DEBUG: No data found for {city_name_from_query} to plot correlation.")
+                    return f"No data found for {city_name_from_query} to plot correlation.", None
+            else:
+                print("DEBUG: AQI_mean or congestion_index columns are missing for correlation analysis.")
+                return "AQI_mean or congestion_index columns are missing in the dataset.", None
+        else:
+            return "Please specify a city for AQI and congestion correlation analysis (e.g., 'What is the correlation between AQI and congestion in PARIS?').", None
+
+    # Specific AI Assistant Plotting Logic: Compare speed in CITY1 and CITY2
+    elif route.intent == 'compare_speed':
+        print("DEBUG: Triggered: Compare speed in CITY1 and CITY2 analysis.")
+        
+        unique_df_cities = data_frame['CITY'].unique().tolist()
+        # The router matches whole words only; longer names are taken first
+        cities_to_compare_extracted = [df_city for df_city in sorted(route.cities, key=len, reverse=True) if df_city in unique_df_cities]
+        
+        cities_to_compare = cities_to_compare_extracted[:2] # Take the first two found
+        print(f"DEBUG: Cities extracted for speed comparison: {cities_to_compare}")
+
+        if len(cities_to_compare) >= 2: # Check for at least two cities
+            if cube is not None and 'SPEED' in cube.measures:
+                avg_speed_df = cube.where({'CITY': cities_to_compare}).mean_by("CITY", "SPEED")
+            elif 'SPEED' in data_frame.columns:
+                subset = select_cities(data_frame, cities_to_compare, index)
+                avg_speed_df = subset.groupby("CITY", observed=True)["SPEED"].mean().reset_index()
+            else:
+                avg_speed_df = None
+            if avg_speed_df is not None and not avg_speed_df.empty:
+                avg_speed_df = avg_speed_df[avg_speed_df['CITY'].isin(cities_to_compare)] # Ensure only queried cities are in plot
+                
+                if len(avg_speed_df) >= 2: # Ensure we have data for at least two cities
+                    px_fig = px.bar(avg_speed_df, x='CITY', y='SPEED',
+                                    title=f"Average Speed: {cities_to_compare[0]} vs {cities_to_compare[1]}",
+                                    labels={'CITY': 'City', 'SPEED': 'Average Speed'},
+                                    template=plot_template,
+                                    color='CITY',
+                                    color_discrete_map={cities_to_compare[0]: "#00D4FF", cities_to_compare[1]: "#7C4DFF"},
+                                    height=default_plot_height)
+                    px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color)
+                    px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+                    px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+                    px_fig.update_layout(legend_font_color=font_color)
+                    return f"Interactive bar chart comparing average speed in {cities_to_compare[0]} and {cities_to_compare[1]}.", px_fig
+                else:
+                    print(f"DEBUG: Not enough speed data for both {cities_to_compare[0]} and {cities_to_compare[1]} for comparison.")
+                    return f"Not enough speed data for both {cities_to_compare[0]} and {cities_to_compare[1]} with current filters.", None
+            else:
+                print("DEBUG: Speed column missing or no data for specified cities for comparison.")
+                return "Speed column missing or no data for specified cities with current filters.", None
+        else:
+            print(f"DEBUG: Did not find two cities for comparison. Found: {cities_to_compare}")
+            return "Please specify at least two cities to compare speed (e.g., 'Compare speed in BARCELONA and NEW YORK CITY').", None
+
+    # Specific AI Assistant Plotting Logic: Show distribution of speed by management type
+    elif route.intent == 'speed_by_management_distribution':
+        print("DEBUG: Triggered: Distribution of speed by management type analysis.")
+        if 'MANAGEMENT_TYPE' in data_frame.columns and 'SPEED' in data_frame.columns:
+            plot_data = data_frame.dropna(subset=['MANAGEMENT_TYPE', 'SPEED'])
+            print(f"DEBUG: Speed by management type - plot_data shape: {plot_data.shape}, unique MANAGEMENT_TYPE: {plot_data['MANAGEMENT_TYPE'].unique()}")
+            if not plot_data.empty and plot_data['MANAGEMENT_TYPE'].nunique() > 1:
+                px_fig = rendering.box_figure(plot_data, x="MANAGEMENT_TYPE", y="SPEED", 
+                                title="Distribution of Speed by Management Type",
+                                labels={"MANAGEMENT_TYPE": "Management Type", "SPEED": "Speed"},
+                                template=plot_template,
+                                color="MANAGEMENT_TYPE",
+                                color_discrete_sequence=px.colors.qualitative.D3,
+                                height=default_plot_height)
+                px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color)
+                px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+                px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+                px_fig.update_layout(legend_font_color=font_color)
+                return "Interactive box plot showing the distribution of speed across different traffic management types.", px_fig
+            else:
+                print("DEBUG: Not enough valid data or unique management types for speed distribution.")
+                return "Not enough valid data or unique management types to plot speed distribution by management type.", None
+        else:
+            print("DEBUG: MANAGEMENT_TYPE or SPEED columns are missing for speed distribution.")
+            return "MANAGEMENT_TYPE or SPEED columns are missing in the dataset.", None
+
+    # Specific AI Assistant Plotting Logic: Show distribution of congestion by road type
+    elif route.intent == 'congestion_by_road_type_distribution':
+        print("DEBUG: Triggered: Distribution of congestion by road type analysis.")
+        if 'road_type' in data_frame.columns and 'congestion_index' in data_frame.columns:
+            plot_data = data_frame.dropna(subset=['road_type', 'congestion_index'])
+            print(f"DEBUG: Congestion by road type - plot_data shape: {plot_data.shape}, unique road_type: {plot_data['road_type'].unique()}")
+            if not plot_data.empty and plot_data['road_type'].nunique() > 1:
+                px_fig = rendering.box_figure(plot_data, x="road_type", y="congestion_index", 
+                                title="Distribution of Congestion by Road Type",
+                                labels={"road_type": "Road Type", "congestion_index": "Congestion Index"},
+                                template=plot_template,
+                                color="road_type",
+                                color_discrete_sequence=px.colors.qualitative.Set2,
+                                height=default_plot_height)
+                px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color)
+                px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+                px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+                px_fig.update_layout(legend_font_color=font_color)
+                return "Interactive box plot showing the distribution of congestion across different road types.", px_fig
+            else:
+                print("DEBUG: Not enough valid data or unique road types for congestion distribution.")
+                return "Not enough valid data or unique road types to plot congestion distribution by road type.", None
+        else:
+            print("DEBUG: road_type or congestion_index columns are missing for congestion distribution.")
+            return "road_type or congestion_index columns are missing in the dataset.", None
+
+
+    # 3. Boxplot (by categorical) (Plotly)
+    elif route.intent == 'boxplot':
+        print("DEBUG: Triggered: General boxplot by categorical analysis.")
+        if route.columns is not None: # the query has the form "<value> by <category>"
+            value_col, category_col = route.metric, route.group_by
+
+            if value_col and category_col:
+                if value_col not in data_frame.columns or category_col not in data_frame.columns:
+                    return f"One or both of the specified columns ('{value_col}', '{category_col}') are not available for boxplot.", None
+
+                plot_data = data_frame.dropna(subset=[value_col, category_col])
+                print(f"DEBUG: General boxplot - plot_data shape: {plot_data.shape}, unique {category_col}: {plot_data[category_col].unique()}")
+                if plot_data.empty or plot_data[category_col].nunique() < 2:
+                    print(f"DEBUG: Not enough valid data or unique categories in '{category_col}' for boxplot.")
+                    return f"Not enough valid data or unique categories in '{category_col}' to create a boxplot for '{value_col}'.", None
+
+                px_fig = rendering.box_figure(plot_data, x=category_col, y=value_col, 
+                                title=f"{value_col.replace('_', ' ').title()} Distribution by {category_col.replace('_', ' ').title()}",
+                                labels={category_col: category_col.replace('_', ' ').title(), value_col: value_col.replace('_', ' ').title()},
+                                template=plot_template,
+                                color=category_col if plot_data[category_col].nunique() < 10 else None, # Color by category if not too many
+                                color_discrete_sequence=px.colors.qualitative.D3, # Good qualitative palette
+                                height=default_plot_height
+                                )
+                px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color) # Set title font color
+                px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+                px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+                px_fig.update_layout(legend_font_color=font_color) # Set legend font color
+                return f"Interactive boxplot of {value_col.replace('_', ' ')} distribution by {category_col.replace('_', ' ')}.", px_fig
+            else:
+                print("DEBUG: Could not determine columns for general boxplot.")
+                return "Could not determine columns for boxplot. Please specify a numeric column and a categorical column, e.g., 'speed by management type'.", None
+
+    # 4. Ranking (Plotly Bar Chart with Dynamic Height)
+    elif route.intent == 'ranking':
+        print("DEBUG: Triggered: Ranking analysis.")
+        selected_metric_col = route.metric
+
+        if not selected_metric_col:
+            return "Please specify which metric you want to rank cities by (e.g., congestion, AQI, speed).", None
+
+        if selected_metric_col not in data_frame.columns:
+            return f"The '{selected_metric_col}' column is not available in the dataset for ranking.", None
+
+        ascending_rank = True
+        if selected_metric_col in ["congestion_index", "AQI_mean"] or "worst" in route or "highest" in route:
+            ascending_rank = False
+        if "best" in route or "lowest" in route:
+            ascending_rank = True
+
+        if cube is not None and selected_metric_col in cube.measures:
+            avg_metric = cube.mean_by("CITY", selected_metric_col).sort_values(selected_metric_col, ascending=ascending_rank).reset_index(drop=True)
+        else:
+            avg_metric = data_frame.groupby("CITY", observed=True)[selected_metric_col].mean().sort_values(ascending=ascending_rank).reset_index()
+
+        if avg_metric.empty:
+            print(f"DEBUG: Not enough data to rank cities by {selected_metric_col}.")
+            return f"Not enough data to rank cities by {selected_metric_col.replace('_', ' ')} with current filters.", None
+
+        # DYNAMIC SIZING: Calculate height based on number of cities (2x original)
+        num_cities = len(avg_metric['CITY'])
+        plot_height = max(600, num_cities * 70)  # Base height 600, add 70px per city
+
+        rank_order = "lowest" if ascending_rank else "highest"
+        
+        px_fig = px.bar(avg_metric, x=selected_metric_col, y='CITY', orientation='h',
+                        title=f"Average {selected_metric_col.replace('_', ' ').title()} by City",
+                        labels={selected_metric_col: f"Average {selected_metric_col.replace('_', ' ').title()}", 'CITY': 'City'},
+                        template=plot_template,
+                        color=selected_metric_col,
+                        color_continuous_scale=px.colors.sequential.Plasma,
+                        height=plot_height # Set dynamic height
+                        )
+        px_fig.update_layout(yaxis={'categoryorder':'total ascending' if ascending_rank else 'total descending'})
+        px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color) # Set title font color
+        px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+        px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+        px_fig.update_layout(legend_font_color=font_color) # Set legend font color
+        return f"Interactive ranking of cities by average {selected_metric_col.replace('_', ' ')}. {rank_order.capitalize()} values are {'better' if ascending_rank else 'worse'}.", px_fig
+
+    # 5. Impact by factor (Plotly Bar Chart)
+    elif route.intent == 'impact':
+        print("DEBUG: Triggered: Impact by factor analysis.")
+        target_col = route.target
+        selected_factor_col = route.metric
+
+        if not selected_factor_col:
+            return "Please specify a factor to analyze its impact (e.g., precipitation, temperature, AQI).", None
+
+        if selected_factor_col not in data_frame.columns or target_col not in data_frame.columns:
+            return f"Required column '{selected_factor_col}' or '{target_col}' not found for impact analysis.", None
+
+        corrs = []
+        cities_for_corr = []
+        tensor = correlations() if correlations is not None else CorrelationTensor.build(data_frame)
+        if (selected_factor_col, target_col) in tensor:
+            # Cities without a defined correlation are already left out
+            for city_name, corr_val in tensor.by_group(selected_factor_col, target_col).itertuples(index=False):
+                corrs.append({"CITY": city_name, "Absolute Correlation": abs(corr_val), "Correlation": corr_val})
+                cities_for_corr.append(city_name)
+
+        if not corrs:
+            print(f"DEBUG: Could not calculate correlations for {selected_factor_col} impact on {target_col}.")
+            return f"Could not calculate correlations for {selected_factor_col} impact on {target_col} with current filters; insufficient data or too many missing values.", None
+
+        corr_df = pd.DataFrame(corrs).sort_values(by="Absolute Correlation", ascending=False)
+        
+        px_fig = px.bar(corr_df, x="Absolute Correlation", y="CITY", orientation='h',
+                        title=f"Cities by Impact of {selected_factor_col.replace('_', ' ').title()} on {target_col.replace('_', ' ').title()} (Absolute Correlation)",
+                        labels={"Absolute Correlation": f"Absolute Correlation with {target_col.replace('_', ' ').title()} Index", "CITY": "City"},
+                        template=plot_template,
+                        color="Absolute Correlation", color_continuous_scale=px.colors.sequential.Plasma, # New palette for dark theme
+                        height=default_plot_height
+                        )
+        px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color) # Set title font color
+        px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+        px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+        px_fig.update_layout(legend_font_color=font_color) # Set legend font color
+        return f"Interactive rank of cities by absolute correlation between {selected_factor_col.replace('_', ' ')} and {target_col.replace('_', ' ')}.", px_fig
+
+    # 6. Compare two cities (Plotly Bar Chart)
+    elif route.intent == 'compare_cities':
+        print("DEBUG: Triggered: Compare two cities analysis (general).")
+        
+        unique_df_cities = data_frame['CITY'].unique().tolist()
+        # The router matches whole words only; longer names are taken first
+        cities_to_compare_extracted = [df_city for df_city in sorted(route.cities, key=len, reverse=True) if df_city in unique_df_cities]
+        
+        cities_to_compare = cities_to_compare_extracted[:2] # Take the first two found
+        print(f"DEBUG: Cities extracted for general comparison: {cities_to_compare}")
+
+        if len(cities_to_compare) == 2:
+            selected_metric_col = route.metric
+
+            if selected_metric_col not in data_frame.columns:
+                return f"The '{selected_metric_col}' column is not available for comparison.", None
+
+            if cube is not None and selected_metric_col in cube.measures:
+                avg_metric_df = cube.where({'CITY': cities_to_compare}).mean_by("CITY", selected_metric_col)
+            else:
+                subset = select_cities(data_frame, cities_to_compare, index)
+                avg_metric_df = subset.groupby("CITY", observed=True)[selected_metric_col].mean().reset_index()
+            if avg_metric_df.empty:
+                print(f"DEBUG: No data for {cities_to_compare[0]} and {cities_to_compare[1]} for comparison.")
+                return f"No data for {cities_to_compare[0]} and {cities_to_compare[1]} with current filters.", None
+
+            avg_metric_df = avg_metric_df[avg_metric_df['CITY'].isin(cities_to_compare)] # Filter to ensure only queried cities
+
+            if len(avg_metric_df) < 2:
+                print(f"DEBUG: Could not find sufficient {selected_metric_col} data for both specified cities for comparison.")
+                return f"Could not find sufficient {selected_metric_col.replace('_', ' ')} data for both specified cities with current filters.", None
+
+            px_fig = px.bar(avg_metric_df, x='CITY', y=selected_metric_col, 
+                            title=f"Average {selected_metric_col.replace('_', ' ').title()}: {cities_to_compare[0]} vs {cities_to_compare[1]}",
+                            labels={'CITY': 'City', selected_metric_col: f"Average {selected_metric_col.replace('_', ' ').title()}"},
+                            template=plot_template,
+                            color='CITY', # Color bars by city
+                            color_discrete_map={cities_to_compare[0]: "#00D4FF", cities_to_compare[1]: "#7C4DFF"}, # Custom colors
+                            height=default_plot_height
+                            )
+            px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color) # Set title font color
+            px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+            px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+            px_fig.update_layout(legend_font_color=font_color) # Set legend font color
+            return f"Interactive comparison of average {selected_metric_col.replace('_', ' ')} between {cities_to_compare[0]} and {cities_to_compare[1]}.", px_fig
+        else:
+            print(f"DEBUG: Did not find two cities for general comparison. Found: {cities_to_compare}")
+            return "Please specify exactly two cities to compare.", None
+
+    # 7. Speed comparison by management type (Plotly Boxplot)
+    elif route.intent == 'speed_by_management':
+        print("DEBUG: Triggered: Speed comparison by management type analysis.")
+        if 'MANAGEMENT_TYPE' not in data_frame.columns or 'SPEED' not in data_frame.columns:
+            print("DEBUG: Missing MANAGEMENT_TYPE or SPEED columns for speed comparison.")
+            return "Required columns (MANAGEMENT_TYPE, SPEED) are missing for this plot.", None
+
+        plot_data = data_frame.dropna(subset=['MANAGEMENT_TYPE', 'SPEED'])
+        print(f"DEBUG: Speed by management type - plot_data shape: {plot_data.shape}, unique MANAGEMENT_TYPE: {plot_data['MANAGEMENT_TYPE'].unique()}")
+        if plot_data.empty or plot_data['MANAGEMENT_TYPE'].nunique() < 2:
+            print("DEBUG: Not enough unique management types or speed data for speed comparison.")
+            return "Not enough unique management types or speed data to create a boxplot with current filters.", None
+
+        px_fig = rendering.box_figure(plot_data, x="MANAGEMENT_TYPE", y="SPEED", 
+                        title="Traffic Speed: AI vs Conventional Management",
+                        labels={"MANAGEMENT_TYPE": "Management Type", "SPEED": "Speed"},
+                        template=plot_template,
+                        color="MANAGEMENT_TYPE", # Color by management type
+                        color_discrete_map={"AI- MANAGEMENT SYSTEM": "#00D4FF", "CONVENTIONAL METHOD": "#7C4DFF"}, # Custom palette
+                        height=default_plot_height
+                        )
+        px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color) # Set title font color
+        px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+        px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+        px_fig.update_layout(legend_font_color=font_color) # Set legend font color
+        return "Interactive boxplot comparing traffic speed distributions between AI and conventionally managed systems.", px_fig
+
+    # --- NEW: Congestion comparison by management type (Plotly Bar Chart) ---
+    elif route.intent == 'congestion_by_management':
+        print("DEBUG: Triggered: Congestion comparison by management type analysis.")
+        if 'MANAGEMENT_TYPE' not in data_frame.columns or 'congestion_index' not in data_frame.columns:
+            print("DEBUG: Missing MANAGEMENT_TYPE or congestion_index columns for congestion comparison.")
+            return "Required columns (MANAGEMENT_TYPE, congestion_index) are missing for this plot.", None
+
+        plot_data = data_frame.dropna(subset=['MANAGEMENT_TYPE', 'congestion_index'])
+        print(f"DEBUG: Congestion by management type - plot_data shape: {plot_data.shape}, unique MANAGEMENT_TYPE: {plot_data['MANAGEMENT_TYPE'].unique()}")
+        if plot_data.empty or plot_data['MANAGEMENT_TYPE'].nunique() < 2:
+            print("DEBUG: Not enough unique management types or congestion data for comparison.")
+            return "Not enough unique management types or congestion data to compare congestion by management type.", None
+        
+        # Calculate average congestion for each management type
+        avg_congestion_by_mgmt = plot_data.groupby('MANAGEMENT_TYPE', observed=True)['congestion_index'].mean().reset_index()
+
+        px_fig = px.bar(avg_congestion_by_mgmt, x="MANAGEMENT_TYPE", y="congestion_index", 
+                        title="Average Congestion Index: AI vs Conventional Management",
+                        labels={"MANAGEMENT_TYPE": "Management Type", "congestion_index": "Average Congestion Index"},
+                        template=plot_template,
+                        color="MANAGEMENT_TYPE", # Color by management type
+                        color_discrete_map={"AI- MANAGEMENT SYSTEM": "#00D4FF", "CONVENTIONAL METHOD": "#7C4DFF"}, # Custom palette
+                        height=default_plot_height
+                        )
+        px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color) # Set title font color
+        px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+        px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+        px_fig.update_layout(legend_font_color=font_color) # Set legend font color
+
+        response_msg = "Interactive bar chart comparing average congestion index between AI and conventionally managed systems."
+        for index, row in avg_congestion_by_mgmt.iterrows():
+            response_msg += f"\n- Average Congestion Index for **{row['MANAGEMENT_TYPE']}**: {row['congestion_index']:.2f}"
+        return response_msg, px_fig
+    # --- END NEW: Congestion comparison by management type (Plotly Bar Chart) ---
+
+
+    # 8. Correlation between two numeric columns (Text output, no plot)
+    elif route.intent == 'correlation':
+        print("DEBUG: Triggered: Correlation between two numeric columns analysis.")
+        if route.columns is not None: # the query has the form "<column> with <column>"
+            col1, col2 = route.columns
+
+            if col1 and col2:
+                if col1 not in data_frame.columns or col2 not in data_frame.columns:
+                    return f"One or both of the specified columns ('{col1}', '{col2}') are not available for correlation.", None
+
+                city_found = False
+                for city in route.cities[:1]: # the first city mentioned, matched by name or alias
+                    city_found = True
+                    subset = select_cities(data_frame, [city], index)
+                    if subset.empty:
+                        print(f"DEBUG: No data for {city} for correlation between {col1} and {col2}.")
+                        return f"No data for {city} with current filters to calculate correlation between {col1} and {col2}.", None
+
+                    subset_clean = subset.dropna(subset=[col1, col2])
+                    if len(subset_clean) < 2 or subset_clean[col1].nunique() < 2 or subset_clean[col2].nunique() < 2:
+                        print(f"DEBUG: Not enough varying data for correlation between {col1} and {col2} for {city}.")
+                        return f"Not enough varying data to calculate correlation between {col1} and {col2} for {city} with current filters.", None
+
+                    correlation = subset_clean[col1].corr(subset_clean[col2])
+                    if pd.isna(correlation):
+                        print(f"DEBUG: Could not calculate correlation for {city} (NaN result).")
+                        return f"Could not calculate correlation for {city} (likely due to insufficient or non-varying data with current filters).", None
+                    return f"The correlation between {col1.replace('_', ' ')} and {col2.replace('_', ' ')} in {city} is **{correlation:.2f}**.", None
+
+                if not city_found:
+                    subset_clean = data_frame.dropna(subset=[col1, col2])
+                    if len(subset_clean) < 2 or subset_clean[col1].nunique() < 2 or subset_clean[col2].nunique() < 2:
+                        print(f"DEBUG: Not enough varying data for overall correlation between {col1} and {col2}.")
+                        return f"Not enough varying data to calculate overall correlation between {col1} and {col2} with current filters.", None
+
+                    correlation = subset_clean[col1].corr(subset_clean[col2])
+                    if pd.isna(correlation):
+                        print(f"DEBUG: Could not calculate overall correlation (NaN result).")
+                        return f"Could not calculate overall correlation (likely due to insufficient or non-varying data with current filters).", None
+                    return f"The overall correlation between {col1.replace('_', ' ')} and {col2.replace('_', ' ')} across all filtered data is **{correlation:.2f}**.", None
+            else:
+                return "Please specify two valid numeric columns for correlation (e.g., 'wind speed and congestion').", None
+        else:
+            return "Please rephrase your correlation query using 'X with Y' format.", None
+
+    # 9. Temperature impact on congestion (Plotly Bar Chart)
+    elif route.intent == 'temperature_impact':
+        print("DEBUG: Triggered: Temperature impact on congestion analysis.")
+        val_col = route.metric
+        target_col = route.target
+        if val_col not in data_frame.columns or target_col not in data_frame.columns:
+            return f"Required columns ('{val_col}', '{target_col}') not found for temperature impact analysis.", None
+
+        corrs = []
+        tensor = correlations() if correlations is not None else CorrelationTensor.build(data_frame)
+        if (val_col, target_col) in tensor:
+            for city_name, corr_val in tensor.by_group(val_col, target_col).itertuples(index=False):
+                corrs.append({"CITY": city_name, "Absolute Correlation": abs(corr_val), "Correlation": corr_val})
+
+        if not corrs:
+            print("DEBUG: Could not calculate temperature impact correlations.")
+            return "Could not calculate temperature impact correlations with current filters; insufficient data.", None
+
+        corr_df = pd.DataFrame(corrs).sort_values(by="Absolute Correlation", ascending=False)
+        
+        px_fig = px.bar(corr_df, x="Absolute Correlation", y="CITY", orientation='h',
+                        title="Cities by Impact of Temperature on Congestion (Absolute Correlation)",
+                        labels={"Absolute Correlation": "Absolute Correlation with Congestion Index", "CITY": "City"},
+                        template=plot_template,
+                        color="Absolute Correlation", color_continuous_scale=px.colors.sequential.OrRd, # Changed palette for dark theme
+                        height=default_plot_height
+                        )
+        px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color) # Set title font color
+        px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+        px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+        px_fig.update_layout(legend_font_color=font_color) # Set legend font color
+        return f"{corr_df['CITY'].iloc[0]} shows the highest absolute correlation between temperature and congestion. This plot shows the strength of this relationship across cities.", px_fig
+
+    # 10. Strongest factor affecting congestion (Plotly Bar Chart)
+    elif route.intent == 'strongest_factor':
+        print("DEBUG: Triggered: Strongest factor analysis.")
+        target_col = route.target
+
+        possible_factors = ["AQI_mean", "prcp", "tavg", "wspd", "POPULATION DENSITY", "TOTAL PUBLIC TRANSPORT TRIP", "TRAFFIC_VOLUME", "SPEED"]
+        numeric_cols_present = [col for col in possible_factors if col in data_frame.columns and
+                                pd.api.types.is_numeric_dtype(data_frame[col]) and col != target_col]
+
+        if not numeric_cols_present:
+            return "No suitable numeric factor columns found to analyze the strongest effect with current filters.", None
+        if target_col not in data_frame.columns or not pd.api.types.is_numeric_dtype(data_frame[target_col]):
+            return f"{target_col.replace('_', ' ')} column is missing or not numeric, cannot perform correlation analysis.", None
+
+        corr_values = {}
+        tensor = correlations() if correlations is not None else CorrelationTensor.build(data_frame)
+        for col in numeric_cols_present:
+            if (col, target_col) in tensor:
+                correlation = tensor.overall_corr(col, target_col)
+                if pd.notnull(correlation):
+                    corr_values[col] = correlation
+
+        if not corr_values:
+            print(f"DEBUG: Could not calculate correlations for any factors with {target_col}.")
+            return f"Could not calculate correlations for any factors with current filters (likely due to insufficient or non-varying data for {target_col.replace('_', ' ')}).", None
+
+        corr_df = pd.DataFrame(list(corr_values.items()), columns=['Factor', 'Correlation'])
+        corr_df['Absolute Correlation'] = corr_df['Correlation'].abs()
+        corr_df = corr_df.sort_values(by='Absolute Correlation', ascending=False)
+
+        px_fig = px.bar(corr_df, x="Correlation", y="Factor", orientation='h',
+                        title=f"Correlation of Various Factors with {target_col.replace('_', ' ').title()}",
+                        labels={"Correlation": "Correlation Coefficient (closer to +/-1 indicates stronger relationship)", "Factor": "Factor"},
+                        template=plot_template,
+                        color="Correlation", color_continuous_scale=px.colors.sequential.RdPu, # New palette for dark theme
+                        height=default_plot_height
+                        )
+        px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color) # Set title font color
+        px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+        px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+        px_fig.update_layout(legend_font_color=font_color) # Set legend font color
+        return f"The factor with the strongest absolute correlation to {target_col.replace('_', ' ')} is **{corr_df['Factor'].iloc[0].replace('_', ' ')}** (Correlation: {corr_df['Correlation'].iloc[0]:.2f}). The plot shows other factors as well.", px_fig
+
+    # 11. Correlation Heatmap (Plotly with Dynamic Height)
+    elif route.intent == 'heatmap':
+        print("DEBUG: Triggered: Correlation Heatmap analysis.")
+        numeric_cols = [col for col in (heatmap_subset if heatmap_subset is not None else heatmap_columns(data_frame))
+                        if col in data_frame.columns and pd.api.types.is_numeric_dtype(data_frame[col])]
+        if len(numeric_cols) < 2:
+             return "Not enough numeric data to generate a correlation heatmap with current filters.", None
+
+        numeric_cols = [col for col in numeric_cols if data_frame[col].notna().any()]
+        if len(numeric_cols) < 2:
+            return "Not enough numeric columns with valid data to generate a correlation heatmap.", None
+
+        matrix = correlation_matrices(heatmap_method) if correlation_matrices is not None else CorrelationMatrix(data_frame, heatmap_method)
+        corr_matrix = matrix.get(numeric_cols)
+        if corr_matrix.empty:
+            print("DEBUG: Could not compute correlation matrix.")
+            return "Could not compute correlation matrix; likely no variance in filtered numeric data.", None
+
+        # DYNAMIC SIZING: Calculate height based on number of features (2x original)
+        num_features = len(corr_matrix.columns)
+        plot_height = max(800, num_features * 60) # Base height 800, add 60px per feature
+
+        px_fig = px.imshow(corr_matrix, 
+                           text_auto=".2f", # Show correlation values on heatmap, formatted to 2 decimal places
+                           color_continuous_scale=px.colors.sequential.Magma if plot_template == "plotly_dark" else px.colors.sequential.Blues,
+                           aspect="equal", # Make it a square grid
+                           title=f"{heatmap_method.title()} Correlation Heatmap of Numeric Features",
+                           template=plot_template,
+                           height=plot_height # Set dynamic height
+                           )
+        px_fig.update_xaxes(side="bottom") # Ensure x-axis labels are at the bottom
+        px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color) # Set title font color
+        px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+        px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+        px_fig.update_layout(legend_font_color=font_color) # Set legend font color
+        px_fig.update_traces(textfont_color=font_color) # Ensure text on heatmap is white
+        px_fig.update_traces(textfont_size=16) # Increased font size for values on heatmap
+        return f"Interactive {heatmap_method.title()} correlation heatmap showing relationships between the selected numeric features. The plot size has been adjusted for better visibility.", px_fig
+
+    # 12. Multivariable AQI vs Volume by Management/City (Plotly Scatter)
+    elif route.intent == 'multivariable_scatter':
+        print("DEBUG: Triggered: Multivariable AQI/Volume by Management/City analysis.")
+        x_col, y_col = route.columns
+        hue_col = route.group_by
+
+        if not all(c in data_frame.columns for c in [x_col, y_col, hue_col]):
+            return f"One or more required columns ({x_col}, {y_col}, {hue_col}) are missing for this plot with current filters.", None
+
+        plot_data = data_frame.dropna(subset=[x_col, y_col, hue_col])
+        print(f"DEBUG: Multi-variable scatter - plot_data shape: {plot_data.shape}, unique {hue_col}: {plot_data[hue_col].unique()}")
+        if plot_data.empty or plot_data[hue_col].nunique() < 2:
+            print(f"DEBUG: Insufficient data or unique '{hue_col}' values for multi-variable scatter plot.")
+            return f"Insufficient data or unique '{hue_col.replace('_', ' ')}' values for scatter plot with current filters.", None
+
+        px_fig = px.scatter(plot_data, x=x_col, y=y_col, color=hue_col, 
+                            title=f"{y_col.replace('_', ' ').title()} vs {x_col.replace('_', ' ').title()}, by {hue_col.replace('_', ' ').title()}",
+                            labels={x_col: x_col.replace('_', ' ').title(), y_col: y_col.replace('_', ' ').title(), hue_col: hue_col.replace('_', ' ').title()},
+                            template=plot_template,
+                            color_discrete_sequence=px.colors.qualitative.Vivid if plot_template == "plotly_dark" else px.colors.qualitative.Safe, # Varied palette
+                            render_mode=rendering.render_mode(len(plot_data)),
+                            height=default_plot_height
+                            )
+        px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color) # Set title font color
+        px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+        px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+        px_fig.update_layout(legend_font_color=font_color) # Set legend font color
+        return f"Interactive scatter plot showing {y_col.replace('_', ' ')} vs. {x_col.replace('_', ' ')}, color-coded by {hue_col.replace('_', ' ')}.", px_fig
+
+    # 13. Season-based analysis (Plotly Boxplot)
+    elif route.intent == 'season':
+        print("DEBUG: Triggered: Season-based analysis.")
+        if 'date' not in data_frame.columns or not pd.api.types.is_datetime64_any_dtype(data_frame['date']):
+            return "Date column not found or not in datetime format. Cannot analyze by season.", None
+
+        # 'season' is computed once at load time (flowsight.derived)
+        temp_df = derived.with_derived_columns(data_frame, ['season'])
+
+        if "congestion by season" in route or "seasonal congestion" in route or "congestion in seasons" in route:
+            if 'congestion_index' not in temp_df.columns:
+                return "Congestion index column not found for seasonal analysis.", None
+
+            plot_data = temp_df.dropna(subset=['congestion_index', 'season'])
+            print(f"DEBUG: Seasonal congestion - plot_data shape: {plot_data.shape}, unique seasons: {plot_data['season'].unique()}")
+            if plot_data.empty:
+                print("DEBUG: No valid data to plot seasonal congestion.")
+                return "No valid data to plot seasonal congestion after filtering NaN values.", None
+
+            px_fig = rendering.box_figure(plot_data, x='season', y='congestion_index', 
+                            category_orders={"season": ['Spring', 'Summer', 'Autumn', 'Winter']},
+                            title="Congestion Index Distribution by Season",
+                            labels={'season': 'Season', 'congestion_index': 'Congestion Index'},
+                            template=plot_template,
+                            color='season', # Color by season
+                            color_discrete_sequence=px.colors.qualitative.Pastel, # Changed palette for dark theme
+                            height=default_plot_height
+                            )
+            px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color) # Set title font color
+            px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+            px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+            px_fig.update_layout(legend_font_color=font_color) # Set legend font color
+            return "Interactive boxplot showing congestion index distribution by season.", px_fig
+
+        return "Please specify what seasonal analysis you'd like (e.g., 'congestion by season').", None
+
+    # 14. Holiday vs Non-Holiday analysis (Plotly Boxplot)
+    elif route.intent == 'holiday':
+        print("DEBUG: Triggered: Holiday vs Non-Holiday analysis.")
+        if 'Holiday_Flag' not in data_frame.columns:
+            return "The 'Holiday_Flag' column is not found in the dataset. Please ensure your 'city_data.csv' includes this column with boolean (True/False) values to analyze holiday impact.", None
+        if 'congestion_index' not in data_frame.columns:
+            return "Congestion index column not found for holiday analysis.", None
+
+        plot_data = data_frame.dropna(subset=['congestion_index', 'Holiday_Flag'])
+        print(f"DEBUG: Holiday analysis - plot_data shape: {plot_data.shape}, unique Holiday_Flag: {plot_data['Holiday_Flag'].unique()}")
+        if plot_data.empty or plot_data['Holiday_Flag'].nunique() < 2:
+            print("DEBUG: Not enough valid data or unique values in 'Holiday_Flag' for holiday analysis.")
+            return "Not enough valid data or unique values in 'Holiday_Flag' to compare holiday vs non-holiday congestion. Ensure there are both holiday and non-holiday entries.", None
+
+        px_fig = rendering.box_figure(plot_data, x='Holiday_Flag', y='congestion_index', 
+                        title="Congestion Index: Holiday vs Non-Holiday",
+                        labels={'Holiday_Flag': 'Is Holiday?', 'congestion_index': 'Congestion Index'},
+                        template=plot_template,
+                        color='Holiday_Flag', # Color by holiday flag
+                        color_discrete_map={True: "#00D4FF", False: "#7C4DFF"}, # Custom palette
+                        height=default_plot_height
+                        )
+        px_fig.update_xaxes(tickvals=[0, 1], ticktext=['Non-Holiday', 'Holiday'])
+        px_fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color), title_font_color=font_color) # Set title font color
+        px_fig.update_xaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+        px_fig.update_yaxes(title_font=dict(color=font_color), tickfont=dict(color=font_color))
+        px_fig.update_layout(legend_font_color=font_color) # Set legend font color
+        return "Interactive boxplot comparing congestion index on holidays versus non-holidays.", px_fig
+
+    # Default fallback
+    print("DEBUG: No specific plotting logic matched the query.")
+    return "I'm still learning to understand this question. Try asking for trends, comparisons, rankings, correlations, or specific plots like heatmaps. Be more specific about columns.", None
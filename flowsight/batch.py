@@ -0,0 +1,200 @@
+"""
+Batch runner for assistant queries.
+
+Reads a file of queries and filter presets, answers them with
+`flowsight.engine` across a process pool and writes the answer text, the
+figure JSON and the timing of every query to a results directory. Used for
+nightly reports and as a throughput benchmark. Run from the repository root:
+
+    python -m flowsight.batch queries.json results/ --workers 4
+
+The query file is either plain text (one query per line, answered over all
+rows) or JSON:
+
+    {
+      "presets": {
+        "london_paris": {"selections": {"CITY": ["LONDON", "PARIS"]}, "ranges": {"tavg": [5, 20]}}
+      },
+      "queries": [
+        "Rank cities by congestion",
+        {"query": "Show congestion trend in LONDON", "preset": "london_paris", "theme": "Light"}
+      ]
+    }
+
+Every worker builds its own engine over the same memory-mapped columnar
+cache file (`flowsight.storage`), so the data pages are shared through the
+OS page cache instead of being copied per worker. The parent process
+builds the cache file first if it does not exist yet.
+
+The results directory receives `results.jsonl` (one record per query, in
+input order), `figures/<id>.json` for the queries that produced a figure
+and `summary.json` with the wall time and throughput. Presets and themes
+are checked before any query runs; a query that still fails gets a record
+with its `error` and the others are answered and written as usual.
+"""
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from flowsight import datasets, derived, engine, filters, schema
+
+RESULTS_FILE = "results.jsonl"
+SUMMARY_FILE = "summary.json"
+FIGURES_DIR = "figures"
+
+# Engine of the current worker process, built by `_init_worker`
+_ENGINE = None
+
+
+def read_jobs(path, columns=None):
+    """
+    Returns the queries of a query file as a list of jobs (dicts with
+    'query', 'preset' and 'theme') and the filter presets by name. Raises
+    ValueError for unknown presets, themes and preset columns (`columns`,
+    by default the declared and derived columns of the city data).
+    """
+    columns = set(columns) if columns is not None else set(schema.CITY_SCHEMA) | set(derived.DERIVED_COLUMNS)
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    if not path.endswith('.json'):
+        queries = [line.strip() for line in text.splitlines() if line.strip()]
+        return [{'query': query, 'preset': None, 'theme': 'Dark'} for query in queries], {}
+    spec = json.loads(text)
+    presets = spec.get('presets', {})
+    for name, preset in presets.items():
+        unknown = sorted((set(preset.get('ranges', {})) | set(preset.get('selections', {}))) - columns)
+        if unknown:
+            raise ValueError(f"Preset '{name}' filters unknown columns: {', '.join(unknown)}.")
+    jobs = []
+    for entry in spec.get('queries', []):
+        entry = {'query': entry} if isinstance(entry, str) else dict(entry)
+        entry.setdefault('preset', None)
+        entry.setdefault('theme', 'Dark')
+        if entry['preset'] is not None and entry['preset'] not in presets:
+            raise ValueError(f"Query '{entry['query']}' uses the unknown preset '{entry['preset']}'.")
+        if entry['theme'] not in engine.THEMES:
+            raise ValueError(f"Query '{entry['query']}' uses the unknown theme '{entry['theme']}'. Expected one of {list(engine.THEMES)}.")
+        jobs.append(entry)
+    return jobs, presets
+
+
+def preset_state(preset):
+    """Converts a preset ({'ranges': {col: [low, high]}, 'selections': {col: [values]}}) to a FilterState."""
+    preset = preset or {}
+    return filters.FilterState(
+        ranges={col: tuple(bounds) for col, bounds in preset.get('ranges', {}).items()},
+        selections={col: list(values) for col, values in preset.get('selections', {}).items()},
+    )
+
+
+def _init_worker(file_path, verbose):
+    global _ENGINE
+    if not verbose:
+        sys.stdout = open(os.devnull, 'w') # the analyses print DEBUG lines
+    _ENGINE = engine.Engine.load(file_path)
+    # The engine imports Plotly on the first answer; import it here so no query's timing includes it
+    importlib.import_module('plotly.express')
+
+
+def error_record(job_id, job, exc):
+    """Builds the result record of a job that failed with `exc`."""
+    return {
+        'id': job_id, 'query': job['query'], 'preset': job['preset'], 'theme': job['theme'],
+        'error': repr(exc), 'worker': os.getpid(),
+    }
+
+
+def run_job(job_id, job, preset, results_dir):
+    """
+    Answers one job in the current worker and returns its result record;
+    a failing job returns an `error_record` instead of raising.
+    """
+    try:
+        start = time.perf_counter()
+        view = _ENGINE.view(preset_state(preset))
+        answer = _ENGINE.ask(job['query'], view, theme=job['theme'])
+        seconds = time.perf_counter() - start
+
+        figure_file = None
+        figure_json = answer.figure_json()
+        if figure_json is not None:
+            figure_file = os.path.join(FIGURES_DIR, f"{job_id:05d}.json")
+            with open(os.path.join(results_dir, figure_file), 'w', encoding='utf-8') as f:
+                f.write(figure_json)
+    except Exception as exc:
+        return error_record(job_id, job, exc)
+    return {
+        'id': job_id, 'query': job['query'], 'preset': job['preset'], 'theme': job['theme'],
+        'intent': answer.intent, 'text': answer.text, 'figure': figure_file,
+        'seconds': round(seconds, 6), 'worker': os.getpid(),
+    }
+
+
+def _result(future, job_id, job):
+    """Returns a job's record, or an `error_record` when its worker failed (e.g. a crashed process)."""
+    try:
+        return future.result()
+    except Exception as exc:
+        return error_record(job_id, job, exc)
+
+
+def run_batch(jobs, presets, results_dir, workers=None, file_path=datasets.CITY_DATA_PATH, verbose=False):
+    """
+    Answers `jobs` across a pool of `workers` processes (one per CPU by
+    default) and writes the results to `results_dir`. Returns the records
+    in input order and the summary.
+    """
+    os.makedirs(os.path.join(results_dir, FIGURES_DIR), exist_ok=True)
+    datasets.read_city_data(file_path) # builds the shared cache file once, before the workers map it
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(file_path, verbose)) as pool:
+        futures = [
+            pool.submit(run_job, job_id, job, presets.get(job['preset']), results_dir)
+            for job_id, job in enumerate(jobs)
+        ]
+        records = [_result(future, job_id, job) for job_id, (future, job) in enumerate(zip(futures, jobs))]
+    wall_seconds = time.perf_counter() - start
+
+    with open(os.path.join(results_dir, RESULTS_FILE), 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+    query_seconds = sorted(record['seconds'] for record in records if 'error' not in record)
+    summary = {
+        'queries': len(records),
+        'errors': sum('error' in record for record in records),
+        'workers': workers or os.cpu_count(),
+        'wall_seconds': round(wall_seconds, 3),
+        'queries_per_second': round(len(records) / wall_seconds, 2) if wall_seconds else None,
+        'median_query_seconds': query_seconds[len(query_seconds) // 2] if query_seconds else None,
+        'max_query_seconds': query_seconds[-1] if query_seconds else None,
+        'figures': sum(record.get('figure') is not None for record in records),
+    }
+    with open(os.path.join(results_dir, SUMMARY_FILE), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+    return records, summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('queries', help="query file (.json with presets, or one query per line)")
+    parser.add_argument('results_dir')
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument('--data', default=datasets.CITY_DATA_PATH, help="city traffic CSV")
+    parser.add_argument('--repeat', type=int, default=1, help="run the query list this many times (throughput runs)")
+    parser.add_argument('--verbose', action='store_true', help="keep the analyses' DEBUG output")
+    args = parser.parse_args(argv)
+
+    jobs, presets = read_jobs(args.queries, datasets.read_city_data(args.data).columns)
+    records, summary = run_batch(jobs * args.repeat, presets, args.results_dir, args.workers, args.data, args.verbose)
+    for key, value in summary.items():
+        print(f"{key}: {value}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+In-process LRU cache with an entry limit and a memory budget.
+
+Streamlit reruns the whole script on every widget change, and every session
+runs in its own thread of the same process. `LRUCache` lets those reruns and
+sessions share derived results (filtered frames, aggregates, rendered
+figures) while bounding how much memory they may hold.
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+def estimate_nbytes(value):
+    """Roughly estimates the memory held by a cached value."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=True, index=True)
+        return int(usage.sum()) if isinstance(value, pd.DataFrame) else int(usage)
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (bytes, str)):
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_nbytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_nbytes(v) for v in value)
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """
+    Thread-safe least-recently-used cache.
+    Entries are evicted oldest-first once either `max_entries` or `max_bytes`
+    is exceeded; a single value larger than `max_bytes` is not cached at all.
+    With `max_age` (seconds), entries stored longer ago than that count as
+    misses and are dropped when next looked up.
+    """
+
+    def __init__(self, max_entries=32, max_bytes=256 * 1024 * 1024, max_age=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._entries = OrderedDict()  # key -> (value, nbytes, stored_at)
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            if self.max_age is not None and time.monotonic() - self._entries[key][2] > self.max_age:
+                self.total_bytes -= self._entries.pop(key)[1]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0]
+
+    def put(self, key, value, nbytes=None):
+        nbytes = estimate_nbytes(value) if nbytes is None else nbytes
+        if nbytes > self.max_bytes:
+            return value
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, nbytes, time.monotonic())
+            self.total_bytes += nbytes
+            self._evict()
+        return value
+
+    def resize(self, key, nbytes):
+        """
+        Records a new size for the entry of `key`, for values that grow after
+        they were stored (e.g. results that keep lazily computed aggregates),
+        and evicts as `put` does. An entry grown past `max_bytes` is dropped.
+        """
+        with self._lock:
+            if key not in self._entries:
+                return
+            value, old_nbytes, stored_at = self._entries[key]
+            if nbytes > self.max_bytes:
+                del self._entries[key]
+                self.total_bytes -= old_nbytes
+                self.evictions += 1
+                return
+            self._entries[key] = (value, nbytes, stored_at)
+            self.total_bytes += nbytes - old_nbytes
+            self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            _, (_, evicted_bytes, _) = self._entries.popitem(last=False)
+            self.total_bytes -= evicted_bytes
+            self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """Returns the cached value for `key`, computing and storing it on a miss."""
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = self.put(key, compute())
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'bytes': self.total_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
@@ -0,0 +1,126 @@
+"""
+Profile catalog of a loaded dataset.
+
+The sidebar sliders need each column's minimum and maximum, the
+multiselects the distinct management types and cities, the dashboard its
+per-city date coverage and the Gemini context the column kinds and the date
+range. Each of these used to be a scan of the frame on every rerun.
+`DatasetProfile.build` makes those scans once; the engine keeps the profile
+of the full dataset for as long as the dataset version is unchanged, and a
+`FilteredView` keeps the profile of its rows with the cached filter result.
+"""
+import sys
+from dataclasses import dataclass
+
+import pandas as pd
+
+from flowsight import caching
+
+# Distinct values are only listed for categorical columns with at most this many
+MAX_DISTINCT_VALUES = 1000
+
+
+@dataclass
+class ColumnProfile:
+    """
+    Statistics of one column. `kind` is 'numeric', 'boolean', 'datetime' or
+    'categorical' (anything else). `minimum`/`maximum` are set for numeric and
+    datetime columns, `values` (distinct values in order of first appearance)
+    for boolean and categorical columns, and `n_true` for boolean columns.
+    """
+    name: str
+    kind: str
+    dtype: str
+    count: int
+    missing: int
+    n_distinct: int
+    minimum: object = None
+    maximum: object = None
+    values: list = None
+    n_true: int = None
+
+    @classmethod
+    def build(cls, name, series, max_distinct=MAX_DISTINCT_VALUES):
+        if pd.api.types.is_bool_dtype(series):
+            kind = 'boolean'
+        elif pd.api.types.is_numeric_dtype(series):
+            kind = 'numeric'
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            kind = 'datetime'
+        else:
+            kind = 'categorical'
+        count = int(series.count())
+        profile = cls(
+            name=name, kind=kind, dtype=str(series.dtype), count=count,
+            missing=len(series) - count, n_distinct=int(series.nunique())
+        )
+        if kind == 'numeric' and count:
+            profile.minimum, profile.maximum = float(series.min()), float(series.max())
+        elif kind == 'datetime' and count:
+            profile.minimum, profile.maximum = series.min(), series.max()
+        elif kind in ('boolean', 'categorical') and profile.n_distinct <= max_distinct:
+            profile.values = series.dropna().unique().tolist()
+        if kind == 'boolean':
+            profile.n_true = int(series.sum())
+        return profile
+
+    @property
+    def nbytes(self):
+        return sys.getsizeof(self) + caching.estimate_nbytes(self.values or [])
+
+
+class DatasetProfile:
+    """
+    Column profiles of a frame plus, per value of `by` (the city), the row
+    count and the first and last date of `date_column`.
+    """
+
+    def __init__(self, rows, columns, group_rows, group_dates):
+        self.rows = rows
+        self.columns = columns         # name -> ColumnProfile, in frame order
+        self.group_rows = group_rows   # city -> rows
+        self.group_dates = group_dates # city -> (first date, last date)
+
+    def __contains__(self, column):
+        return column in self.columns
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the profile (column profiles and per-city tables)."""
+        return (caching.estimate_nbytes(self.columns) + caching.estimate_nbytes(self.group_rows)
+                + caching.estimate_nbytes(self.group_dates))
+
+    @classmethod
+    def build(cls, df, by='CITY', date_column='date', max_distinct=MAX_DISTINCT_VALUES):
+        columns = {name: ColumnProfile.build(name, df[name], max_distinct) for name in df.columns}
+        group_rows, group_dates = {}, {}
+        if by in df.columns:
+            grouped = df.groupby(by, observed=True, sort=False)
+            group_rows = {key: int(n) for key, n in grouped.size().items()}
+            if date_column in columns and columns[date_column].kind == 'datetime':
+                coverage = grouped[date_column].agg(['min', 'max']).dropna()
+                group_dates = {key: (first, last) for key, first, last in coverage.itertuples()}
+        return cls(len(df), columns, group_rows, group_dates)
+
+    def range(self, column):
+        """Returns the (minimum, maximum) of a numeric or datetime column."""
+        profile = self.columns[column]
+        return profile.minimum, profile.maximum
+
+    def values(self, column):
+        """Returns the distinct values of a boolean or categorical column, in order of first appearance."""
+        return list(self.columns[column].values)
+
+    def columns_of_kind(self, *kinds):
+        """Returns the names of the columns of the given kinds, in frame order."""
+        return [name for name, profile in self.columns.items() if profile.kind in kinds]
+
+    def date_coverage(self, group=None, date_column='date'):
+        """
+        Returns the first and last date of `group` (of the whole frame when
+        None), or None when there are no dates.
+        """
+        if group is None:
+            first, last = self.range(date_column)
+            return (first, last) if first is not None else None
+        return self.group_dates.get(group)
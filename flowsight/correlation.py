@@ -0,0 +1,237 @@
+"""
+Correlation engines for the assistant.
+
+`CorrelationTensor` serves the impact and strongest-factor answers. Those
+answers used to slice the frame once per city and call `Series.corr` once per
+feature; the tensor instead sums the moments of all cities in one grouped
+pass (or rolls them up from a `flowsight.stats` cube) and derives every
+city x feature x target correlation at once, so each answer is an array
+lookup.
+
+`CorrelationMatrix` serves the heatmap. It fills a Pearson, Spearman or
+Kendall matrix lazily, block by block, for the columns that are asked for
+and keeps what it has computed, so changing the column subset only computes
+the new pairs. Spearman and Kendall reuse the column ranks in `ColumnRanks`.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from flowsight import caching, derived, stats
+
+CORRELATION_METHODS = ('pearson', 'spearman', 'kendall')
+
+# Numeric columns left out of the default heatmap: constant per city, so they
+# only restate the city mix of the filtered data
+HEATMAP_EXCLUDED_COLUMNS = ['CITY AREA (PER KMSQ)']
+
+# Columns per block when filling a correlation matrix
+MATRIX_BLOCK_SIZE = 64
+
+
+class CorrelationTensor:
+    """
+    Pearson correlations per group, feature and target (`values`, shape
+    groups x features x targets) plus the correlations over all groups together
+    (`overall`, features x targets). NaN marks pairs with fewer than two rows
+    or a constant column, where pandas would also return NaN.
+    """
+
+    def __init__(self, by, groups, features, targets, values, overall):
+        self.by = by
+        self.groups = groups
+        self.features = list(features)
+        self.targets = list(targets)
+        self.values = values
+        self.overall = overall
+        self._feature_position = {col: i for i, col in enumerate(self.features)}
+        self._target_position = {col: i for i, col in enumerate(self.targets)}
+
+    def __contains__(self, pair):
+        feature, target = pair
+        return feature in self._feature_position and target in self._target_position
+
+    @classmethod
+    def build(cls, source, by='CITY', features=stats.CUBE_MEASURES, targets=stats.CUBE_MEASURES):
+        """
+        `source` is either a frame or a `stats.MomentCube` that has `by` as a
+        dimension and holds exactly the rows to correlate.
+        """
+        if isinstance(source, stats.MomentCube):
+            cube = source
+        else:
+            measures = list(dict.fromkeys(list(features) + list(targets)))
+            cube = stats.MomentCube.build(source, dimensions=[by], measures=measures)
+        keys, moments = cube.rollup(by)
+        features = [col for col in features if col in moments]
+        targets = [col for col in targets if col in moments]
+        values = moments.corr_matrix(features, targets)
+        overall = cube.total().corr_matrix(features, targets)
+        return cls(by, keys[by], features, targets, values, overall)
+
+    def by_group(self, feature, target):
+        """
+        Returns the groups with a defined correlation of `feature` and
+        `target`, as a frame with the group column and 'Correlation'.
+        """
+        column = self.values[:, self._feature_position[feature], self._target_position[target]]
+        defined = ~np.isnan(column)
+        return pd.DataFrame({
+            self.by: self.groups[defined].reset_index(drop=True),
+            'Correlation': column[defined],
+        })
+
+    @property
+    def nbytes(self):
+        return int(self.values.nbytes + self.overall.nbytes) + caching.estimate_nbytes(self.groups)
+
+    def overall_corr(self, feature, target):
+        return float(self.overall[self._feature_position[feature], self._target_position[target]])
+
+
+def heatmap_columns(df):
+    """Returns the numeric source columns offered for the heatmap, in frame order."""
+    return [col for col in df.select_dtypes(include='number').columns
+            if col not in HEATMAP_EXCLUDED_COLUMNS and col not in derived.DERIVED_COLUMNS]
+
+
+def pearson_block(a, b):
+    """
+    Pairwise-complete Pearson correlations between the columns of `a` and
+    the columns of `b` (2-D arrays with the same rows, NaN for missing), as
+    pandas `DataFrame.corr` computes them.
+    """
+    valid_a, valid_b = ~np.isnan(a), ~np.isnan(b)
+    x_a, x_b = np.where(valid_a, a, 0.0), np.where(valid_b, b, 0.0)
+    v_a, v_b = valid_a.astype(np.float64), valid_b.astype(np.float64)
+    return stats.pearson(
+        v_a.T @ v_b, x_a.T @ v_b, v_a.T @ x_b,
+        (x_a * x_a).T @ v_b, v_a.T @ (x_b * x_b), x_a.T @ x_b
+    )
+
+
+def kendall_block(a, b, needed):
+    """
+    Pairwise-complete Kendall tau-b between the columns of `a` and `b`,
+    for the pairs marked in `needed`; the other entries are NaN.
+    """
+    from scipy.stats import kendalltau # optional dependency, only needed for this method
+
+    out = np.full((a.shape[1], b.shape[1]), np.nan)
+    for i, j in zip(*np.nonzero(needed)):
+        both = ~np.isnan(a[:, i]) & ~np.isnan(b[:, j])
+        if np.count_nonzero(both) > 1:
+            out[i, j] = kendalltau(a[both, i], b[both, j]).statistic
+    return out
+
+
+class ColumnRanks:
+    """Average ranks of the columns of one frame, computed once per column."""
+
+    def __init__(self, frame):
+        self.frame = frame
+        self._ranks = {}
+
+    @property
+    def nbytes(self):
+        """Memory held by the ranks computed so far (the frame belongs to the filter result)."""
+        return sum(ranks.nbytes for ranks in list(self._ranks.values()))
+
+    def get(self, column):
+        if column not in self._ranks:
+            self._ranks[column] = self.frame[column].rank(method='average').to_numpy(dtype=np.float64)
+        return self._ranks[column]
+
+
+class CorrelationMatrix:
+    """
+    Lazily filled correlation matrix over the columns of one frame.
+    Spearman correlates the ranks of each column's present values; where
+    values are missing this can differ slightly from pandas, which re-ranks
+    every pair over the rows where both are present.
+    """
+
+    def __init__(self, frame, method='pearson', ranks=None, block_size=MATRIX_BLOCK_SIZE):
+        if method not in CORRELATION_METHODS:
+            raise ValueError(f"Unknown correlation method '{method}'; expected one of {', '.join(CORRELATION_METHODS)}.")
+        self.frame = frame
+        self.method = method
+        self.ranks = ranks if ranks is not None else ColumnRanks(frame)
+        self.block_size = block_size
+        self.computed_pairs = 0
+        self._columns = []
+        self._position = {}
+        self._values = np.empty((0, 0))
+        self._known = np.zeros((0, 0), dtype=bool)
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        """Memory held by the matrix filled so far (the frame and ranks are accounted for by their owners)."""
+        return int(self._values.nbytes + self._known.nbytes)
+
+    def get(self, columns):
+        """Returns the correlation matrix of `columns`, computing only the pairs not seen before."""
+        columns = list(dict.fromkeys(columns))
+        with self._lock:
+            self._register(columns)
+            positions = np.array([self._position[col] for col in columns], dtype=np.intp)
+            # The matrix is symmetric, so only the upper triangle is computed
+            needed = np.triu(~self._known[np.ix_(positions, positions)])
+            for row_start in range(0, len(columns), self.block_size):
+                row_block = slice(row_start, row_start + self.block_size)
+                if not needed[row_block].any():
+                    continue
+                rows = columns[row_block]
+                row_values = self._column_values(rows)
+                for col_start in range(row_start, len(columns), self.block_size):
+                    col_block = slice(col_start, col_start + self.block_size)
+                    block_needed = needed[row_block, col_block]
+                    if not block_needed.any():
+                        continue
+                    cols = columns[col_block]
+                    block = self._compute(row_values, self._column_values(cols), block_needed)
+                    self._store(rows, cols, block, block_needed)
+            values = self._values[np.ix_(positions, positions)]
+        return pd.DataFrame(values, index=columns, columns=columns)
+
+    def _register(self, columns):
+        new = [col for col in columns if col not in self._position]
+        if not new:
+            return
+        for col in new:
+            self._position[col] = len(self._columns)
+            self._columns.append(col)
+        size = len(self._columns)
+        values = np.full((size, size), np.nan)
+        known = np.zeros((size, size), dtype=bool)
+        old = self._values.shape[0]
+        values[:old, :old] = self._values
+        known[:old, :old] = self._known
+        self._values, self._known = values, known
+
+    def _column_values(self, columns):
+        if self.method == 'pearson':
+            return np.column_stack([self.frame[col].to_numpy(dtype=np.float64, na_value=np.nan) for col in columns])
+        # Kendall's tau only depends on the ordering, so it can use the ranks too
+        return np.column_stack([self.ranks.get(col) for col in columns])
+
+    def _compute(self, a, b, needed):
+        if self.method == 'kendall':
+            return kendall_block(a, b, needed)
+        return pearson_block(a, b)
+
+    def _store(self, rows, columns, block, needed):
+        i, j = np.nonzero(needed)
+        row_positions = np.array([self._position[col] for col in rows], dtype=np.intp)[i]
+        col_positions = np.array([self._position[col] for col in columns], dtype=np.intp)[j]
+        values = block[i, j]
+        if self.method == 'kendall':
+            # pandas reports a column's Kendall tau with itself as 1, even when constant
+            values = np.where(row_positions == col_positions, 1.0, values)
+        self._values[row_positions, col_positions] = values
+        self._values[col_positions, row_positions] = values
+        self._known[row_positions, col_positions] = True
+        self._known[col_positions, row_positions] = True
+        self.computed_pairs += len(values)
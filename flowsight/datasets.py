@@ -0,0 +1,84 @@
+"""
+Preparation steps for the city traffic and policy CSVs.
+
+These functions hold the type conversion and cleaning that used to run on
+every cold start. They run once per source file version; the prepared frame
+is then served from the columnar cache in `flowsight.storage`.
+"""
+import pandas as pd
+
+from flowsight import derived, schema, storage
+
+CITY_DATA_PATH = "city_data.csv"
+POLICY_DATA_PATH = "combined_traffic_policies_with_city.csv"
+
+# Bump these whenever the preparation logic below changes so stale caches are ignored.
+CITY_DATA_TAG = "city3"
+POLICY_DATA_TAG = "policy1"
+
+CITY_DATE_FORMAT = "%m/%d/%Y"     # e.g. 3/11/2016
+POLICY_DATE_FORMAT = "%d-%b-%Y"   # e.g. 25-Nov-2015
+
+
+def parse_dates(series, date_format, dayfirst=False):
+    """
+    Parses a date column with a known format and falls back to per-value
+    parsing only for the entries that do not match it.
+    """
+    parsed = pd.to_datetime(series, format=date_format, errors='coerce')
+    unparsed = parsed.isna() & series.notna()
+    if unparsed.any():
+        parsed[unparsed] = pd.to_datetime(series[unparsed], format='mixed', dayfirst=dayfirst, errors='coerce')
+    return parsed
+
+
+def prepare_city_data(df):
+    """
+    Converts and cleans the raw city traffic CSV, casts it to CITY_SCHEMA and
+    adds the registered derived columns (`flowsight.derived`).
+    Columns that are missing are left alone so the caller can report them.
+    The footprint of the raw parsed frame is recorded in `df.attrs`.
+    """
+    raw_memory_bytes = schema.memory_usage_bytes(df)
+
+    if 'Holiday_Flag' in df.columns:
+        df['Holiday_Flag'] = df['Holiday_Flag'].astype(bool)
+
+    if 'date' in df.columns:
+        df['date'] = parse_dates(df['date'], CITY_DATE_FORMAT)
+        df = df.dropna(subset=['date']) # Drop rows where date conversion failed
+
+    if 'CITY' in df.columns:
+        df['CITY'] = df['CITY'].str.upper()
+        df['CITY'] = df['CITY'].replace('LOS ANGELOS', 'LOS ANGELES') # Data cleaning for consistency
+
+    df = schema.apply_schema(df)
+    derived.add_derived_columns(df)
+    df.attrs['raw_memory_bytes'] = raw_memory_bytes
+    return df
+
+
+def prepare_policy_data(df_policies):
+    """
+    Converts and cleans the raw traffic policy CSV.
+    Renames 'city' to 'CITY' for consistency with the main data.
+    """
+    df_policies['Date'] = parse_dates(df_policies['Date'], POLICY_DATE_FORMAT, dayfirst=True)
+    df_policies = df_policies.dropna(subset=['Date', 'city']) # Drop rows with missing date or city
+
+    if 'city' in df_policies.columns:
+        df_policies = df_policies.rename(columns={'city': 'CITY'})
+    if 'CITY' in df_policies.columns:
+        df_policies['CITY'] = df_policies['CITY'].str.upper()
+
+    return df_policies
+
+
+def read_city_data(file_path=CITY_DATA_PATH, cache_dir=storage.CACHE_DIR):
+    """Returns the prepared city traffic data, served from the columnar cache."""
+    return storage.load_cached_csv(file_path, prepare_city_data, tag=CITY_DATA_TAG, cache_dir=cache_dir)
+
+
+def read_policy_data(file_path=POLICY_DATA_PATH, cache_dir=storage.CACHE_DIR):
+    """Returns the prepared traffic policy data, served from the columnar cache."""
+    return storage.load_cached_csv(file_path, prepare_policy_data, tag=POLICY_DATA_TAG, cache_dir=cache_dir)
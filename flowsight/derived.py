@@ -0,0 +1,92 @@
+"""
+Registry of columns derived from the city data at load time.
+
+Calendar columns such as the season or the month used to be recomputed by
+the analyses on every rerun, sometimes row by row. Each entry below is a
+vectorized function of the prepared frame; `add_derived_columns` runs them
+once in `flowsight.datasets.prepare_city_data`, so the results are stored in
+the columnar cache with the rest of the data.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+SEASONS = ['Spring', 'Summer', 'Autumn', 'Winter']
+
+
+@dataclass
+class DerivedColumn:
+    """A derived column: the function computing it and its stored dtype."""
+    compute: object
+    dtype: object
+    source: str = 'date'
+
+
+DERIVED_COLUMNS = {}
+
+
+def derived_column(name, dtype, source='date'):
+    """Registers the decorated function as the derived column `name`."""
+    def register(compute):
+        DERIVED_COLUMNS[name] = DerivedColumn(compute, dtype, source)
+        return compute
+    return register
+
+
+@derived_column('season', pd.CategoricalDtype(SEASONS, ordered=True))
+def season(df):
+    """Meteorological season of the date: Spring is March to May, and so on."""
+    month = df['date'].dt.month.to_numpy()
+    names = np.array(['Winter', 'Spring', 'Summer', 'Autumn'])
+    return pd.Series(names[(month % 12) // 3], index=df.index)
+
+
+@derived_column('year_month', 'datetime64[ns]')
+def year_month(df):
+    """First day of the date's month."""
+    return df['date'].dt.to_period('M').dt.to_timestamp()
+
+
+@derived_column('iso_week', 'int8')
+def iso_week(df):
+    return df['date'].dt.isocalendar().week
+
+
+@derived_column('weekday', 'int8')
+def weekday(df):
+    """Day of the week, Monday=0."""
+    return df['date'].dt.weekday
+
+
+@derived_column('days_since_epoch', 'int32')
+def days_since_epoch(df):
+    return (df['date'] - pd.Timestamp(0)).dt.days
+
+
+def add_derived_columns(df, columns=None):
+    """
+    Adds the registered derived columns (or only `columns`) to `df` in place.
+    Columns whose source column is missing are skipped.
+    """
+    for name in columns if columns is not None else DERIVED_COLUMNS:
+        spec = DERIVED_COLUMNS[name]
+        if spec.source in df.columns:
+            df[name] = spec.compute(df).astype(spec.dtype)
+    return df
+
+
+def with_derived_columns(df, columns):
+    """
+    Returns `df` if it already holds `columns`; otherwise a copy with the
+    missing ones computed, so frames loaded without them still work.
+    """
+    missing = [name for name in columns if name not in df.columns]
+    if not missing:
+        return df
+    return add_derived_columns(df.copy(), missing)
+
+
+def derived_column_names(df):
+    """Returns the derived columns present in `df`."""
+    return [name for name in DERIVED_COLUMNS if name in df.columns]
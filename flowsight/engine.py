@@ -0,0 +1,142 @@
+"""
+Headless analysis engine over the city traffic data.
+
+`Engine` bundles what the Streamlit page builds at load time (the prepared
+frame, its indexes, the statistics cube, the dataset profile and the query
+router) with the filter cache, and answers assistant queries through
+`flowsight.assistant.plot_and_answer`. Nothing here imports Streamlit,
+geopandas, keplergl or google-generativeai, and Plotly is only imported
+once a query is answered, so batch jobs, benchmarks and worker processes
+can use the engine without booting the page:
+
+    from flowsight import engine, filters
+
+    analysis = engine.Engine.load()
+    view = analysis.view(filters.FilterState(selections={'CITY': ['PARIS', 'LONDON']}))
+    answer = analysis.ask("Rank cities by congestion", view)
+    print(answer.text, answer.figure_json() is not None)
+"""
+from dataclasses import dataclass
+
+from flowsight import caching, catalog, datasets, filters, indexes, router, stats
+from flowsight.assistant import plot_and_answer
+from flowsight.correlation import ColumnRanks, CorrelationMatrix, CorrelationTensor
+
+# Plotly template and font color of each page theme
+THEMES = {
+    'Dark': ('plotly_dark', 'white'),
+    'Light': ('plotly_white', 'black'),
+}
+
+FILTER_CACHE_MAX_ENTRIES = 32
+FILTER_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+
+@dataclass
+class Answer:
+    """An assistant answer: the response text, the Plotly figure (or None) and the routed intent."""
+    text: str
+    figure: object = None
+    intent: object = None
+
+    def figure_json(self):
+        return self.figure.to_json() if self.figure is not None else None
+
+
+@dataclass
+class FilteredView:
+    """
+    The data of one filter state: the (cached) filter result and, while the
+    range filters exclude no rows, the matching sub-cube of the statistics cube.
+    """
+    result: filters.FilterResult
+    cube: object = None
+    cache_hit: bool = False
+
+    @property
+    def frame(self):
+        return self.result.frame
+
+    def city_correlations(self):
+        """
+        Returns the city x feature x target correlations of this view,
+        computed on first use and kept with the cached filter result.
+        """
+        return self.result.aggregate(
+            "city_correlations",
+            lambda frame: CorrelationTensor.build(self.cube if self.cube is not None else frame)
+        )
+
+    def correlation_matrix(self, method):
+        """
+        Returns the heatmap correlation matrix of this view for `method`. It is
+        filled lazily and kept with the cached filter result, so later calls
+        only compute pairs not seen before.
+        """
+        ranks = self.result.aggregate("column_ranks", ColumnRanks)
+        return self.result.aggregate(
+            ("correlation_matrix", method),
+            lambda frame: CorrelationMatrix(frame, method, ranks=ranks)
+        )
+
+    def profile(self):
+        """Returns the `flowsight.catalog.DatasetProfile` of this view's rows, kept with the cached filter result."""
+        return self.result.aggregate("profile", catalog.DatasetProfile.build)
+
+
+class Engine:
+    """
+    Load-time structures of one dataset version plus the filter cache.
+    `df` is the prepared city data (`flowsight.datasets.read_city_data`).
+    """
+
+    def __init__(self, df, index=None, cube=None, intent_router=None, filter_cache=None, profile=None):
+        self.df = df
+        self.version = df.attrs.get('dataset_version')
+        self.index = index if index is not None else indexes.DatasetIndex.build(df)
+        self.cube = cube if cube is not None else stats.MomentCube.build(df)
+        self.profile = profile if profile is not None else catalog.DatasetProfile.build(df)
+        self.router = intent_router if intent_router is not None else router.IntentRouter(cities=tuple(self.profile.values('CITY')))
+        self.filter_cache = filter_cache if filter_cache is not None else caching.LRUCache(
+            max_entries=FILTER_CACHE_MAX_ENTRIES, max_bytes=FILTER_CACHE_MAX_BYTES
+        )
+
+    @classmethod
+    def load(cls, file_path=datasets.CITY_DATA_PATH, **kwargs):
+        """Builds an engine over the prepared city data at `file_path`."""
+        return cls(datasets.read_city_data(file_path), **kwargs)
+
+    def view(self, state=None):
+        """
+        Returns the `FilteredView` of a `flowsight.filters.FilterState`
+        (all rows by default), served from the filter cache when possible.
+        """
+        state = state if state is not None else filters.FilterState()
+        key = (self.version, state.fingerprint())
+        cache_hit = key in self.filter_cache
+        result = self.filter_cache.get_or_compute(key, lambda: self._filter(key, state))
+        # The cube only knows its own dimensions, so it stands in for the
+        # filtered frame only while the range filters exclude no rows
+        cube = None
+        if all(result.removed.get(col, 0) == 0 for col in state.ranges) and \
+           all(col in self.cube.dimensions for col in state.selections):
+            cube = self.cube.where(state.selections)
+        return FilteredView(result, cube, cache_hit)
+
+    def _filter(self, key, state):
+        result = filters.apply_filters(self.df, state, index=self.index)
+        # Aggregates are added after the cache sized the entry; they report their growth back
+        result.on_resize = lambda nbytes: self.filter_cache.resize(key, nbytes)
+        return result
+
+    def ask(self, query, view=None, theme='Dark', heatmap_subset=None, heatmap_method="pearson"):
+        """Answers an assistant query over `view` (all rows by default)."""
+        view = view if view is not None else self.view()
+        plot_template, font_color = THEMES[theme]
+        text, figure = plot_and_answer(
+            query, view.frame, plot_template, font_color,
+            index=self.index, cube=view.cube, correlations=view.city_correlations,
+            heatmap_subset=heatmap_subset, heatmap_method=heatmap_method,
+            correlation_matrices=view.correlation_matrix, intent_router=self.router
+        )
+        return Answer(text, figure, self.router.route(query).intent)
@@ -0,0 +1,163 @@
+"""
+Exports of the filtered city data.
+
+The page used to encode the whole filtered frame as CSV on every rerun,
+whether or not anyone downloaded it, and held the encoded copy next to the
+frame. `export_file` is meant to be handed to the download button as a
+callable, so it only runs when the button is clicked. It slices the frame
+in chunks of `EXPORT_CHUNK_ROWS` rows and selects the exported columns per
+chunk, so besides the frame and the encoded output only one chunk is ever
+held (as a copy and in its intermediate form, CSV text or an Arrow record
+batch). The output buffer is returned as is, so the only copy of the
+encoded payload is the one the download button takes.
+
+Derived columns (`flowsight.derived`) are left out: they are recomputed
+from the date whenever the data is loaded.
+"""
+import gzip
+import io
+from dataclasses import dataclass
+
+import numpy as np
+
+from flowsight import derived
+
+EXPORT_CHUNK_ROWS = 50_000
+
+# Significant decimal digits a float32 holds; CSV exports print float32 metrics to this precision
+FLOAT32_DIGITS = 7
+
+# Compression of the Parquet export; Arrow IPC stays uncompressed so it can be memory-mapped
+PARQUET_COMPRESSION = 'zstd'
+
+
+@dataclass(frozen=True)
+class ExportFormat:
+    """A download format: the label shown on the page, the file extension and the MIME type."""
+    label: str
+    extension: str
+    mime: str
+
+
+EXPORT_FORMATS = {
+    'csv': ExportFormat("CSV", "csv", "text/csv"),
+    'csv.gz': ExportFormat("CSV (gzip)", "csv.gz", "application/gzip"),
+    'parquet': ExportFormat("Parquet", "parquet", "application/vnd.apache.parquet"),
+    'arrow': ExportFormat("Arrow IPC", "arrow", "application/vnd.apache.arrow.file"),
+}
+
+
+def export_columns(df, columns=None):
+    """
+    Returns the exportable columns of `df` (all but the derived ones), in
+    frame order, restricted to `columns` when given.
+    """
+    excluded = set(derived.derived_column_names(df))
+    wanted = set(columns) if columns else None
+    return [col for col in df.columns if col not in excluded and (wanted is None or col in wanted)]
+
+
+def iter_chunks(frame, chunk_rows=EXPORT_CHUNK_ROWS, columns=None):
+    """
+    Yields consecutive row slices of `frame` (at least one, even when empty),
+    restricted to `columns` (all columns when None) one slice at a time.
+    """
+    columns = list(frame.columns) if columns is None else list(columns)
+    yield frame.iloc[:chunk_rows][columns]
+    for start in range(chunk_rows, len(frame), chunk_rows):
+        yield frame.iloc[start:start + chunk_rows][columns]
+
+
+def widen_float32(values, digits=FLOAT32_DIGITS):
+    """
+    Returns float32 `values` as float64 rounded to `digits` significant
+    digits, so they print as the decimals they were parsed from (34.33333,
+    1267891.0) instead of float32 artifacts (34.333332, 1.267891e+06).
+    That is within float32 precision but not always bit-exact; the Parquet
+    and Arrow exports keep the float32 values as they are.
+    """
+    values = values.astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        magnitude = np.floor(np.log10(np.abs(values)))
+    decimals = np.where(np.isfinite(magnitude), digits - 1 - magnitude, 0)
+    # Dividing the rounded integer by an exact power of ten gives the double closest to the decimal
+    scale = 10.0 ** np.abs(decimals)
+    rounded = np.where(decimals >= 0, np.round(values * scale) / scale, np.round(values / scale) * scale)
+    return np.where(np.isfinite(values), rounded, values)
+
+
+def write_csv(frame, sink, chunk_rows=EXPORT_CHUNK_ROWS, columns=None):
+    """
+    Writes `columns` of `frame` (all when None) as UTF-8 CSV (header once,
+    no index) to the binary file `sink`, with float32 columns widened by
+    `widen_float32`.
+    """
+    text = io.TextIOWrapper(sink, encoding='utf-8', newline='', write_through=True)
+    columns = list(frame.columns) if columns is None else list(columns)
+    float32_columns = [col for col in columns if frame[col].dtype == np.float32]
+    for i, chunk in enumerate(iter_chunks(frame, chunk_rows, columns)):
+        if float32_columns:
+            chunk = chunk.assign(**{col: widen_float32(chunk[col].to_numpy()) for col in float32_columns})
+        chunk.to_csv(text, header=i == 0, index=False)
+    text.detach() # leaves `sink` open
+
+
+def write_parquet(frame, sink, chunk_rows=EXPORT_CHUNK_ROWS, columns=None):
+    """Writes `columns` of `frame` (all when None) to `sink` as Parquet, one row group per chunk."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    for chunk in iter_chunks(frame, chunk_rows, columns):
+        # Later chunks reuse the first chunk's schema, so a chunk whose object
+        # column is all missing is not typed differently
+        table = pa.Table.from_pandas(chunk, schema=writer.schema if writer else None, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(sink, table.schema, compression=PARQUET_COMPRESSION)
+        writer.write_table(table)
+    writer.close()
+
+
+def write_arrow(frame, sink, chunk_rows=EXPORT_CHUNK_ROWS, columns=None):
+    """Writes `columns` of `frame` (all when None) to `sink` as an Arrow IPC file, one record batch per chunk."""
+    import pyarrow as pa
+
+    writer = schema = None
+    for chunk in iter_chunks(frame, chunk_rows, columns):
+        batch = pa.RecordBatch.from_pandas(chunk, schema=schema, preserve_index=False)
+        if writer is None:
+            schema = batch.schema
+            writer = pa.ipc.new_file(sink, schema)
+        writer.write_batch(batch)
+    writer.close()
+
+
+def write_export(frame, export_format, sink, chunk_rows=EXPORT_CHUNK_ROWS, columns=None):
+    """
+    Writes `columns` of `frame` (all when None) in `export_format` (a key of
+    `EXPORT_FORMATS`) to the binary file `sink`.
+    """
+    if export_format == 'csv':
+        write_csv(frame, sink, chunk_rows, columns)
+    elif export_format == 'csv.gz':
+        with gzip.GzipFile(fileobj=sink, mode='wb', compresslevel=6) as compressed:
+            write_csv(frame, compressed, chunk_rows, columns)
+    elif export_format == 'parquet':
+        write_parquet(frame, sink, chunk_rows, columns)
+    elif export_format == 'arrow':
+        write_arrow(frame, sink, chunk_rows, columns)
+    else:
+        raise ValueError(f"Unknown export format '{export_format}'. Expected one of {list(EXPORT_FORMATS)}.")
+
+
+def export_file(df, export_format, columns=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    Returns the export of `df` in `export_format`, limited to `columns`
+    (all exportable columns when empty), as a `BytesIO` positioned at the
+    start. The download button reads the payload from it directly, so no
+    further copy of the encoded export is made here.
+    """
+    sink = io.BytesIO()
+    write_export(df, export_format, sink, chunk_rows, export_columns(df, columns))
+    sink.seek(0)
+    return sink
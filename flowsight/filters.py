@@ -0,0 +1,218 @@
+"""
+Single-pass filter engine for the sidebar filters.
+
+The sidebar used to narrow the data one predicate at a time, materializing a
+new DataFrame after every step. Here all slider and multiselect states are
+combined into one boolean mask and the filtered frame is materialized once.
+
+When the load-time indexes (`flowsight.indexes.DatasetIndex`) are supplied,
+range predicates are answered with binary searches and membership predicates
+with precomputed bitmaps: filters left at their full extent cost nothing, and
+narrow ranges select their row ids directly from the sort order.
+"""
+import hashlib
+import json
+import threading
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from flowsight import caching, indexes
+
+# An indexed range that keeps more than this fraction of the rows is tested with
+# a sequential comparison; gathering that many row ids would cost more.
+INDEX_SELECTIVITY = 0.2
+
+_MISSING = object()
+
+
+@dataclass
+class FilterState:
+    """
+    The complete state of the sidebar filters.
+    `ranges` maps a numeric column to an inclusive (low, high) pair and
+    `selections` maps a categorical column to the values to keep.
+    """
+    ranges: dict = field(default_factory=dict)
+    selections: dict = field(default_factory=dict)
+
+    def fingerprint(self):
+        """
+        Returns a canonical hash of the filter state.
+        Column order and the order of selected values do not affect it, so
+        equivalent widget states map to the same cache entry.
+        """
+        canonical = {
+            'ranges': sorted((col, repr(float(low)), repr(float(high))) for col, (low, high) in self.ranges.items()),
+            'selections': sorted((col, sorted(str(value) for value in set(selected))) for col, selected in self.selections.items()),
+        }
+        return hashlib.sha1(json.dumps(canonical).encode()).hexdigest()
+
+
+@dataclass
+class FilterResult:
+    """
+    The filtered frame plus, for every predicate, the number of rows that
+    predicate excludes on its own (rows can be excluded by several predicates).
+    `aggregates` holds results derived from the frame (rankings, summaries) so
+    a cached result can serve them again without recomputation.
+    `on_resize`, when set, is called with the new `nbytes` whenever the
+    aggregates grow, so the cache holding the result can account for them.
+    """
+    frame: object
+    total_rows: int
+    removed: dict = field(default_factory=dict)
+    aggregates: dict = field(default_factory=dict)
+    on_resize: object = field(default=None, repr=False, compare=False)
+    _lock: object = field(default_factory=threading.Lock, init=False, repr=False, compare=False)
+    _frame_nbytes: int = field(default=None, init=False, repr=False, compare=False)
+    _reported_nbytes: int = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def kept_rows(self):
+        return len(self.frame)
+
+    @property
+    def rows(self):
+        """Positions of the kept rows in the unfiltered frame."""
+        return self.frame.index.to_numpy()
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the frame and the aggregates computed so far."""
+        if self._frame_nbytes is None:
+            self._frame_nbytes = caching.estimate_nbytes(self.frame) # the frame never changes
+        with self._lock:
+            aggregates = list(self.aggregates.values())
+        return self._frame_nbytes + caching.estimate_nbytes(aggregates)
+
+    def aggregate(self, name, compute):
+        """
+        Returns the aggregate `name`, computing it from the frame on first use.
+        Sessions share cached results, so the first stored value wins when two
+        compute the same aggregate at once. Some aggregates fill in lazily
+        (correlation matrices, ranks), so the size is re-measured on every
+        call and reported through `on_resize` when it changed.
+        """
+        with self._lock:
+            value = self.aggregates.get(name, _MISSING)
+        if value is _MISSING:
+            value = compute(self.frame) # outside the lock: computations may ask for other aggregates
+            with self._lock:
+                value = self.aggregates.setdefault(name, value)
+        if self.on_resize is not None:
+            nbytes = self.nbytes
+            if nbytes != self._reported_nbytes:
+                self._reported_nbytes = nbytes
+                self.on_resize(nbytes)
+        return value
+
+
+def range_mask(values, low, high):
+    """Returns the inclusive range mask for a column; NaN values never match."""
+    values = np.asarray(values)
+    return (values >= low) & (values <= high)
+
+
+def selection_mask(series, selected):
+    """Returns the membership mask for a categorical or text column."""
+    return series.isin(list(selected)).to_numpy()
+
+
+def build_mask(df, state):
+    """
+    Evaluates every predicate of `state` against `df` and ANDs them into one mask.
+    Returns the mask and the per-predicate count of excluded rows.
+    """
+    n_rows = len(df)
+    mask = np.ones(n_rows, dtype=bool)
+    removed = {}
+    for col, (low, high) in state.ranges.items():
+        predicate = range_mask(df[col].to_numpy(), low, high)
+        removed[col] = n_rows - int(np.count_nonzero(predicate))
+        mask &= predicate
+    for col, selected in state.selections.items():
+        predicate = selection_mask(df[col], selected)
+        removed[col] = n_rows - int(np.count_nonzero(predicate))
+        mask &= predicate
+    return mask, removed
+
+
+def select_rows(df, state, index):
+    """
+    Returns the ascending row positions of `df` that satisfy `state`, and the
+    per-predicate count of excluded rows, using the range and bitmap indexes
+    in `index` (a `flowsight.indexes.DatasetIndex`) where they cover a column.
+    """
+    n_rows = len(df)
+    range_index, bitmap_index = index.ranges, index.bitmaps
+    removed = {}
+
+    # Indexed ranges: two binary searches each give the exact count of matching
+    # rows; full-extent sliders drop out here without touching the column.
+    selective, broad = [], []
+    for col, (low, high) in state.ranges.items():
+        if col in range_index:
+            column_index = range_index[col]
+            start, stop = column_index.bounds(low, high)
+            removed[col] = n_rows - (stop - start)
+            if column_index.covers_all(start, stop):
+                continue
+            if stop - start <= INDEX_SELECTIVITY * n_rows:
+                selective.append((stop - start, col, start, stop))
+            else:
+                broad.append(col)
+
+    # Start from the most selective indexed range and test the others by rank
+    candidates = None
+    if selective:
+        selective.sort()
+        _, col, start, stop = selective[0]
+        candidates = range_index[col].rows(start, stop)
+        for _, col, start, stop in selective[1:]:
+            candidates = candidates[range_index[col].contains(candidates, start, stop)]
+
+    # Indexed selections: OR the bitmaps of the selected values, AND across columns.
+    # Selections that keep every value drop out like full-extent sliders.
+    bitmaps = []
+    for col, selected in state.selections.items():
+        if col in bitmap_index:
+            column_index = bitmap_index[col]
+            removed[col] = n_rows - column_index.count(selected)
+            if not column_index.covers_all(selected):
+                bitmaps.append(column_index.union(selected))
+    mask = indexes.to_mask(indexes.intersect(bitmaps), n_rows) if bitmaps else None
+
+    # Broad ranges are cheaper to test with a sequential comparison than through
+    # the index; their removed counts are already known.
+    for col, (low, high) in state.ranges.items():
+        if col in range_index and col not in broad:
+            continue
+        predicate = range_mask(df[col].to_numpy(), low, high)
+        if col not in range_index:
+            removed[col] = n_rows - int(np.count_nonzero(predicate))
+        mask = predicate if mask is None else mask & predicate
+    for col, selected in state.selections.items():
+        if col not in bitmap_index:
+            predicate = selection_mask(df[col], selected)
+            removed[col] = n_rows - int(np.count_nonzero(predicate))
+            mask = predicate if mask is None else mask & predicate
+
+    if candidates is None:
+        rows = np.arange(n_rows) if mask is None else np.flatnonzero(mask)
+    else:
+        rows = candidates if mask is None else candidates[mask[candidates]]
+    return rows, removed
+
+
+def apply_filters(df, state, index=None):
+    """
+    Applies all sidebar filters to `df` in one pass and materializes the result once.
+    `index` is an optional `flowsight.indexes.DatasetIndex` built from `df`.
+    The original row labels are kept so filtered rows can be traced back to `df`.
+    """
+    if index is None:
+        mask, removed = build_mask(df, state)
+        return FilterResult(frame=df[mask], total_rows=len(df), removed=removed)
+    rows, removed = select_rows(df, state, index)
+    return FilterResult(frame=df.take(rows), total_rows=len(df), removed=removed)
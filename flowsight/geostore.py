@@ -0,0 +1,243 @@
+"""
+Columnar store for the city road-network GeoJSON layers.
+
+GeoJSON is text and the slowest format geopandas reads. The first time a
+city's layer is loaded it is converted to GeoParquet in the cache directory,
+in a file named after the source file's content hash (as
+`flowsight.storage` does for the CSVs). Later loads read the Parquet file
+through Arrow, which decodes the geometry from WKB instead of parsing text.
+
+While converting, the features are sorted along a Hilbert curve and written
+in row groups with a per-feature bounding-box column (GeoParquet 1.1
+"covering"), so `read_layer(..., bbox=...)` skips the row groups outside a
+box. Per-feature centroids are computed once here and stored with the
+file; the map center the dashboard starts from is their mean.
+
+Every layer is also stored simplified at the `SIMPLIFY_TOLERANCES`
+(Douglas-Peucker with `preserve_topology`, so no geometry becomes invalid;
+line ends are always kept, so segments still meet where they did).
+`tolerance_for_zoom` picks the coarsest level whose error stays below half
+a screen pixel at a map zoom level, so the dashboard sends the map only as
+much detail as it can draw.
+
+geopandas is imported inside the functions that need it, so importing this
+module does not slow down the page. Convert every city (all levels) up
+front with:
+
+    python -m flowsight.geostore
+"""
+import argparse
+import os
+import sys
+from dataclasses import dataclass
+
+import numpy as np
+
+from flowsight import storage
+
+CITY_GEOJSONS = {
+    "BARCELONA": "geojson/barcelona_congestion_randomized.geojson",
+    "LONDON": "geojson/london_congestion_randomized.geojson",
+    "NEW YORK CITY": "geojson/new_york_congestion_randomized.geojson",
+    "LOS ANGELES": "geojson/los_angeles_congestion_randomized.geojson",
+    "PARIS": "geojson/paris_congestion_randomized.geojson",
+    "MELBOURNE": "geojson/melbourne_congestion_randomized.geojson",
+    "BANGALORE": "geojson/bangalore_congestion_randomized.geojson",
+    "BUENOS AIRES": "geojson/buenos_aires_congestion_randomized.geojson",
+}
+
+GEO_FORMAT_VERSION = "1"
+
+# Features per Parquet row group; the unit `bbox` reads can skip
+ROW_GROUP_FEATURES = 8192
+
+# Stored per feature next to the source attributes and split off again on read
+CENTROID_COLUMNS = ('__centroid_x', '__centroid_y')
+
+# Simplification tolerances of the stored levels, in the layer's coordinate
+# units (degrees: GeoJSON is always WGS 84); 0 is the full-detail layer
+SIMPLIFY_TOLERANCES = (0.00002, 0.0001, 0.0005)
+
+# Web map tile size in pixels; at zoom z the world is 256 * 2**z pixels wide
+TILE_SIZE = 256
+
+# A degree of latitude spans more pixels away from the equator; levels are
+# picked for this latitude (London, the northernmost city, is at 51.5)
+SIMPLIFY_REFERENCE_LATITUDE = 60.0
+
+
+@dataclass
+class CityLayer:
+    """
+    A city's road network: the GeoDataFrame with the source attributes, the
+    per-feature centroids (x and y arrays), the layer bounds (minx, miny,
+    maxx, maxy), the (latitude, longitude) the map starts at, the source
+    version (content hash prefix) and the simplification tolerance (0 for
+    full detail). Centroids, bounds and center are those of the full-detail
+    geometry at every level.
+    """
+    frame: object
+    centroid_x: np.ndarray
+    centroid_y: np.ndarray
+    bounds: tuple
+    center: tuple
+    version: str
+    tolerance: float = 0.0
+
+    def __len__(self):
+        return len(self.frame)
+
+
+def source_stamp(source_path):
+    """
+    Returns (size, modification time in ns) of a source file, or None when it
+    does not exist. Cheap enough to use as a cache key on every rerun.
+    """
+    try:
+        stat = os.stat(source_path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def layer_cache_path(source_path, fingerprint, cache_dir=storage.CACHE_DIR, tolerance=0.0):
+    """
+    Builds the GeoParquet path of a source file's layer at a simplification
+    tolerance, as `flowsight.storage.cache_path_for` does for the CSVs.
+    """
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    level = f"-s{format(tolerance, 'f').rstrip('0')}" if tolerance else "" # no exponent: '-' separates the name parts
+    return os.path.join(cache_dir, f"{stem}-geo-v{GEO_FORMAT_VERSION}{level}-{fingerprint[:16]}.parquet")
+
+
+def tolerance_for_zoom(zoom, tolerances=SIMPLIFY_TOLERANCES, latitude=SIMPLIFY_REFERENCE_LATITUDE):
+    """
+    Returns the largest of `tolerances` (in degrees) below half a pixel at
+    map zoom level `zoom` and `latitude`, or 0 (full detail) when none is.
+    """
+    degrees_per_pixel = 360.0 / (TILE_SIZE * 2 ** zoom) * np.cos(np.radians(latitude))
+    fitting = [tolerance for tolerance in tolerances if tolerance <= degrees_per_pixel / 2]
+    return max(fitting, default=0.0)
+
+
+def simplify_layer(layer, tolerance):
+    """Returns `layer` with its geometry simplified to `tolerance`."""
+    frame = layer.frame.set_geometry(layer.frame.geometry.simplify(tolerance, preserve_topology=True))
+    return CityLayer(frame, layer.centroid_x, layer.centroid_y, layer.bounds, layer.center, layer.version, tolerance)
+
+
+def convert_geojson(source_path, path):
+    """
+    Converts a GeoJSON file to the GeoParquet layout described above and
+    returns it as a `CityLayer`. Written to a temporary name first and then
+    renamed, so a concurrent reader never sees a half-written file. Write
+    failures (e.g. a read-only deployment) fall back to the converted
+    in-memory layer.
+    """
+    import geopandas as gpd # deferred: only the dashboard and the build step need it
+
+    frame = gpd.read_file(source_path)
+    if not frame.empty:
+        frame = frame.iloc[np.argsort(frame.hilbert_distance(), kind='stable')].reset_index(drop=True)
+    geometry = frame.geometry
+    if frame.crs is not None and frame.crs.is_geographic:
+        # Centroids in degrees are inaccurate (and geopandas warns); compute them in Web Mercator
+        centroids = geometry.to_crs(3857).centroid.to_crs(frame.crs)
+    else:
+        centroids = geometry.centroid
+    layer = _layer(frame.assign(**{CENTROID_COLUMNS[0]: centroids.x.to_numpy(), CENTROID_COLUMNS[1]: centroids.y.to_numpy()}), layer_version(path))
+    write_layer(layer, path)
+    return layer
+
+
+def write_layer(layer, path):
+    """
+    Writes a `CityLayer` (with its centroids) to `path` as GeoParquet. Write
+    failures (e.g. a read-only deployment) are reported and otherwise ignored.
+    """
+    stored = layer.frame.assign(**{CENTROID_COLUMNS[0]: layer.centroid_x, CENTROID_COLUMNS[1]: layer.centroid_y})
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        stored.to_parquet(tmp_path, index=False, write_covering_bbox=True, row_group_size=ROW_GROUP_FEATURES, compression='zstd')
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"DEBUG: Could not write layer '{path}': {e}")
+
+
+def read_layer(path, bbox=None):
+    """
+    Reads a converted layer. With `bbox` (minx, miny, maxx, maxy) only the
+    features whose bounding box intersects it are read, and row groups
+    entirely outside it are skipped.
+    """
+    import geopandas as gpd # deferred: only the dashboard and the build step need it
+
+    return _layer(gpd.read_parquet(path, bbox=bbox), layer_version(path), layer_tolerance(path))
+
+
+def layer_version(path):
+    """Returns the source content hash prefix in a converted layer's file name."""
+    return os.path.splitext(os.path.basename(path))[0].rsplit('-', 1)[-1]
+
+
+def layer_tolerance(path):
+    """Returns the simplification tolerance in a converted layer's file name (0 for full detail)."""
+    level = os.path.splitext(os.path.basename(path))[0].rsplit('-', 2)[-2]
+    return float(level[1:]) if level.startswith('s') else 0.0
+
+
+def _layer(stored, version, tolerance=0.0):
+    """Splits the stored centroid columns off a frame read from the store."""
+    centroid_x = stored[CENTROID_COLUMNS[0]].to_numpy()
+    centroid_y = stored[CENTROID_COLUMNS[1]].to_numpy()
+    frame = stored.drop(columns=list(CENTROID_COLUMNS))
+    bounds = tuple(float(v) for v in frame.total_bounds) if len(frame) else None
+    # The dashboard starts at the mean centroid (for points, the mean point)
+    center = (float(centroid_y.mean()), float(centroid_x.mean())) if len(frame) else (0.0, 0.0)
+    return CityLayer(frame, centroid_x, centroid_y, bounds, center, version, tolerance)
+
+
+def load_city_layer(source_path, cache_dir=storage.CACHE_DIR, tolerance=0.0, fingerprint=None):
+    """
+    Loads a city GeoJSON through the GeoParquet store at a simplification
+    `tolerance` (0 for full detail), converting or simplifying it on the
+    first load of each source version and level.
+    """
+    fingerprint = fingerprint or storage.file_fingerprint(source_path)
+    path = layer_cache_path(source_path, fingerprint, cache_dir, tolerance)
+    if os.path.exists(path):
+        try:
+            return read_layer(path)
+        except (OSError, ValueError) as e:
+            print(f"DEBUG: Ignoring unreadable layer '{path}': {e}")
+    if not tolerance:
+        return convert_geojson(source_path, path)
+    layer = simplify_layer(load_city_layer(source_path, cache_dir, fingerprint=fingerprint), tolerance)
+    write_layer(layer, path)
+    return layer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('cities', nargs='*', help="cities to convert (default: all)")
+    parser.add_argument('--cache-dir', default=storage.CACHE_DIR)
+    args = parser.parse_args(argv)
+
+    for city in args.cities or list(CITY_GEOJSONS):
+        source_path = CITY_GEOJSONS[city]
+        if not os.path.exists(source_path):
+            print(f"{city}: {source_path} not found, skipped")
+            continue
+        fingerprint = storage.file_fingerprint(source_path)
+        layer = load_city_layer(source_path, args.cache_dir, fingerprint=fingerprint)
+        print(f"{city}: {len(layer):,} features, bounds {layer.bounds}")
+        for tolerance in SIMPLIFY_TOLERANCES:
+            load_city_layer(source_path, args.cache_dir, tolerance, fingerprint)
+            size = os.path.getsize(layer_cache_path(source_path, fingerprint, args.cache_dir, tolerance))
+            print(f"  simplified to {tolerance:g}: {size / 1e6:.1f} MB")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
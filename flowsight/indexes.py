@@ -0,0 +1,212 @@
+"""
+Load-time indexes over the city traffic data.
+
+`SortedColumnIndex` keeps an argsort of a numeric column so an inclusive
+range predicate becomes two binary searches instead of a full-column
+comparison. The row ids inside the range are a contiguous slice of the sort
+order, and the inverse permutation (`rank`) lets other predicates test
+individual rows against that slice without rescanning the column.
+
+`BitmapIndex` keeps one packed bitmap per distinct value of a categorical
+column, so membership filters and per-value slices become bitwise OR/AND
+over precomputed bitmaps instead of string comparisons.
+
+`RowGroupIndex` records where the rows of every distinct value sit. The
+prepared city data is stored city by city, so each city is one contiguous
+block of rows and fetching it is a slice rather than a scan of the column.
+"""
+import numpy as np
+import pandas as pd
+
+# Numeric columns behind the sidebar range sliders
+RANGE_INDEX_COLUMNS = ['tavg', 'prcp', 'AQI_mean', 'TOTAL PUBLIC TRANSPORT TRIP']
+
+# Categorical columns used for membership filters and per-value slices
+BITMAP_INDEX_COLUMNS = ['CITY', 'MANAGEMENT_TYPE', 'Season', 'Holiday_Flag']
+
+# Categorical columns whose per-value row groups are looked up by the assistant
+ROW_GROUP_INDEX_COLUMNS = ['CITY']
+
+
+class SortedColumnIndex:
+    """Argsort index over one numeric column; NaN values never match a range."""
+
+    def __init__(self, values):
+        values = np.asarray(values)
+        self.order = np.argsort(values, kind='stable') # NaN sorts to the end
+        self.sorted_values = values[self.order]
+        self.n_rows = len(values)
+        self.n_valid = self.n_rows - int(np.count_nonzero(np.isnan(values))) if values.dtype.kind == 'f' else self.n_rows
+        self.rank = np.empty(self.n_rows, dtype=np.int64)
+        self.rank[self.order] = np.arange(self.n_rows)
+
+    def bounds(self, low, high):
+        """Returns the [start, stop) slice of the sort order holding low <= value <= high."""
+        valid = self.sorted_values[:self.n_valid]
+        if valid.dtype.kind == 'f':
+            # Compare at the column's precision, as the elementwise `>=`/`<=` masks do
+            low, high = valid.dtype.type(low), valid.dtype.type(high)
+        start = int(np.searchsorted(valid, low, side='left'))
+        stop = int(np.searchsorted(valid, high, side='right'))
+        return start, max(start, stop)
+
+    def covers_all(self, start, stop):
+        return start == 0 and stop == self.n_rows
+
+    def rows(self, start, stop):
+        """Returns the row ids inside a slice of the sort order, in ascending row order."""
+        return np.sort(self.order[start:stop])
+
+    def contains(self, row_ids, start, stop):
+        """Tests which of `row_ids` fall inside a slice of the sort order."""
+        ranks = self.rank[row_ids]
+        return (ranks >= start) & (ranks < stop)
+
+
+class RangeIndexSet(dict):
+    """Mapping of column name to `SortedColumnIndex`, built once per dataset version."""
+
+    @classmethod
+    def build(cls, df, columns=RANGE_INDEX_COLUMNS):
+        return cls({col: SortedColumnIndex(df[col].to_numpy()) for col in columns if col in df.columns})
+
+
+class BitmapIndex:
+    """
+    One packed bitmap (8 rows per byte) per distinct value of a column, plus
+    the row count of every value.
+    """
+
+    def __init__(self, series):
+        categorical = series if isinstance(series.dtype, pd.CategoricalDtype) else series.astype('category')
+        codes = categorical.cat.codes.to_numpy()
+        self.n_rows = len(codes)
+        self.bitmaps = {}
+        self.counts = {}
+        for code, value in enumerate(categorical.cat.categories):
+            rows = codes == code
+            self.bitmaps[value] = np.packbits(rows)
+            self.counts[value] = int(np.count_nonzero(rows))
+
+    def __contains__(self, value):
+        return value in self.bitmaps
+
+    def empty(self):
+        return np.zeros((self.n_rows + 7) // 8, dtype=np.uint8)
+
+    def union(self, values):
+        """Returns the bitmap of rows holding any of `values` (bitwise OR)."""
+        bitmaps = [self.bitmaps[value] for value in set(values) if value in self.bitmaps]
+        return np.bitwise_or.reduce(bitmaps) if bitmaps else self.empty()
+
+    def count(self, values):
+        return sum(self.counts.get(value, 0) for value in set(values))
+
+    def covers_all(self, values):
+        """True when `values` includes every value that occurs in the column."""
+        return self.count(values) == self.n_rows
+
+    def mask(self, values):
+        return to_mask(self.union(values), self.n_rows)
+
+
+def intersect(bitmaps):
+    """Returns the bitwise AND of packed bitmaps of equal length."""
+    return np.bitwise_and.reduce(list(bitmaps))
+
+
+def to_mask(bitmap, n_rows):
+    """Unpacks a bitmap into a boolean row mask."""
+    return np.unpackbits(bitmap, count=n_rows).view(bool)
+
+
+class BitmapIndexSet(dict):
+    """Mapping of column name to `BitmapIndex`, built once per dataset version."""
+
+    @classmethod
+    def build(cls, df, columns=BITMAP_INDEX_COLUMNS):
+        return cls({col: BitmapIndex(df[col]) for col in columns if col in df.columns})
+
+    def select(self, frame, column, values):
+        """
+        Returns the rows of `frame` whose `column` holds one of `values`.
+        `frame` must be the indexed frame or a filtered view of it whose row
+        labels are still positions in the indexed frame.
+        """
+        mask = self[column].mask(values)
+        return frame[mask[frame.index.to_numpy()]]
+
+
+class RowGroupIndex:
+    """
+    Row positions of every distinct value of a column: the rows of `value` are
+    `order[offsets[value]:offsets[value] + counts[value]]`, in ascending
+    order. Values whose rows are adjacent in the frame also have a `blocks`
+    entry with their (start, stop) positions.
+    """
+
+    def __init__(self, series):
+        categorical = series if isinstance(series.dtype, pd.CategoricalDtype) else series.astype('category')
+        codes = categorical.cat.codes.to_numpy()
+        self.n_rows = len(codes)
+        self.order = np.argsort(codes, kind='stable')
+        bins = np.bincount(codes[codes >= 0], minlength=len(categorical.cat.categories))
+        starts = np.searchsorted(codes[self.order], np.arange(len(bins)))
+        self.offsets, self.counts, self.blocks = {}, {}, {}
+        for code, value in enumerate(categorical.cat.categories):
+            start, count = int(starts[code]), int(bins[code])
+            if count == 0:
+                continue
+            self.offsets[value], self.counts[value] = start, count
+            first = int(self.order[start])
+            if int(self.order[start + count - 1]) - first == count - 1:
+                self.blocks[value] = (first, first + count)
+
+    def __contains__(self, value):
+        return value in self.offsets
+
+    def rows(self, value):
+        """Returns the ascending row positions holding `value` (empty if absent)."""
+        if value not in self.offsets:
+            return self.order[:0]
+        start = self.offsets[value]
+        return self.order[start:start + self.counts[value]]
+
+    def select(self, frame, values):
+        """
+        Returns the rows of `frame` holding one of `values`, in frame order.
+        `frame` must be the indexed frame or a filtered view of it whose row
+        labels are still ascending positions in the indexed frame; a value
+        stored as one block then costs two binary searches.
+        """
+        labels = frame.index.to_numpy()
+        values = [value for value in dict.fromkeys(values) if value in self.offsets]
+        if len(values) == 1 and values[0] in self.blocks:
+            start, stop = self.blocks[values[0]]
+            return frame.iloc[np.searchsorted(labels, start):np.searchsorted(labels, stop)]
+        wanted = np.sort(np.concatenate([self.rows(value) for value in values])) if values else self.order[:0]
+        positions = np.searchsorted(labels, wanted)
+        found = positions < len(labels)
+        found[found] = labels[positions[found]] == wanted[found]
+        return frame.iloc[positions[found]]
+
+
+class RowGroupIndexSet(dict):
+    """Mapping of column name to `RowGroupIndex`, built once per dataset version."""
+
+    @classmethod
+    def build(cls, df, columns=ROW_GROUP_INDEX_COLUMNS):
+        return cls({col: RowGroupIndex(df[col]) for col in columns if col in df.columns})
+
+
+class DatasetIndex:
+    """All load-time indexes of one dataset version."""
+
+    def __init__(self, ranges, bitmaps, row_groups=None):
+        self.ranges = ranges
+        self.bitmaps = bitmaps
+        self.row_groups = row_groups if row_groups is not None else RowGroupIndexSet()
+
+    @classmethod
+    def build(cls, df):
+        return cls(RangeIndexSet.build(df), BitmapIndexSet.build(df), RowGroupIndexSet.build(df))
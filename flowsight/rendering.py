@@ -0,0 +1,180 @@
+"""
+Rendering policy for large Plotly figures.
+
+Line charts of daily data send every point to the browser, which becomes
+slow to serialize and draw as the history grows. `downsample_line` reduces
+a series to at most `LINE_MAX_POINTS` points with Largest-Triangle-Three-
+Buckets (LTTB): the first and last points are kept, the rest is split into
+equal buckets, and from each bucket the point forming the largest triangle
+with the previously kept point and the next bucket's average is kept. Peaks,
+troughs and the overall shape survive; flat stretches are thinned out.
+
+`render_mode` switches point-heavy traces to WebGL (Scattergl), which draws
+tens of thousands of markers without one SVG node per point.
+
+`box_figure` draws box plots from per-group summaries computed here
+(quartiles, Tukey whiskers and a capped sample of outliers) instead of
+sending every row to the browser for Plotly to summarize, so the payload
+does not grow with the number of rows behind each box.
+"""
+import numpy as np
+import pandas as pd
+
+# Traces with more points than this are drawn with WebGL
+WEBGL_POINT_THRESHOLD = 1000
+
+# Line charts are downsampled to at most this many points
+LINE_MAX_POINTS = 1500
+
+# Outliers drawn per box; beyond this an evenly spaced selection (by value) is drawn
+BOX_MAX_OUTLIERS = 100
+
+# Whiskers reach the furthest value within this many IQRs of the box, as in Plotly
+WHISKER_IQR = 1.5
+
+
+def render_mode(n_points, threshold=WEBGL_POINT_THRESHOLD):
+    """Returns the Plotly Express `render_mode` for a figure of `n_points`."""
+    return 'webgl' if n_points > threshold else 'svg'
+
+
+def lttb(x, y, n_out):
+    """
+    Returns the positions of the points LTTB keeps from the series (x, y)
+    (x ascending, no NaN), in ascending order. All positions are returned
+    when the series has at most `n_out` points.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # Bucket b (of n_out - 2) covers positions edges[b]:edges[b + 1]; the
+    # first and last points are buckets of their own
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    cum_x = np.concatenate([[0.0], np.cumsum(x)])
+    cum_y = np.concatenate([[0.0], np.cumsum(y)])
+
+    keep = np.empty(n_out, dtype=np.intp)
+    keep[0], keep[-1] = 0, n - 1
+    previous = 0
+    for b in range(n_out - 2):
+        start, stop = edges[b], edges[b + 1]
+        if b + 2 < len(edges):
+            next_start, next_stop = edges[b + 1], edges[b + 2]
+            avg_x = (cum_x[next_stop] - cum_x[next_start]) / (next_stop - next_start)
+            avg_y = (cum_y[next_stop] - cum_y[next_start]) / (next_stop - next_start)
+        else:
+            avg_x, avg_y = x[n - 1], y[n - 1]
+        ax, ay = x[previous], y[previous]
+        # Twice the triangle area; the constant factor does not change the argmax
+        area = np.abs((ax - avg_x) * (y[start:stop] - ay) - (ax - x[start:stop]) * (avg_y - ay))
+        previous = start + int(np.argmax(area))
+        keep[b + 1] = previous
+    return keep
+
+
+def downsample_line(frame, x, y, max_points=LINE_MAX_POINTS):
+    """
+    Returns `frame` (sorted by `x`) reduced to at most `max_points` rows with
+    LTTB on (x, y), and the number of plottable rows before reduction. Rows
+    where `y` is missing are dropped first. Datetime x values are compared as
+    nanosecond timestamps.
+    """
+    frame = frame[frame[y].notna()]
+    total = len(frame)
+    if total <= max_points:
+        return frame, total
+    x_values = frame[x].to_numpy()
+    if np.issubdtype(x_values.dtype, np.datetime64):
+        x_values = x_values.astype('datetime64[ns]').astype(np.int64)
+    return frame.iloc[lttb(x_values, frame[y].to_numpy(), max_points)], total
+
+
+def note_downsampling(fig, shown, total, font_color):
+    """Adds a corner note to `fig` when it shows fewer points than the data holds."""
+    if shown < total:
+        fig.add_annotation(
+            text=f"Showing {shown:,} of {total:,} points (shape-preserving downsampling)",
+            xref='paper', yref='paper', x=1, y=1.02, xanchor='right', yanchor='bottom',
+            showarrow=False, font=dict(size=11, color=font_color)
+        )
+    return fig
+
+
+def box_summary(frame, x, y, max_outliers=BOX_MAX_OUTLIERS):
+    """
+    Summarizes `y` per value of `x` (in order of first appearance) for a box
+    plot: the count, exact quartiles (linear interpolation, as Plotly
+    computes them), the Tukey whisker ends and the outliers. Each group's
+    'outliers' holds at most `max_outliers` values, evenly spaced through
+    the sorted outliers so the extremes are always kept; 'n_outliers' counts
+    all of them. Rows where `y` is missing are ignored.
+    """
+    frame = frame[frame[y].notna()]
+    codes, groups = pd.factorize(frame[x], sort=False)
+    values = frame[y].to_numpy(dtype=np.float64)
+    order = np.lexsort((values, codes)) # by group, then by value
+    bounds = np.searchsorted(codes[order], np.arange(len(groups) + 1))
+    rows = []
+    for position, group in enumerate(groups):
+        group_values = values[order[bounds[position]:bounds[position + 1]]] # sorted
+        q1, median, q3 = np.quantile(group_values, [0.25, 0.5, 0.75])
+        reach = WHISKER_IQR * (q3 - q1)
+        inside = group_values[(group_values >= q1 - reach) & (group_values <= q3 + reach)]
+        outliers = group_values[(group_values < q1 - reach) | (group_values > q3 + reach)]
+        if len(outliers) > max_outliers:
+            outliers = outliers[np.linspace(0, len(outliers) - 1, max_outliers).round().astype(np.intp)]
+        rows.append({
+            x: group, 'count': len(group_values), 'q1': q1, 'median': median, 'q3': q3,
+            'lowerfence': inside[0], 'upperfence': inside[-1],
+            'n_outliers': int(np.count_nonzero((group_values < q1 - reach) | (group_values > q3 + reach))),
+            'outliers': outliers,
+        })
+    return pd.DataFrame(rows, columns=[x, 'count', 'q1', 'median', 'q3', 'lowerfence', 'upperfence', 'n_outliers', 'outliers'])
+
+
+def box_figure(frame, x, y, title=None, labels=None, template=None, height=None, color=None,
+               color_discrete_sequence=None, color_discrete_map=None, category_orders=None):
+    """
+    Box plot of `y` by `x` built from `box_summary`, with the arguments of
+    `plotly.express.box` that the assistant uses. With `color` (which must be
+    `x` or None) every box is its own trace and legend entry, as in px.box.
+    """
+    import plotly.express as px
+    import plotly.graph_objects as go
+
+    labels = labels or {}
+    summary = box_summary(frame, x, y)
+    if category_orders and x in category_orders:
+        rank = {value: i for i, value in enumerate(category_orders[x])}
+        summary = summary.sort_values(x, key=lambda column: column.map(lambda value: rank.get(value, len(rank))), kind='stable')
+    palette = color_discrete_sequence or px.colors.qualitative.Plotly
+
+    fig = go.Figure()
+    for i, box in enumerate(summary.itertuples(index=False)):
+        group = box[0]
+        if color is None:
+            trace_color = palette[0]
+        elif color_discrete_map and group in color_discrete_map:
+            trace_color = color_discrete_map[group]
+        else:
+            trace_color = palette[i % len(palette)]
+        name = str(group)
+        fig.add_trace(go.Box(
+            x=[group], q1=[box.q1], median=[box.median], q3=[box.q3],
+            lowerfence=[box.lowerfence], upperfence=[box.upperfence],
+            name=name, legendgroup=name, showlegend=color is not None,
+            marker_color=trace_color, boxpoints=False,
+        ))
+        if len(box.outliers):
+            fig.add_trace(go.Scatter(
+                x=[group] * len(box.outliers), y=box.outliers, mode='markers',
+                name=name, legendgroup=name, showlegend=False, marker_color=trace_color,
+                hovertemplate=f"{name}: %{{y}}<extra>{box.n_outliers:,} outliers</extra>",
+            ))
+    fig.update_layout(
+        title=title, template=template, height=height, legend_title_text=labels.get(color, color) if color else None,
+        xaxis_title=labels.get(x, x), yaxis_title=labels.get(y, y), boxmode='overlay',
+    )
+    return fig
@@ -0,0 +1,337 @@
+"""
+Intent router for the "Ask me anything" assistant.
+
+`plot_and_answer` used to pick an analysis with a long if/elif chain of
+substring tests, and every branch rebuilt its own keyword dictionary. Here
+every keyword the chain tests is compiled once into an Aho-Corasick
+automaton. A single scan of the query finds all keywords (and city names)
+at once. The intent rules and column extraction then only look those
+matches up, so routing cost does not grow with the number of intents.
+
+Rules are evaluated in the order of the old chain and test keyword presence
+exactly as `keyword in query_lower` did, so every query keeps its analysis.
+"""
+from collections import deque
+from dataclasses import dataclass, field
+
+# ---------------------------------------------------------------------------
+# Keyword maps shared by the analyses (keyword -> column); the first keyword
+# found in dictionary order wins, as in the original branches.
+# ---------------------------------------------------------------------------
+TREND_METRICS = {
+    "congestion": "congestion_index", "aqi": "AQI_mean", "speed": "SPEED",
+    "temperature": "tavg", "precipitation": "prcp", "wind speed": "wspd",
+    "public transport trips": "TOTAL PUBLIC TRANSPORT TRIP", "traffic volume": "TRAFFIC_VOLUME"
+}
+RANK_METRICS = {
+    "congestion": "congestion_index", "aqi": "AQI_mean", "speed": "SPEED",
+    "temperature": "tavg", "precipitation": "prcp", "wind speed": "wspd",
+    "public transport trips": "TOTAL PUBLIC TRANSPORT TRIP", "population density": "POPULATION DENSITY",
+    "traffic volume": "TRAFFIC_VOLUME"
+}
+SCATTER_COLUMNS = {
+    "congestion": "congestion_index", "aqi": "AQI_mean", "speed": "SPEED",
+    "temperature": "tavg", "precipitation": "prcp", "wind speed": "wspd", "wind": "wspd",
+    "public transport trips": "TOTAL PUBLIC TRANSPORT TRIP", "public transport": "TOTAL PUBLIC TRANSPORT TRIP",
+    "population density": "POPULATION DENSITY", "population": "POPULATION DENSITY",
+    "traffic volume": "TRAFFIC_VOLUME", "volume": "TRAFFIC_VOLUME"
+}
+IMPACT_FACTORS = {
+    "precipitation": "prcp", "aqi": "AQI_mean", "wind": "wspd",
+    "temperature": "tavg", "population density": "POPULATION DENSITY",
+    "public transport trips": "TOTAL PUBLIC TRANSPORT TRIP"
+}
+# Looked up by the exact text around " by " / " with ", not by keyword search
+BOXPLOT_COLUMNS = {
+    "speed": "SPEED", "congestion": "congestion_index", "aqi": "AQI_mean",
+    "temperature": "tavg", "precipitation": "prcp", "management": "MANAGEMENT_TYPE",
+    "management type": "MANAGEMENT_TYPE", "city": "CITY", "road": "road_type", "road type": "road_type"
+}
+CORRELATION_COLUMNS = {
+    "wind speed": "wspd", "wind": "wspd", "congestion": "congestion_index",
+    "aqi": "AQI_mean", "temperature": "tavg", "precipitation": "prcp",
+    "population density": "POPULATION DENSITY", "public transport trips": "TOTAL PUBLIC TRANSPORT TRIP",
+    "traffic volume": "TRAFFIC_VOLUME", "speed": "SPEED"
+}
+# "... on speed" / "... on traffic volume" switch the target of impact questions
+TARGETS = {"on speed": "SPEED", "on traffic volume": "TRAFFIC_VOLUME"}
+
+SCATTER_TERMS = ('congestion', 'temperature', 'precipitation', 'wind', 'population', 'aqi', 'public transport', 'speed', 'volume')
+MANAGEMENT_TERMS = ('ai', 'conventional', 'management')
+
+# Other names users give the dataset's cities (lowercase alias -> CITY value);
+# aliases of cities missing from the dataset are ignored
+CITY_ALIASES = {
+    "nyc": "NEW YORK CITY", "new york": "NEW YORK CITY",
+    "bengaluru": "BANGALORE",
+}
+
+# ---------------------------------------------------------------------------
+# Intent rules, in the order of the original if/elif chain. A rule matches
+# when any of its alternatives matches; an alternative is a list of keyword
+# groups that must all be present, where a group matches if any of its
+# keywords occurs in the query.
+# ---------------------------------------------------------------------------
+INTENT_RULES = [
+    ('trend', [[('trend', 'over time')]]),
+    ('scatter', [[('scatter', 'relationship')], [('vs',), SCATTER_TERMS]]),
+    ('city_aqi_congestion_correlation', [[('correlation between aqi and congestion in',)]]),
+    ('compare_speed', [[('compare speed in',), ('and',)]]),
+    ('speed_by_management_distribution', [[('distribution of speed by management type',)]]),
+    ('congestion_by_road_type_distribution', [[('distribution of congestion by road type',)]]),
+    ('boxplot', [[('boxplot', 'distribution'), ('by',)]]),
+    ('ranking', [[('rank',)]]),
+    ('impact', [[('most affected by', 'impact of')]]),
+    ('compare_cities', [[('compare',), ('and',)]]),
+    ('speed_by_management', [[('speed',), MANAGEMENT_TERMS]]),
+    ('congestion_by_management', [[('congestion',), MANAGEMENT_TERMS]]),
+    ('correlation', [[('correlated', 'correlation'), ('with',)]]),
+    ('temperature_impact', [[('temperature',), ('effect', 'impact'), ('congestion',)]]),
+    ('strongest_factor', [[('strongest factor',)], [('strongest',), ('effect',)]]),
+    ('heatmap', [[('heatmap', 'correlation matrix')]]),
+    ('multivariable_scatter', [[('volume', 'traffic volume'), ('aqi', 'congestion'), ('by management', 'by city')]]),
+    ('season', [[('season', 'seasonal')]]),
+    ('holiday', [[('holiday',)]]),
+]
+
+# Other keywords the analyses test once an intent is chosen
+EXTRA_KEYWORDS = (
+    'worst', 'highest', 'best', 'lowest',
+    'congestion by season', 'seasonal congestion', 'congestion in seasons',
+)
+
+# The prompt guide shown in the sidebar, with the intent each prompt must reach
+SAMPLE_PROMPTS = {
+    "Show congestion trend in LONDON": 'trend',
+    "What is the correlation between AQI and congestion in PARIS?": 'city_aqi_congestion_correlation',
+    "Compare speed in BARCELONA and NEW YORK CITY": 'compare_speed',
+    "Rank cities by public transport trips": 'ranking',
+    "Show distribution of speed by management type": 'speed_by_management_distribution',
+    "Show distribution of congestion by road type": 'congestion_by_road_type_distribution',
+    "What is the strongest factor affecting congestion?": 'strongest_factor',
+    "Show correlation heatmap": 'heatmap',
+    "Is congestion affected by holidays?": 'holiday',
+    "Compare congestion by AI vs conventional methods": 'scatter',
+}
+
+
+def normalize_query(query):
+    """
+    Returns the query lowercased, trimmed and with runs of whitespace
+    collapsed, so trivially different spellings of a question share one
+    cached answer.
+    """
+    return " ".join(str(query).lower().split())
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton reporting every occurrence of a fixed keyword set."""
+
+    def __init__(self, keywords):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for keyword in dict.fromkeys(keywords):
+            state = 0
+            for char in keyword:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._output[state].append(keyword)
+
+        # Breadth-first pass linking every state to its longest proper suffix state;
+        # states one character deep keep the root as their suffix state
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def scan(self, text):
+        """Returns (start, keyword) for every keyword occurrence in `text`."""
+        goto, fail, output = self._goto, self._fail, self._output
+        matches = []
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for keyword in output[state]:
+                matches.append((end - len(keyword), keyword))
+        return matches
+
+
+@dataclass
+class Route:
+    """
+    The analysis chosen for a query and the parameters read from it.
+    `keywords` holds every keyword found in the query; `cities` the cities
+    mentioned as whole words (by name or alias), in order of appearance.
+    """
+    intent: object
+    keywords: frozenset
+    metric: object = None
+    target: object = None
+    columns: list = field(default_factory=list)
+    group_by: object = None
+    cities: list = field(default_factory=list)
+
+    def __contains__(self, keyword):
+        return keyword in self.keywords
+
+
+def first_match(keywords, mapping):
+    """Returns the column of the first key of `mapping` found in `keywords`."""
+    return next((col for key, col in mapping.items() if key in keywords), None)
+
+
+def split_pair(query_lower, separator, first_prefixes, second_words, mapping):
+    """
+    Reads two columns from "<first> <separator> <second>" queries, as the
+    boxplot and correlation analyses do. Returns None unless the separator
+    occurs exactly once.
+    """
+    parts = query_lower.split(separator)
+    if len(parts) != 2:
+        return None
+    first, second = parts
+    for prefix in first_prefixes:
+        first = first.replace(prefix, "")
+    for word in second_words:
+        second = second.replace(word, "")
+    return [mapping.get(first.strip()), mapping.get(second.strip())]
+
+
+class IntentRouter:
+    """
+    Routes queries to analyses. `cities` are the city names to recognize,
+    along with their `aliases`; they are compiled into the same automaton as
+    the intent keywords.
+    """
+
+    def __init__(self, cities=(), aliases=CITY_ALIASES):
+        self.cities = {str(city).lower(): city for city in cities}
+        known = set(self.cities.values())
+        for alias, city in aliases.items():
+            if city in known:
+                self.cities.setdefault(alias.lower(), city)
+        keywords = [kw for _, rule in INTENT_RULES for alternative in rule for group in alternative for kw in group]
+        for mapping in (TREND_METRICS, RANK_METRICS, SCATTER_COLUMNS, IMPACT_FACTORS, TARGETS):
+            keywords.extend(mapping)
+        keywords.extend(EXTRA_KEYWORDS)
+        keywords.extend(self.cities)
+        self.automaton = KeywordAutomaton(keywords)
+        # Keyword groups as sets, so each group is one set-intersection test, and
+        # for every keyword the rules it appears in: only rules with at least one
+        # keyword in the query are evaluated
+        self._rules = [
+            (name, [[frozenset(group) for group in alternative] for alternative in rule])
+            for name, rule in INTENT_RULES
+        ]
+        self._keyword_rules = {}
+        for position, (_, rule) in enumerate(INTENT_RULES):
+            for alternative in rule:
+                for group in alternative:
+                    for kw in group:
+                        self._keyword_rules.setdefault(kw, set()).add(position)
+
+    def route(self, query):
+        query_lower = query.lower()
+        matches = self.automaton.scan(query_lower)
+        found = frozenset(keyword for _, keyword in matches)
+        route = Route(self._intent(found), found)
+        if self.cities and not found.isdisjoint(self.cities):
+            route.cities = self._cities(query_lower, matches)
+        self._extract(route, query_lower)
+        return route
+
+    def _intent(self, found):
+        candidates = set()
+        for kw in found:
+            candidates.update(self._keyword_rules.get(kw, ()))
+        for position in sorted(candidates):
+            name, alternatives = self._rules[position]
+            for groups in alternatives:
+                if all(not found.isdisjoint(group) for group in groups):
+                    return name
+        return None
+
+    def _cities(self, query_lower, matches):
+        """Whole-word city mentions; at a shared start the longest name or alias wins."""
+        mentions = sorted((start, -len(kw), kw) for start, kw in matches if kw in self.cities)
+        cities, covered_until = [], 0
+        for start, negative_length, kw in mentions:
+            end = start - negative_length
+            if start < covered_until:
+                continue
+            before = query_lower[start - 1] if start > 0 else ' '
+            after = query_lower[end] if end < len(query_lower) else ' '
+            if before.isalnum() or before == '_' or after.isalnum() or after == '_':
+                continue
+            covered_until = end
+            if self.cities[kw] not in cities:
+                cities.append(self.cities[kw])
+        return cities
+
+    @staticmethod
+    def _extract(route, query_lower):
+        found, intent = route.keywords, route.intent
+        if intent == 'trend':
+            route.metric = first_match(found, TREND_METRICS)
+        elif intent == 'scatter':
+            route.columns = [col for term, col in SCATTER_COLUMNS.items() if term in found]
+        elif intent == 'city_aqi_congestion_correlation':
+            route.columns = ['AQI_mean', 'congestion_index']
+        elif intent in ('compare_speed', 'speed_by_management', 'speed_by_management_distribution'):
+            route.metric = 'SPEED'
+            route.group_by = 'CITY' if intent == 'compare_speed' else 'MANAGEMENT_TYPE'
+        elif intent == 'congestion_by_road_type_distribution':
+            route.metric, route.group_by = 'congestion_index', 'road_type'
+        elif intent == 'boxplot':
+            route.columns = split_pair(query_lower, " by ", ("show", "distribution"), ("type",), BOXPLOT_COLUMNS)
+            if route.columns is not None:
+                route.metric, route.group_by = route.columns
+        elif intent == 'ranking':
+            route.metric = first_match(found, RANK_METRICS)
+            route.group_by = 'CITY'
+        elif intent == 'impact':
+            route.metric = first_match(found, IMPACT_FACTORS)
+            route.target = first_match(found, TARGETS) or 'congestion_index'
+            route.group_by = 'CITY'
+        elif intent == 'compare_cities':
+            route.metric = first_match(found, RANK_METRICS) or 'congestion_index'
+            route.group_by = 'CITY'
+        elif intent == 'congestion_by_management':
+            route.metric, route.group_by = 'congestion_index', 'MANAGEMENT_TYPE'
+        elif intent == 'correlation':
+            route.columns = split_pair(query_lower, " with ", ("what is the correlation between",), (), CORRELATION_COLUMNS)
+        elif intent == 'temperature_impact':
+            route.metric, route.target, route.group_by = 'tavg', 'congestion_index', 'CITY'
+        elif intent == 'strongest_factor':
+            route.target = first_match(found, TARGETS) or 'congestion_index'
+        elif intent == 'multivariable_scatter':
+            x_col = "AQI_mean" if "aqi" in found else "congestion_index"
+            y_col = "TRAFFIC_VOLUME" # the rule already requires a volume keyword
+            route.columns = [x_col, y_col]
+            route.group_by = "MANAGEMENT_TYPE" if "by management" in found else "CITY"
+        elif intent == 'season':
+            route.metric, route.group_by = 'congestion_index', 'season'
+        elif intent == 'holiday':
+            route.metric, route.group_by = 'congestion_index', 'Holiday_Flag'
+
+
+# Router without city names, compiled once at import
+ROUTER = IntentRouter()
+
+
+def route(query):
+    """Routes `query` with the module-level router (no city recognition)."""
+    return ROUTER.route(query)
@@ -0,0 +1,86 @@
+"""
+Declared column types for the city traffic dataset.
+
+Every session filters its own copy of the data, so the per-row footprint
+limits how many users one process can serve. The schema below stores the
+low-cardinality text columns as categoricals, the metrics as float32 and the
+small integer codes as narrow ints. Float32 keeps about seven significant
+digits, which is more than any of the source measurements carry.
+"""
+import pandas as pd
+
+CITY_SCHEMA = {
+    'CITY': 'category',
+    'CITY AREA (PER KMSQ)': 'float32',
+    'date': 'datetime64[ns]',
+    'MANAGEMENT_TYPE': 'category',
+    'TRAFFIC_VOLUME': 'float32',
+    'SPEED': 'float32',
+    'METRO TRIPS': 'float32',
+    'BUS TRIPS': 'float32',
+    'TOTAL PUBLIC TRANSPORT TRIP': 'float32',
+    'AQI_mean': 'float32',
+    'tavg': 'float32',
+    'tmin': 'float32',
+    'tmax': 'float32',
+    'prcp': 'float32',
+    'snow': 'float32',
+    'wdir': 'float32',
+    'wspd': 'float32',
+    'wpgt': 'float32',
+    'pres': 'float32',
+    'tsun': 'int32',
+    'POPULATION DENSITY': 'float32',
+    'Day_of_Week': 'int8',
+    'Holiday_Flag': 'bool',
+    'Season': 'category',
+    'congestion_index': 'float32',
+}
+
+
+class SchemaError(ValueError):
+    """Raised when a loaded frame does not match its declared schema."""
+
+
+def apply_schema(df, schema=CITY_SCHEMA):
+    """
+    Casts the columns present in `df` to their declared types.
+    Integer columns that contain missing values are stored as float32
+    instead, since NumPy integers cannot represent NaN.
+    """
+    conversions = {}
+    for col, dtype in schema.items():
+        if col not in df.columns:
+            continue
+        if dtype.startswith('int') and df[col].isna().any():
+            dtype = 'float32'
+        conversions[col] = dtype
+    return df.astype(conversions)
+
+
+def check_schema(df, schema=CITY_SCHEMA):
+    """
+    Verifies that every declared column present in `df` has its declared type.
+    Missing columns are not reported here; callers check for the columns they need.
+    """
+    mismatches = []
+    for col, dtype in schema.items():
+        if col not in df.columns:
+            continue
+        actual = df[col].dtype
+        if dtype == 'category':
+            ok = isinstance(actual, pd.CategoricalDtype)
+        elif dtype.startswith('int'):
+            # apply_schema stores integer columns with missing values as float32
+            ok = actual == dtype or actual == 'float32'
+        else:
+            ok = actual == dtype
+        if not ok:
+            mismatches.append(f"'{col}' is {actual}, expected {dtype}")
+    if mismatches:
+        raise SchemaError(f"Schema check failed: {'; '.join(mismatches)}.")
+
+
+def memory_usage_bytes(df):
+    """Returns the deep memory footprint of a DataFrame in bytes."""
+    return int(df.memory_usage(deep=True).sum())
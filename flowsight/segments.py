@@ -0,0 +1,191 @@
+"""
+Segment x month congestion matrix of a city road network.
+
+The city layers (`flowsight.geostore`) carry one congestion column per month
+("2023-06", ...) next to each road segment. `SegmentMatrix.build` pulls
+those columns into one float32 matrix (segments x months, months ascending)
+with an index from segment id to row, so per-month rankings, each segment's
+worst month and month-over-month changes are array operations instead of
+manual Kepler configuration.
+
+Top-N queries select with `np.argpartition` (linear time) and only sort the
+N selected values. Missing values never rank.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+# Wide monthly attribute columns of the city layers
+MONTH_COLUMN_PATTERN = re.compile(r"^\d{4}-\d{2}$")
+
+# Segment id columns, most specific first; without one the row position is the id
+SEGMENT_ID_COLUMNS = ('segment_id', 'C_Tram', 'osmid', 'id')
+
+TOP_N_DEFAULT = 50
+
+
+def month_columns(frame):
+    """Returns the monthly attribute columns of a layer frame, ascending."""
+    return sorted(col for col in frame.columns if isinstance(col, str) and MONTH_COLUMN_PATTERN.match(col))
+
+
+def previous_month(month):
+    """Returns the calendar month before a 'YYYY-MM' label: '2023-01' -> '2022-12'."""
+    year, number = int(month[:4]), int(month[5:7])
+    return f"{year - 1:04d}-12" if number == 1 else f"{year:04d}-{number - 1:02d}"
+
+
+def top_positions(values, n, largest=True):
+    """
+    Returns the positions of the `n` largest (or smallest) values, best
+    first, ignoring NaN. Uses `np.argpartition`, so only the `n` selected
+    values are sorted.
+    """
+    valid = np.flatnonzero(~np.isnan(values))
+    n = min(n, len(valid))
+    if n == 0:
+        return valid[:0]
+    keys = -values[valid] if largest else values[valid]
+    chosen = np.argpartition(keys, n - 1)[:n] if n < len(valid) else np.arange(len(valid))
+    return valid[chosen[np.argsort(keys[chosen], kind='stable')]]
+
+
+class SegmentMatrix:
+    """
+    Monthly congestion per segment: `values[row, j]` is segment
+    `segment_ids[row]` in month `months[j]` (float32, NaN when missing).
+    """
+
+    def __init__(self, segment_ids, months, values, id_column=None):
+        self.segment_ids = np.asarray(segment_ids)
+        self.months = list(months)
+        self.values = values
+        self.id_column = id_column
+        self.index = pd.Index(self.segment_ids) # segment id -> row
+        self._month_positions = {month: j for j, month in enumerate(self.months)}
+
+    def __len__(self):
+        return len(self.segment_ids)
+
+    @classmethod
+    def build(cls, frame, id_column=None):
+        """Builds the matrix from a layer frame; `id_column` defaults to the first of `SEGMENT_ID_COLUMNS` present."""
+        if id_column is None:
+            id_column = next((col for col in SEGMENT_ID_COLUMNS if col in frame.columns), None)
+        months = month_columns(frame)
+        values = frame[months].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float32) if months \
+            else np.empty((len(frame), 0), dtype=np.float32)
+        segment_ids = frame[id_column].to_numpy() if id_column else np.arange(len(frame))
+        return cls(segment_ids, months, values, id_column)
+
+    def month(self, month):
+        """Returns the values of all segments in `month` (a view)."""
+        if month not in self._month_positions:
+            raise KeyError(f"No congestion column for month '{month}'. Available: {self.months[0]} to {self.months[-1]}." if self.months
+                           else "The layer has no monthly congestion columns.")
+        return self.values[:, self._month_positions[month]]
+
+    def rows(self, segment_ids):
+        """Returns the rows of `segment_ids` (-1 for unknown ids)."""
+        return self.index.get_indexer(segment_ids)
+
+    def deltas(self, month):
+        """
+        Returns the change of every segment from the calendar month before
+        `month` to `month`, all NaN when the layer has no column for the
+        previous month (the first month, or a gap in the months):
+
+        >>> matrix = SegmentMatrix(['a'], ['2023-03', '2023-06', '2023-07'], np.array([[1, 5, 6]], dtype=np.float32))
+        >>> matrix.deltas('2023-06'), matrix.deltas('2023-07')
+        (array([nan], dtype=float32), array([1.], dtype=float32))
+        """
+        current = self.month(month) # raises for an unknown month
+        previous = self._month_positions.get(previous_month(month))
+        if previous is None:
+            return np.full(len(self), np.nan, dtype=np.float32)
+        return current - self.values[:, previous]
+
+    def worst_months(self, rows=None):
+        """
+        Returns each segment's most congested month and its value (for `rows`,
+        all segments by default); segments without values get None and NaN.
+        """
+        values = self.values if rows is None else self.values[rows]
+        if not values.shape[1]:
+            return np.full(len(values), None, dtype=object), np.full(len(values), np.nan, dtype=np.float32)
+        has_value = ~np.isnan(values).all(axis=1)
+        positions = np.argmax(np.where(np.isnan(values), -np.inf, values), axis=1)
+        months = np.array(self.months, dtype=object)[positions]
+        months[~has_value] = None
+        worst = values[np.arange(len(values)), positions]
+        return months, np.where(has_value, worst, np.nan)
+
+    def top(self, month, n=TOP_N_DEFAULT, by='value', largest=True):
+        """
+        Returns the top `n` segments of `month` as a DataFrame (rank, segment
+        id, row, value, change from the previous month, worst month and its
+        value). `by='value'` ranks by congestion, `by='delta'` by the change
+        from the calendar month before (see `deltas`); `largest=False` ranks
+        from the bottom.
+        """
+        value = self.month(month)
+        delta = self.deltas(month)
+        rows = top_positions(delta if by == 'delta' else value, n, largest)
+        worst_month, worst_value = self.worst_months(rows)
+        return pd.DataFrame({
+            'rank': np.arange(1, len(rows) + 1),
+            'segment_id': self.segment_ids[rows],
+            'row': rows,
+            'value': value[rows],
+            'change': delta[rows],
+            'worst_month': worst_month,
+            'worst_value': worst_value,
+        })
+
+
+def highlight_figure(layer, top, month, template=None, height=600, font_color=None):
+    """
+    Map of the segments of a `top` table (from `SegmentMatrix.top`) over the
+    city: their geometry as lines and their centroids as markers colored by
+    the month's value, with the rank, id and values on hover. `layer` is the
+    `flowsight.geostore.CityLayer` the matrix was built from.
+    """
+    import plotly.graph_objects as go
+    import shapely
+
+    rows = top['row'].to_numpy()
+    geometries = layer.frame.geometry.to_numpy()[rows]
+    # All highlighted lines as one trace, separated by None
+    lon, lat = [], []
+    for geometry in geometries:
+        for part in shapely.get_parts(geometry):
+            if shapely.get_type_id(part) in (1, 2):
+                coords = shapely.get_coordinates(part)
+            elif shapely.get_type_id(part) == 3:
+                coords = shapely.get_coordinates(part.exterior)
+            else:
+                continue
+            lon.extend(coords[:, 0].tolist() + [None])
+            lat.extend(coords[:, 1].tolist() + [None])
+
+    fig = go.Figure()
+    fig.add_trace(go.Scattermap(
+        lon=lon, lat=lat, mode='lines', line=dict(width=4, color='#FFA726'),
+        hoverinfo='skip', name='Segments'
+    ))
+    fig.add_trace(go.Scattermap(
+        lon=layer.centroid_x[rows], lat=layer.centroid_y[rows], mode='markers',
+        marker=dict(size=9, color=top['value'], colorscale='YlOrRd', showscale=True, colorbar=dict(title=month)),
+        customdata=top[['rank', 'segment_id', 'change', 'worst_month']].astype({'segment_id': str, 'worst_month': str}).to_numpy(dtype=object),
+        hovertemplate="#%{customdata[0]} segment %{customdata[1]}<br>" + month +
+                      ": %{marker.color:.2f}<br>change: %{customdata[2]:+.2f}<br>worst month: %{customdata[3]}<extra></extra>",
+        name='Top segments'
+    ))
+    lat0, lon0 = layer.center
+    fig.update_layout(
+        template=template, height=height, showlegend=False, margin=dict(l=0, r=0, t=0, b=0),
+        map=dict(style='carto-darkmatter' if template == 'plotly_dark' else 'carto-positron', center=dict(lat=lat0, lon=lon0), zoom=11),
+        paper_bgcolor='rgba(0,0,0,0)', font=dict(color=font_color) if font_color else None,
+    )
+    return fig
@@ -0,0 +1,198 @@
+"""
+Materialized cube of sufficient statistics over the city traffic data.
+
+Most assistant answers are group means and Pearson correlations, and both
+can be computed from a handful of running sums. `MomentCube.build` makes one
+pass over the rows and stores, for every (CITY, year_month, MANAGEMENT_TYPE,
+Season, Holiday_Flag) cell and every pair of measures (a, b), the number of
+rows where both are present together with the sums, sums of squares and the
+cross-product over those rows. Summing cells then gives the same
+pairwise-complete means, variances and correlations that pandas computes
+from the raw rows, for any filter on the cube dimensions.
+
+The cube cannot see the numeric range filters; callers only use it when
+those filters exclude no rows.
+"""
+import numpy as np
+
+from flowsight import derived
+
+# Dimensions of a cube cell; 'year_month' is a derived column (flowsight.derived)
+CUBE_DIMENSIONS = ['CITY', 'year_month', 'MANAGEMENT_TYPE', 'Season', 'Holiday_Flag']
+
+# Numeric columns the assistant ranks, compares and correlates
+CUBE_MEASURES = [
+    'congestion_index', 'AQI_mean', 'SPEED', 'tavg', 'prcp', 'wspd',
+    'TOTAL PUBLIC TRANSPORT TRIP', 'POPULATION DENSITY', 'TRAFFIC_VOLUME',
+]
+
+# Rows per chunk when accumulating the per-row outer products
+BUILD_CHUNK_ROWS = 16384
+
+# A variance below this fraction of the mean square is treated as zero
+VARIANCE_TOLERANCE = 1e-10
+
+
+def pearson(n, s_a, s_b, q_a, q_b, c):
+    """
+    Pearson correlation from sums over the rows where both columns are present:
+    the row count, the sums and sums of squares of each column and the sum of
+    their products. NaN for fewer than two rows or a constant column.
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        var_a = q_a - s_a * s_a / n
+        var_b = q_b - s_b * s_b / n
+        cov = c - s_a * s_b / n
+        r = cov / np.sqrt(var_a * var_b)
+    constant = (var_a <= VARIANCE_TOLERANCE * q_a) | (var_b <= VARIANCE_TOLERANCE * q_b)
+    return np.where((n < 2) | constant, np.nan, np.clip(r, -1.0, 1.0))
+
+
+class Moments:
+    """
+    Pairwise-complete moments of the measures over a set of rows, or over
+    several sets at once (a leading group axis).
+    For measures a and b, `n[..., a, b]` counts the rows where both are
+    present, `s[..., a, b]` and `q[..., a, b]` sum a and a**2 over those rows,
+    and `c[..., a, b]` sums a*b.
+    """
+
+    def __init__(self, measures, n, s, q, c):
+        self.measures = list(measures)
+        self._position = {col: i for i, col in enumerate(self.measures)}
+        self.n, self.s, self.q, self.c = n, s, q, c
+
+    def __contains__(self, column):
+        return column in self._position
+
+    def count(self, a, b=None):
+        i = self._position[a]
+        j = i if b is None else self._position[b]
+        return self.n[..., i, j]
+
+    def mean(self, column):
+        i = self._position[column]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.s[..., i, i] / self.n[..., i, i]
+
+    def var(self, column, ddof=1):
+        i = self._position[column]
+        n, s = self.n[..., i, i], self.s[..., i, i]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (self.q[..., i, i] - s * s / n) / (n - ddof)
+
+    def corr(self, a, b):
+        """
+        Pearson correlation of `a` and `b` over the rows where both are present.
+        NaN where fewer than two such rows exist or either column is constant.
+        """
+        return self._corr(self._position[a], self._position[b])
+
+    def corr_matrix(self, rows, columns):
+        """
+        Pearson correlations of every measure in `rows` with every measure in
+        `columns`, as an array of shape (..., len(rows), len(columns)).
+        """
+        i = np.array([self._position[col] for col in rows], dtype=np.intp)[:, None]
+        j = np.array([self._position[col] for col in columns], dtype=np.intp)[None, :]
+        return self._corr(i, j)
+
+    def _corr(self, i, j):
+        return pearson(
+            self.n[..., i, j], self.s[..., i, j], self.s[..., j, i],
+            self.q[..., i, j], self.q[..., j, i], self.c[..., i, j]
+        )
+
+
+class MomentCube:
+    """
+    Sufficient statistics per cube cell. `cells` holds the dimension values of
+    every non-empty cell and `moments` the matching moments (one group per cell).
+    """
+
+    def __init__(self, cells, moments):
+        self.cells = cells
+        self.moments = moments
+
+    def __len__(self):
+        return len(self.cells)
+
+    @property
+    def dimensions(self):
+        return list(self.cells.columns)
+
+    @property
+    def measures(self):
+        return self.moments.measures
+
+    @classmethod
+    def build(cls, df, dimensions=CUBE_DIMENSIONS, measures=CUBE_MEASURES):
+        df = derived.with_derived_columns(df, [dim for dim in dimensions if dim in derived.DERIVED_COLUMNS])
+        dimensions = [dim for dim in dimensions if dim in df.columns]
+        measures = [col for col in measures if col in df.columns]
+        grouper = df[dimensions].groupby(dimensions, observed=True, sort=True, dropna=False)
+        codes = grouper.ngroup().to_numpy()
+        cells = grouper.size().reset_index()[dimensions]
+
+        values = df[measures].to_numpy(dtype=np.float64)
+        order = np.argsort(codes, kind='stable')
+        codes, values = codes[order], values[order]
+
+        k = len(measures)
+        n, s, q, c = (np.zeros((len(cells), k, k)) for _ in range(4))
+        for start in range(0, len(values), BUILD_CHUNK_ROWS):
+            chunk_codes = codes[start:start + BUILD_CHUNK_ROWS]
+            chunk = values[start:start + BUILD_CHUNK_ROWS]
+            valid = ~np.isnan(chunk)
+            x = np.where(valid, chunk, 0.0)
+            v = valid.astype(np.float64)
+            # Rows are sorted by cell, so each cell is one contiguous segment
+            segments = np.flatnonzero(np.r_[True, chunk_codes[1:] != chunk_codes[:-1]])
+            segment_codes = chunk_codes[segments]
+            n[segment_codes] += np.add.reduceat(v[:, :, None] * v[:, None, :], segments)
+            s[segment_codes] += np.add.reduceat(x[:, :, None] * v[:, None, :], segments)
+            q[segment_codes] += np.add.reduceat((x * x)[:, :, None] * v[:, None, :], segments)
+            c[segment_codes] += np.add.reduceat(x[:, :, None] * x[:, None, :], segments)
+        return cls(cells, Moments(measures, n, s, q, c))
+
+    def where(self, selections):
+        """
+        Returns the sub-cube of cells whose dimensions hold one of the selected
+        values. `selections` maps a cube dimension to the values to keep.
+        """
+        keep = np.ones(len(self.cells), dtype=bool)
+        for dim, selected in selections.items():
+            if dim not in self.cells.columns:
+                raise ValueError(f"'{dim}' is not a dimension of the cube.")
+            keep &= self.cells[dim].isin(list(selected)).to_numpy()
+        m = self.moments
+        return MomentCube(
+            self.cells[keep].reset_index(drop=True),
+            Moments(m.measures, m.n[keep], m.s[keep], m.q[keep], m.c[keep])
+        )
+
+    def total(self):
+        """Returns the moments of all rows in the cube."""
+        m = self.moments
+        return Moments(m.measures, m.n.sum(axis=0), m.s.sum(axis=0), m.q.sum(axis=0), m.c.sum(axis=0))
+
+    def rollup(self, by):
+        """
+        Sums the cells per value of the dimension `by`.
+        Returns the group keys (a DataFrame with one column) and their moments.
+        """
+        grouper = self.cells.groupby(by, observed=True, sort=True)
+        codes = grouper.ngroup().to_numpy()
+        keys = grouper.size().reset_index()[[by]]
+        m = self.moments
+        sums = []
+        for moment in (m.n, m.s, m.q, m.c):
+            out = np.zeros((len(keys),) + moment.shape[1:])
+            np.add.at(out, codes, moment)
+            sums.append(out)
+        return keys, Moments(m.measures, *sums)
+
+    def mean_by(self, by, column):
+        """Equivalent to `df.groupby(by, observed=True)[column].mean().reset_index()`."""
+        keys, moments = self.rollup(by)
+        return keys.assign(**{column: moments.mean(column)})
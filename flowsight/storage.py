@@ -0,0 +1,134 @@
+"""
+Columnar on-disk cache for the CSV datasets.
+
+The first time a CSV is loaded it is parsed, passed through a preparation
+step (type conversion, cleaning) and written to an uncompressed Arrow IPC
+file whose name contains a hash of the source file. Later loads memory-map
+that file instead of parsing the CSV again, so start-up time depends on the
+size of the typed columns rather than on CSV parsing.
+"""
+import hashlib
+import json
+import os
+import re
+
+import pandas as pd
+import pyarrow as pa
+
+CACHE_DIR = ".flowsight_cache"
+CACHE_FORMAT_VERSION = "2"
+ATTRS_METADATA_KEY = b"flowsight.attrs"
+
+
+def file_fingerprint(file_path, chunk_size=1 << 20):
+    """
+    Returns the SHA-256 hex digest of a file's contents.
+    The file is read in chunks so large feeds are never held in memory.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_path_for(source_path, fingerprint, tag="", cache_dir=CACHE_DIR):
+    """
+    Builds the cache file path for a source file.
+    The name combines the source stem, the preparation tag, the cache format
+    version and the content hash, so any change to one of them misses the cache.
+    """
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    key = f"{tag}-v{CACHE_FORMAT_VERSION}" if tag else f"v{CACHE_FORMAT_VERSION}"
+    return os.path.join(cache_dir, f"{stem}-{key}-{fingerprint[:16]}.arrow")
+
+
+def remove_stale_caches(source_path, current_path, cache_dir=CACHE_DIR):
+    """
+    Removes the cache files of earlier versions of a source file (other
+    content hashes, tags or cache format versions), keeping `current_path`.
+    Files that cannot be removed (e.g. still mapped by another process on
+    Windows) are reported and left for a later load.
+    """
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    pattern = re.compile(rf"{re.escape(stem)}-(?:[^-]+-)?v[^-]+-[0-9a-f]{{16}}\.arrow")
+    try:
+        names = os.listdir(cache_dir)
+    except OSError:
+        return
+    for name in names:
+        path = os.path.join(cache_dir, name)
+        if pattern.fullmatch(name) and os.path.abspath(path) != os.path.abspath(current_path):
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"DEBUG: Could not remove stale cache '{path}': {e}")
+
+
+def write_arrow(df, path):
+    """
+    Writes a DataFrame to an Arrow IPC file.
+    `df.attrs` (which must be JSON-serializable) is kept in the schema metadata.
+    The file is written to a temporary name first and then renamed, so a
+    concurrent reader never sees a half-written cache.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[ATTRS_METADATA_KEY] = json.dumps(df.attrs).encode()
+    table = table.replace_schema_metadata(metadata)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def read_arrow(path):
+    """
+    Memory-maps an Arrow IPC file and returns it as a DataFrame.
+    `split_blocks` keeps one block per column, which lets pandas reuse the
+    mapped buffers for null-free numeric columns instead of copying them.
+    """
+    with pa.memory_map(path, "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    df = table.to_pandas(split_blocks=True)
+    attrs = (table.schema.metadata or {}).get(ATTRS_METADATA_KEY)
+    if attrs:
+        df.attrs.update(json.loads(attrs))
+    return df
+
+
+def load_cached_csv(file_path, prepare=None, tag="", cache_dir=CACHE_DIR, **read_csv_kwargs):
+    """
+    Loads a CSV through the columnar cache.
+    On a cache miss the CSV is parsed with `pd.read_csv`, passed through
+    `prepare` and stored; on a hit the cached Arrow file is memory-mapped.
+    `df.attrs['dataset_version']` identifies the source file version, so
+    structures derived from the frame can be cached per version. Once the
+    new cache is in place, the caches of earlier versions are removed.
+    Cache write failures (e.g. a read-only deployment) fall back to the
+    freshly parsed frame.
+    """
+    fingerprint = file_fingerprint(file_path)
+    cache_path = cache_path_for(file_path, fingerprint, tag=tag, cache_dir=cache_dir)
+    version = f"{tag}-{fingerprint[:16]}"
+    if os.path.exists(cache_path):
+        try:
+            df = read_arrow(cache_path)
+            df.attrs['dataset_version'] = version
+            return df
+        except (OSError, pa.ArrowInvalid) as e:
+            print(f"DEBUG: Ignoring unreadable cache '{cache_path}': {e}")
+
+    df = pd.read_csv(file_path, **read_csv_kwargs)
+    if prepare is not None:
+        df = prepare(df)
+    df = df.reset_index(drop=True)
+    try:
+        write_arrow(df, cache_path)
+        remove_stale_caches(file_path, cache_path, cache_dir)
+    except (OSError, pa.ArrowException) as e:
+        print(f"DEBUG: Could not write cache '{cache_path}': {e}")
+    df.attrs['dataset_version'] = version
+    return df
@@ -0,0 +1,498 @@
+"""
+Vector tiles for the city road networks.
+
+Embedding a whole road network in the map page does not scale to full
+metropolitan networks. This module cuts a city layer (`flowsight.geostore`)
+into Mapbox Vector Tiles (MVT 2.1) over a zoom pyramid and stores them in
+an MBTiles file (SQLite) in the cache directory, named after the source
+file's content hash. Every feature keeps its attributes, including the
+per-month congestion columns, so a client can color segments by month
+without downloading the network up front.
+
+At each zoom level the geometry is projected to Web Mercator tile units,
+simplified to `TILE_SIMPLIFY_UNITS` (well below a screen pixel), clipped to
+each tile plus a small buffer and quantized to the tile extent. Tiles are
+stored gzip-compressed, as MBTiles readers expect.
+
+`serve` is a small HTTP tile server over the built files:
+
+    python -m flowsight.tiles build             # all cities with a GeoJSON
+    python -m flowsight.tiles serve --port 8765
+
+    http://127.0.0.1:8765/<city>/{z}/{x}/{y}.pbf   tiles (e.g. <city> = new_york_city)
+    http://127.0.0.1:8765/<city>.json              TileJSON metadata
+
+The tiles are for MVT clients (MapLibre, deck.gl's MVTLayer, QGIS). The
+dashboard's Kepler.gl map (keplergl 0.2.2, kepler.gl 2.4) has no vector
+tile layer and keeps embedding the simplified layer instead.
+"""
+import argparse
+import gzip
+import json
+import math
+import os
+import sqlite3
+import struct
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from flowsight import geostore, storage
+
+TILES_FORMAT_VERSION = "1"
+LAYER_NAME = "segments"
+
+# Tile coordinate resolution (the MVT default) and the clip buffer around each tile, in tile units
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+
+# Zoom pyramid stored by default
+MIN_ZOOM = 8
+MAX_ZOOM = 14
+
+# Douglas-Peucker tolerance in tile units at every zoom (4096 units span 256-512 screen pixels)
+TILE_SIMPLIFY_UNITS = 1.0
+
+# Web Mercator is undefined at the poles
+MAX_LATITUDE = 85.0511287798
+
+DEFAULT_PORT = 8765
+
+# MVT geometry types and commands
+GEOM_POINT, GEOM_LINESTRING, GEOM_POLYGON = 1, 2, 3
+CMD_MOVE_TO, CMD_LINE_TO, CMD_CLOSE_PATH = 1, 2, 7
+
+
+def city_slug(city):
+    """URL name of a city: 'NEW YORK CITY' -> 'new_york_city'."""
+    return city.lower().replace(' ', '_')
+
+
+def tiles_path(source_path, fingerprint, cache_dir=storage.CACHE_DIR, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM):
+    """
+    Builds the MBTiles path for a source file and zoom range, as
+    `flowsight.storage.cache_path_for` does, so a build over other zoom
+    levels is never mistaken for this one.
+    """
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    return os.path.join(cache_dir, f"{stem}-tiles-v{TILES_FORMAT_VERSION}-z{min_zoom}_{max_zoom}-{fingerprint[:16]}.mbtiles")
+
+
+def project(lon, lat, zoom):
+    """
+    Projects WGS 84 coordinates to Web Mercator world coordinates at `zoom`,
+    in tile units: tile (x, y) covers [x, x + 1) * TILE_EXTENT horizontally
+    and [y, y + 1) * TILE_EXTENT vertically, y growing southwards.
+    """
+    world = TILE_EXTENT * 2 ** zoom
+    lat = np.radians(np.clip(lat, -MAX_LATITUDE, MAX_LATITUDE))
+    x = (np.asarray(lon) + 180.0) / 360.0 * world
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / math.pi) / 2.0 * world
+    return x, y
+
+
+def tile_range(bounds, zoom):
+    """Returns the (min x, min y, max x, max y) tile indexes covering `bounds` (minx, miny, maxx, maxy) at `zoom`."""
+    x0, y0 = project(bounds[0], bounds[3], zoom) # north-west corner
+    x1, y1 = project(bounds[2], bounds[1], zoom) # south-east corner
+    last = 2 ** zoom - 1
+    return tuple(int(min(max(v // TILE_EXTENT, 0), last)) for v in (x0, y0, x1, y1))
+
+
+# -----------------------------------------------------------------------------
+# MVT encoding (protobuf wire format, written by hand to avoid a dependency)
+# -----------------------------------------------------------------------------
+
+def _varint(value):
+    if value < SMALL_VARINT_LIMIT:
+        return _SMALL_VARINTS[value]
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+# Tags, command integers and small deltas are nearly always below this
+SMALL_VARINT_LIMIT = 1 << 14
+_SMALL_VARINTS = [bytes([v]) if v < 0x80 else bytes([(v & 0x7F) | 0x80, v >> 7]) for v in range(SMALL_VARINT_LIMIT)]
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def _field(number, wire_type):
+    return _varint((number << 3) | wire_type)
+
+
+def _length_delimited(number, payload):
+    return _field(number, 2) + _varint(len(payload)) + payload
+
+
+def _packed(number, values):
+    if max(values, default=0) < 0x80:
+        return _length_delimited(number, bytes(values)) # one byte per value
+    return _length_delimited(number, b''.join(_varint(v) for v in values))
+
+
+def encode_value(value):
+    """Encodes an attribute value as an MVT Value message."""
+    if isinstance(value, (bool, np.bool_)):
+        return _field(7, 0) + _varint(int(value))
+    if isinstance(value, (int, np.integer)):
+        return _field(6, 0) + _varint(_zigzag(int(value)))
+    if isinstance(value, (float, np.floating)):
+        return _field(3, 1) + struct.pack('<d', float(value))
+    return _length_delimited(1, str(value).encode('utf-8'))
+
+
+def _ring_area(coords):
+    """Shoelace area of a closed ring in tile coordinates (positive when clockwise on screen)."""
+    x, y = coords[:, 0], coords[:, 1]
+    return float(np.sum(x[:-1] * y[1:] - x[1:] * y[:-1])) / 2.0
+
+
+def _path_commands(coords, cursor, closed):
+    """
+    Appends MoveTo/LineTo (and ClosePath for rings) commands for a quantized
+    path, with repeated points removed. Returns the commands and the new
+    cursor, or None when fewer than 2 (4 for rings) distinct points remain.
+    """
+    keep = np.ones(len(coords), dtype=bool)
+    keep[1:] = np.any(coords[1:] != coords[:-1], axis=1)
+    coords = coords[keep]
+    if closed:
+        coords = coords[:-1] # ClosePath returns to the start
+    if len(coords) < (3 if closed else 2):
+        return None, cursor
+    deltas = np.diff(np.vstack([cursor, coords]), axis=0)
+    commands = [(CMD_MOVE_TO | (1 << 3)), _zigzag(int(deltas[0, 0])), _zigzag(int(deltas[0, 1])),
+                (CMD_LINE_TO | ((len(coords) - 1) << 3))]
+    commands.extend(_zigzag(int(v)) for v in deltas[1:].ravel())
+    if closed:
+        commands.append(CMD_CLOSE_PATH | (1 << 3))
+    return commands, coords[-1]
+
+
+def encode_geometry(geometry):
+    """
+    Returns the MVT geometry type and command integers of a shapely
+    geometry already in integer tile coordinates, or (None, None) when
+    nothing drawable remains.
+    """
+    import shapely
+
+    kind = shapely.get_type_id(geometry) # 0 point, 1 line, 3 polygon, 4-6 multi-, 7 collection
+    parts = shapely.get_parts(geometry) if kind in (4, 5, 6, 7) else [geometry]
+    cursor = np.zeros(2, dtype=np.int64)
+    commands = []
+    geom_type = None
+    for part in parts:
+        part_kind = shapely.get_type_id(part)
+        if part_kind == 0:
+            geom_type = geom_type or GEOM_POINT
+            if geom_type != GEOM_POINT:
+                continue
+            point = np.asarray(shapely.get_coordinates(part), dtype=np.int64)[0]
+            commands.append((point, cursor))
+            cursor = point
+        elif part_kind in (1, 2):
+            geom_type = geom_type or GEOM_LINESTRING
+            if geom_type != GEOM_LINESTRING:
+                continue
+            path, cursor = _path_commands(np.asarray(shapely.get_coordinates(part), dtype=np.int64), cursor, False)
+            if path:
+                commands.extend(path)
+        elif part_kind == 3:
+            geom_type = geom_type or GEOM_POLYGON
+            if geom_type != GEOM_POLYGON:
+                continue
+            rings = [shapely.get_exterior_ring(part), *part.interiors]
+            for i, ring in enumerate(rings):
+                coords = np.asarray(shapely.get_coordinates(ring), dtype=np.int64)
+                # Exterior rings are clockwise on screen (positive area), holes counter-clockwise
+                if len(coords) and (_ring_area(coords) > 0) != (i == 0):
+                    coords = coords[::-1]
+                path, cursor = _path_commands(coords, cursor, True)
+                if path:
+                    commands.extend(path)
+                elif i == 0:
+                    break # a collapsed exterior ring drops its holes too
+    if geom_type == GEOM_POINT:
+        points = commands
+        if not points:
+            return None, None
+        encoded = [CMD_MOVE_TO | (len(points) << 3)]
+        for point, previous in points:
+            encoded.extend((_zigzag(int(point[0] - previous[0])), _zigzag(int(point[1] - previous[1]))))
+        return geom_type, encoded
+    return (geom_type, commands) if commands else (None, None)
+
+
+def encode_properties(properties):
+    """
+    Encodes a feature's {attribute: value} for `encode_tile` as (attribute,
+    encoded Value) pairs, leaving out missing values. Done once per feature,
+    not once per tile it appears in.
+    """
+    return tuple(
+        (key, encode_value(value)) for key, value in properties.items()
+        if value is not None and not (isinstance(value, (float, np.floating)) and math.isnan(value))
+    )
+
+
+def encode_tile(features, layer_name=LAYER_NAME):
+    """
+    Encodes one tile. `features` yields (id, geometry in integer tile
+    coordinates, properties from `encode_properties`).
+    """
+    keys, values = {}, {}
+    encoded_features = []
+    for feature_id, geometry, properties in features:
+        geom_type, commands = encode_geometry(geometry)
+        if geom_type is None:
+            continue
+        tags = []
+        for key, value in properties:
+            # Equal encodings are equal values of the same type
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault(value, len(values)))
+        message = _field(1, 0) + _varint(int(feature_id))
+        if tags:
+            message += _packed(2, tags)
+        message += _field(3, 0) + _varint(geom_type) + _packed(4, commands)
+        encoded_features.append(_length_delimited(2, message))
+    if not encoded_features:
+        return b''
+    layer = _field(15, 0) + _varint(2) + _length_delimited(1, layer_name.encode('utf-8'))
+    layer += b''.join(encoded_features)
+    layer += b''.join(_length_delimited(3, key.encode('utf-8')) for key in keys)
+    layer += b''.join(_length_delimited(4, value) for value in values)
+    layer += _field(5, 0) + _varint(TILE_EXTENT)
+    return _length_delimited(3, layer)
+
+
+# -----------------------------------------------------------------------------
+# Tiling and MBTiles storage
+# -----------------------------------------------------------------------------
+
+def iter_tiles(layer, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM):
+    """Yields (zoom, x, y, encoded tile) for every non-empty tile of a `geostore.CityLayer`."""
+    import shapely
+
+    frame = layer.frame
+    if not len(frame) or layer.bounds is None:
+        return
+    geometries = frame.geometry.to_numpy()
+    attributes = frame.drop(columns=frame.geometry.name)
+    columns = list(attributes.columns)
+    properties = [encode_properties(dict(zip(columns, row))) for row in attributes.to_numpy(dtype=object)]
+    for zoom in range(min_zoom, max_zoom + 1):
+        projected = shapely.transform(geometries, lambda coords: np.column_stack(project(coords[:, 0], coords[:, 1], zoom)))
+        projected = shapely.simplify(projected, TILE_SIMPLIFY_UNITS, preserve_topology=True)
+        tree = shapely.STRtree(projected)
+        min_x, min_y, max_x, max_y = tile_range(layer.bounds, zoom)
+        for x in range(min_x, max_x + 1):
+            for y in range(min_y, max_y + 1):
+                left, top = x * TILE_EXTENT, y * TILE_EXTENT
+                clip = (left - TILE_BUFFER, top - TILE_BUFFER, left + TILE_EXTENT + TILE_BUFFER, top + TILE_EXTENT + TILE_BUFFER)
+                hits = tree.query(shapely.box(*clip))
+                if not len(hits):
+                    continue
+                hits.sort()
+                clipped = shapely.clip_by_rect(projected[hits], *clip)
+                local = shapely.transform(clipped, lambda coords: np.rint(coords - (left, top)))
+                data = encode_tile(
+                    (int(i), geometry, properties[i])
+                    for i, geometry in zip(hits, local) if not shapely.is_empty(geometry)
+                )
+                if data:
+                    yield zoom, x, y, data
+
+
+def tile_fields(frame):
+    """Returns the TileJSON field types ('Number', 'Boolean' or 'String') of a layer's attributes."""
+    import pandas as pd
+
+    fields = {}
+    for name in frame.columns:
+        if name == frame.geometry.name:
+            continue
+        dtype = frame[name].dtype
+        fields[name] = 'Boolean' if pd.api.types.is_bool_dtype(dtype) else \
+            'Number' if pd.api.types.is_numeric_dtype(dtype) else 'String'
+    return fields
+
+
+def write_mbtiles(layer, path, name, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM):
+    """
+    Writes the tiles of `layer` to an MBTiles file at `path` (to a temporary
+    name first, then renamed) and returns the number of tiles written.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    count = 0
+    with sqlite3.connect(tmp_path) as db:
+        db.execute("CREATE TABLE metadata (name TEXT, value TEXT)")
+        db.execute("CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB)")
+        for zoom, x, y, data in iter_tiles(layer, min_zoom, max_zoom):
+            # MBTiles rows count from the south (TMS)
+            db.execute("INSERT INTO tiles VALUES (?, ?, ?, ?)", (zoom, x, 2 ** zoom - 1 - y, gzip.compress(data)))
+            count += 1
+        db.execute("CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row)")
+        lat, lon = layer.center
+        vector_layers = [{'id': LAYER_NAME, 'fields': tile_fields(layer.frame), 'minzoom': min_zoom, 'maxzoom': max_zoom}]
+        metadata = {
+            'name': name, 'format': 'pbf', 'type': 'overlay', 'version': layer.version,
+            'minzoom': str(min_zoom), 'maxzoom': str(max_zoom),
+            'bounds': ','.join(f"{v:.6f}" for v in layer.bounds) if layer.bounds else "-180,-85.051129,180,85.051129",
+            'center': f"{lon:.6f},{lat:.6f},{min(max(11, min_zoom), max_zoom)}",
+            'json': json.dumps({'vector_layers': vector_layers}),
+        }
+        db.executemany("INSERT INTO metadata VALUES (?, ?)", metadata.items())
+    os.replace(tmp_path, path)
+    return count
+
+
+def build_city_tiles(source_path, name, cache_dir=storage.CACHE_DIR, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM):
+    """
+    Returns the MBTiles path of a city GeoJSON, building it (and the
+    GeoParquet layer it is cut from) on the first call for each source
+    version and zoom range.
+    """
+    fingerprint = storage.file_fingerprint(source_path)
+    path = tiles_path(source_path, fingerprint, cache_dir, min_zoom, max_zoom)
+    if not os.path.exists(path):
+        layer = geostore.load_city_layer(source_path, cache_dir, fingerprint=fingerprint)
+        count = write_mbtiles(layer, path, name, min_zoom, max_zoom)
+        print(f"DEBUG: Wrote {count:,} tiles for '{name}' to '{path}'")
+    return path
+
+
+# -----------------------------------------------------------------------------
+# Tile server
+# -----------------------------------------------------------------------------
+
+class MBTilesReader:
+    """Reads tiles and metadata from an MBTiles file, with one SQLite connection per thread."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _db(self):
+        if not hasattr(self._local, 'db'):
+            self._local.db = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        return self._local.db
+
+    def tile(self, zoom, x, y):
+        """Returns the gzip-compressed tile (x, y) at `zoom` (y counted from the north), or None."""
+        row = self._db().execute(
+            "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+            (zoom, x, 2 ** zoom - 1 - y)
+        ).fetchone()
+        return row[0] if row else None
+
+    def metadata(self):
+        return dict(self._db().execute("SELECT name, value FROM metadata").fetchall())
+
+
+def tilejson(metadata, tiles_url):
+    """Builds a TileJSON 3.0 document from MBTiles metadata."""
+    document = {
+        'tilejson': '3.0.0', 'name': metadata.get('name'), 'version': metadata.get('version'),
+        'tiles': [tiles_url], 'minzoom': int(metadata['minzoom']), 'maxzoom': int(metadata['maxzoom']),
+        'bounds': [float(v) for v in metadata['bounds'].split(',')],
+        'center': [float(v) for v in metadata['center'].split(',')],
+    }
+    document.update(json.loads(metadata.get('json', '{}')))
+    return document
+
+
+def make_handler(readers):
+    """Returns a request handler class serving the `readers` (URL name -> MBTilesReader)."""
+
+    class TileHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            parts = self.path.split('?')[0].strip('/').split('/')
+            if len(parts) == 1 and parts[0].endswith('.json') and parts[0][:-5] in readers:
+                name = parts[0][:-5]
+                host = self.headers.get('Host', f"127.0.0.1:{self.server.server_port}")
+                body = json.dumps(tilejson(readers[name].metadata(), f"http://{host}/{name}/{{z}}/{{x}}/{{y}}.pbf")).encode()
+                return self._send(200, body, 'application/json')
+            if len(parts) == 4 and parts[0] in readers and parts[3].endswith('.pbf'):
+                try:
+                    zoom, x, y = int(parts[1]), int(parts[2]), int(parts[3][:-4])
+                except ValueError:
+                    return self._send(400, b'', 'text/plain')
+                data = readers[parts[0]].tile(zoom, x, y)
+                if data is None:
+                    return self._send(204, b'', 'application/x-protobuf') # empty tile
+                return self._send(200, data, 'application/x-protobuf', encoding='gzip')
+            self._send(404, b'', 'text/plain')
+
+        def _send(self, status, body, content_type, encoding=None):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Access-Control-Allow-Origin', '*')
+            if encoding:
+                self.send_header('Content-Encoding', encoding)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return TileHandler
+
+
+def serve(readers, host='127.0.0.1', port=DEFAULT_PORT):
+    """Serves the tiles of `readers` (URL name -> MBTilesReader) until interrupted."""
+    server = ThreadingHTTPServer((host, port), make_handler(readers))
+    print(f"Serving {', '.join(sorted(readers))} at http://{host}:{server.server_port}/<city>/{{z}}/{{x}}/{{y}}.pbf")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['build', 'serve'])
+    parser.add_argument('cities', nargs='*', help="cities (default: all with a GeoJSON file)")
+    parser.add_argument('--cache-dir', default=storage.CACHE_DIR)
+    parser.add_argument('--min-zoom', type=int, default=MIN_ZOOM)
+    parser.add_argument('--max-zoom', type=int, default=MAX_ZOOM)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    args = parser.parse_args(argv)
+
+    readers = {}
+    for city in args.cities or list(geostore.CITY_GEOJSONS):
+        source_path = geostore.CITY_GEOJSONS[city]
+        if not os.path.exists(source_path):
+            print(f"{city}: {source_path} not found, skipped")
+            continue
+        path = build_city_tiles(source_path, city_slug(city), args.cache_dir, args.min_zoom, args.max_zoom)
+        print(f"{city}: {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+        readers[city_slug(city)] = MBTilesReader(path)
+    if args.command == 'serve' and readers:
+        serve(readers, args.host, args.port)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())